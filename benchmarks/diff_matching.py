@@ -0,0 +1,92 @@
+"""
+Brute force matching vs the trigram index on real descr.csv files (or synthetic ones of the same size),
+checks that both give identical results.
+
+    python -m benchmarks.diff_matching --ag /mnt/data/ag/descr.csv --qz /mnt/data/qz/descr.csv --limit 500
+    python -m benchmarks.diff_matching --synthetic-ag 10000 --synthetic-qz 25000 --limit 200
+"""
+
+import argparse
+import csv
+import random
+import time
+from pathlib import Path
+
+from scrapers.const import ENCODING
+from scrapers.matching import (
+    TrigramIndex,
+    find_similar_games,
+    find_similar_games_batch,
+)
+
+WORDS = (
+    "the secret of monkey island quest king space broken sword gabriel knight syberia myst riven grim fandango "
+    "day tentacle sam max hit road full throttle dig loom zak mckracken maniac mansion indiana jones fate atlantis "
+    "legend kyrandia simon sorcerer discworld beneath steel sky lure temptress longest journey dreamfall tex murphy "
+    "phantasmagoria gobliiins leisure suit larry police space conquest glory black cauldron manhunter"
+).split()
+
+
+def _synthetic_db(size: int, rnd: random.Random) -> dict:
+    db = {}
+    for i in range(size):
+        name = " ".join(rnd.choices(WORDS, k=rnd.randint(1, 5)))
+        other_names = str([" ".join(rnd.choices(WORDS, k=3))]) if rnd.random() < 0.3 else ""
+        db[str(i)] = {"id": str(i), "name": name.title(), "other_names": other_names}
+    return db
+
+
+def _read_db(path: Path) -> dict:
+    with open(path, mode="r", encoding=ENCODING) as f:
+        return {row["id"]: row for row in csv.DictReader(f)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ag", type=Path, help="AG descr.csv")
+    parser.add_argument("--qz", type=Path, help="QZ descr.csv")
+    parser.add_argument("--synthetic-ag", type=int, default=10000)
+    parser.add_argument("--synthetic-qz", type=int, default=25000)
+    parser.add_argument("--limit", type=int, default=200, help="AG records scored by the (slow) brute force.")
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    ag_db = _read_db(args.ag) if args.ag else _synthetic_db(args.synthetic_ag, rnd)
+    qz_db = _read_db(args.qz) if args.qz else _synthetic_db(args.synthetic_qz, rnd)
+    sample = list(ag_db.values())[: args.limit]
+
+    started = time.perf_counter()
+    expected = [find_similar_games(v, qz_db) for v in sample]
+    brute_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = TrigramIndex(qz_db)
+    build_time = time.perf_counter() - started
+    started = time.perf_counter()
+    actual = [index.find_similar_games(v) for v in sample]
+    index_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = find_similar_games_batch({str(i): v for i, v in enumerate(sample)}, qz_db)
+    batch_time = time.perf_counter() - started
+    batch_actual = [m[0] if m else None for m in batch.values()]
+
+    mismatches = sum(1 for e, a in zip(expected, actual) if e != a)
+    batch_mismatches = sum(1 for e, a in zip(expected, batch_actual) if e != a)
+    print(f"AG: {len(ag_db)} records ({len(sample)} scored), QZ: {len(qz_db)} records")
+    print(f"brute force:   {1000 * brute_time / len(sample):8.2f} ms/record")
+    print(f"trigram index: {1000 * index_time / len(sample):8.2f} ms/record (+{build_time:.2f}s to build)")
+    print(
+        f"speedup: {brute_time / index_time:.0f}x, projected full run: {brute_time / len(sample) * len(ag_db):.0f}s "
+        f"-> {build_time + index_time / len(sample) * len(ag_db):.1f}s"
+    )
+    print(f"sparse batch:  {1000 * batch_time / len(sample):8.2f} ms/record (incl. encoding of QZ)")
+    print(f"mismatches: index {mismatches}, batch {batch_mismatches}")
+
+    started = time.perf_counter()
+    find_similar_games_batch(ag_db, qz_db)
+    print(f"sparse batch, all {len(ag_db)} AG records: {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Generate the synthetic (but website-shaped) inputs of the benchmark suite into benchmarks/fixtures:
+AG game pages, cp1251-encoded QZ game pages, IGDB games json and names for matching.
+The output is deterministic, re-run only when the page/record shapes need to follow the websites.
+
+    python -m benchmarks.fixtures
+"""
+
+import json
+import random
+from pathlib import Path
+
+from benchmarks.diff_matching import (
+    WORDS,
+    _synthetic_db,
+)
+from scrapers.const import ENCODING
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+AG_PAGES = 40
+QZ_PAGES = 40
+IGDB_GAMES = 300
+MATCHING_AG = 300
+MATCHING_QZ = 3000
+
+
+def _sentence(rnd: random.Random, n: int) -> str:
+    return " ".join(rnd.choices(WORDS, k=n)).capitalize() + "."
+
+
+def _text(rnd: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rnd, rnd.randint(6, 16)) for _ in range(sentences))
+
+
+def _name(rnd: random.Random) -> str:
+    return " ".join(rnd.choices(WORDS, k=rnd.randint(1, 4))).title()
+
+
+def _navigation(rnd: random.Random, links: int) -> str:
+    # real pages carry a lot of site chrome around the game data, parsers have to get through it
+    items = "".join(
+        f'<li class="nav_item"><a href="/games/{rnd.randint(1, 50000)}/">{_name(rnd)}</a></li>' for _ in range(links)
+    )
+    return f'<div class="nav"><ul>{items}</ul></div>'
+
+
+def ag_page(rnd: random.Random, game_id: int) -> str:
+    name = _name(rnd)
+    game_info = {
+        "@context": "https://schema.org",
+        "@type": "VideoGame",
+        "name": name,
+        "url": f"https://adventuregamers.com/games/view/{game_id}",
+        "playMode": "SinglePlayer",
+        "applicationCategory": "Game",
+        "gamePlatform": ["PC", "Mac"],
+        "operatingSystem": ["Windows", "macOS"],
+        "author": {"@type": "Organization", "name": [_name(rnd) + " [Studio]"]},
+        "publisher": {"@type": "Organization", "name": [_name(rnd)]},
+        "datePublished": str(rnd.randint(1985, 2024)),
+        "genre": "Adventure",
+        "aggregateRating": {
+            "@type": "AggregateRating",
+            "ratingValue": round(rnd.uniform(1, 5), 1),
+            "ratingCount": rnd.randint(1, 500),
+            "bestRating": 5,
+            "worstRating": 1,
+        },
+    }
+    info_rows = {
+        "Platform": "PC, Mac",
+        "Perspective": "Third-person",
+        "Control": "Point-and-click",
+        "Gameplay": "Puzzle, Inventory",
+        "Theme": "Mystery, Horror, Comedy",
+        "Graphic Style": "Hand-drawn",
+        "Presentation": "Cartoon",
+        "Action (Compulsory)": "-",
+        "Red Flags": "-",
+        "Media": "Digital",
+    }
+    rows = "".join(f"<tr><td>{k}</td><td>{v}</td></tr>" for k, v in info_rows.items())
+    return f"""<!DOCTYPE html><html><head><meta charset="utf-8"><title>{name}</title>
+<script type="application/ld+json">{json.dumps(game_info)}</script></head><body>
+{_navigation(rnd, 150)}
+<h1 class="page_title main">{name}</h1>
+<div id="game_desc"><p>{_text(rnd, 8)}</p><p>{_text(rnd, 4)}</p></div>
+<img id="gamebox_new" data-src="https://adventuregamers.com/images/games/{game_id}/box.jpg">
+<div id="comment-container"><div class="padding">{_text(rnd, 2)}</div>
+<div class="padding">OS: Windows 10, CPU: 2 GHz, RAM: 4 GB</div>
+<table class="game_info_table">{rows}</table></div>
+{_navigation(rnd, 50)}
+</body></html>
+"""
+
+
+def qz_page(rnd: random.Random) -> str:
+    name = _name(rnd)
+    rows = [
+        ("Разработка:", f"{_name(rnd)} / -"),
+        ("Издание:", _name(rnd)),
+        ("Вышла:", f"в {rnd.choice(['январе', 'мае', 'ноябре'])} {rnd.randint(1990, 2023)}"),
+        ("Язык:", "английский"),
+        ("Другие языки:", "немецкий / французский"),
+        ("Платформы:", "<b>PC</b> / Mac"),
+        ("Жанры:", "квест / головоломка"),
+        ("Вид:", "от третьего лица"),
+        ("Управление:", "мышь"),
+        ("Носитель:", "CD / цифровая дистрибуция"),
+        ("Лицензия:", "коммерческая"),
+        ("Системные требования:", "Windows XP, 1 GHz, 512 MB"),
+        ("Движок:", "собственный"),
+        ("Купить:", '<a href="https://store.example.com/">магазин</a>'),
+    ]
+    trs = "".join(f"<tr><td>{k}</td><td>{v}</td></tr>" for k, v in rows)
+    return f"""<html><head><meta http-equiv="Content-Type" content="text/html; charset=windows-1251"></head><body>
+{_navigation(rnd, 100)}
+<table class="txt"><tr><td><div class="hdr0">{name}</div><font>Русское название</font>
+<div id="names"><i>"{_name(rnd)}"\n{_name(rnd)}</i></div><img alt="Обложка" src="/covers/{rnd.randint(1, 9999)}.jpg"></td></tr>
+{trs}
+<tr><td><div align="justify">Описание игры: мистика, загадки и {_text(rnd, 6)}</div></td></tr>
+<tr><td><a href="http://questzone.ru/screenshots/{rnd.randint(1, 9999)}/">скриншоты</a></td></tr></table>
+</body></html>
+"""
+
+
+def igdb_game(rnd: random.Random, game_id: int) -> dict:
+    genres = rnd.sample([2, 9, 31, 5, 8], k=rnd.randint(1, 3))
+    return {
+        "id": game_id,
+        "name": _name(rnd),
+        "slug": f"game-{game_id}",
+        "summary": _text(rnd, 3),
+        "storyline": _text(rnd, 5) if rnd.random() < 0.5 else None,
+        "genres": [{"id": g, "name": str(g)} for g in genres],
+        "platforms": rnd.sample(range(1, 200), k=rnd.randint(1, 5)),
+        "alternative_names": [{"id": i, "name": f'{_name(rnd)} "{i}"'} for i in range(rnd.randint(0, 3))],
+        "involved_companies": [
+            {
+                "id": i,
+                "company": rnd.randint(1, 5000),
+                "developer": rnd.random() < 0.5,
+                "publisher": rnd.random() < 0.5,
+                "porting": False,
+                "supporting": False,
+            }
+            for i in range(rnd.randint(1, 4))
+        ],
+        "age_ratings": [{"id": 1, "category": rnd.choice([1, 2]), "rating": rnd.randint(1, 12)}],
+        "screenshots": [
+            {"id": i, "image_id": f"sc{game_id}x{i}", "height": 720, "width": 1280} for i in range(rnd.randint(0, 6))
+        ],
+        "cover": {"id": game_id, "image_id": f"co{game_id}"},
+        "similar_games": rnd.sample(range(1, 100000), k=5),
+    }
+
+
+def main() -> None:
+    rnd = random.Random(2024)
+    for target, pages, render, encoding in (
+        ("ag", AG_PAGES, lambda i: ag_page(rnd, i), ENCODING),
+        ("qz", QZ_PAGES, lambda _: qz_page(rnd), "cp1251"),
+    ):
+        target_dir = FIXTURES_DIR / target
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(1, pages + 1):
+            (target_dir / f"{1000 + i}.html").write_bytes(render(1000 + i).encode(encoding))
+    (FIXTURES_DIR / "igdb").mkdir(parents=True, exist_ok=True)
+    with open(FIXTURES_DIR / "igdb" / "games.json", "w", encoding=ENCODING) as f:
+        json.dump([igdb_game(rnd, i) for i in range(1, IGDB_GAMES + 1)], f)
+    with open(FIXTURES_DIR / "matching.json", "w", encoding=ENCODING) as f:
+        json.dump({"ag": _synthetic_db(MATCHING_AG, rnd), "qz": _synthetic_db(MATCHING_QZ, rnd)}, f)
+
+
+if __name__ == "__main__":
+    main()
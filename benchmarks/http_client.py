@@ -0,0 +1,70 @@
+"""
+Requests/sec of the shared pooled HTTP client vs a fresh session per call, against a local stand-in server.
+
+    python -m benchmarks.http_client --requests 2000
+"""
+
+import argparse
+import threading
+import time
+import typing as t
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+from scrapers.misc import (
+    _get_requests_session,
+    configure_http,
+    get_url,
+)
+
+BODY = b"<html><body>" + b"x" * 4096 + b"</body></html>"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:  # noqa: N802
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format: str, *args: t.Any) -> None:  # pylint: disable=redefined-builtin
+        pass
+
+
+def _measure(fetch: t.Callable[[str], t.Any], url: str, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        fetch(url)
+    return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/game.html"
+
+    def per_call_session(u: str) -> None:
+        with _get_requests_session() as s:
+            s.get(u, timeout=5)
+
+    configure_http()
+    before = _measure(per_call_session, url, args.requests)
+    after = _measure(get_url, url, args.requests)
+    server.shutdown()
+
+    print(f"session per call: {before:8.1f} req/s")
+    print(f"shared pool:      {after:8.1f} req/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
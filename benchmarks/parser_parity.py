@@ -0,0 +1,78 @@
+"""
+Run the bs4 and lxml parse engines over a corpus of stored game pages, report field-level differences and
+per-file throughput of both.
+
+    python -m benchmarks.parser_parity --target qz --html-dir /mnt/data/qz/html --limit 2000
+"""
+
+import argparse
+import time
+import typing as t
+from collections import (
+    Counter,
+    defaultdict,
+)
+from pathlib import Path
+
+from scrapers.ag.games import PARSERS as AG_PARSERS
+from scrapers.qz.games import PARSERS as QZ_PARSERS
+
+TARGETS = {"ag": AG_PARSERS, "qz": QZ_PARSERS}
+MAX_EXAMPLES = 3
+
+
+def _timed(parse: t.Callable[[Path], tuple[dict, dict]], file: Path) -> tuple[t.Any, float]:
+    started = time.perf_counter()
+    try:
+        res: t.Any = parse(file)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        res = e
+    return res, time.perf_counter() - started
+
+
+def compare(parsers: dict, files: list[Path]) -> None:
+    base, fast = parsers["bs4"], parsers["lxml"]
+    elapsed: Counter = Counter()
+    diffs: Counter = Counter()
+    examples: dict[str, list] = defaultdict(list)
+    for file in files:
+        expected, base_time = _timed(base, file)
+        actual, fast_time = _timed(fast, file)
+        elapsed["bs4"] += base_time
+        elapsed["lxml"] += fast_time
+        if isinstance(expected, Exception) or isinstance(actual, Exception):
+            if type(expected) is not type(actual):
+                diffs["<exception>"] += 1
+                examples["<exception>"].append((file, repr(expected), repr(actual)))
+            continue
+        for part_expected, part_actual in zip(expected, actual):
+            for field in part_expected.keys() | part_actual.keys():
+                if part_expected.get(field) != part_actual.get(field):
+                    diffs[field] += 1
+                    if len(examples[field]) < MAX_EXAMPLES:
+                        examples[field].append((file, part_expected.get(field), part_actual.get(field)))
+
+    print(f"files: {len(files)}")
+    for engine, secs in elapsed.items():
+        print(f"{engine:>5}: {len(files) / secs:8.1f} files/s ({1000 * secs / len(files):.2f} ms/file)")
+    print(f"speedup: {elapsed['bs4'] / elapsed['lxml']:.1f}x")
+    if not diffs:
+        print("no differences")
+    for field, count in diffs.most_common():
+        print(f"field '{field}' differs in {count} files")
+        for file, expected, actual in examples[field]:
+            print(f"    {file}\n        bs4:  {expected!r}\n        lxml: {actual!r}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=TARGETS.keys(), required=True)
+    parser.add_argument("--html-dir", type=Path, required=True)
+    parser.add_argument("--limit", type=int, help="Compare only the first N files.")
+    args = parser.parse_args()
+    files = sorted(args.html_dir.rglob("*.html"))[: args.limit]
+    compare(TARGETS[args.target], files)
+
+
+if __name__ == "__main__":
+    main()
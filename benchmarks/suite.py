@@ -0,0 +1,183 @@
+"""
+Offline throughput benchmarks of the CPU-bound parts: AG/QZ parsers (both engines), name matching and the IGDB
+games transform, run over the committed fixtures (see benchmarks/fixtures.py). Throughputs are compared against
+benchmarks/baseline.json and the run fails (exit code 1) when one dropped by more than the tolerance.
+They are stored relative to a pure-python calibration loop, run right after each timed repeat, and the median of
+the repeats is compared, so a baseline taken on another machine still roughly applies and the speed of a busy machine
+drifting mid-run doesn't fail the gate; refresh it (on a quiet machine) when a change makes things faster on purpose.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --only parse --repeat 5
+    python -m benchmarks.suite --update-baseline
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+import typing as t
+from pathlib import Path
+
+from benchmarks.fixtures import FIXTURES_DIR
+from scrapers.ag.games import PARSERS as AG_PARSERS
+from scrapers.const import ENCODING
+from scrapers.igdb.index import write_games_csv
+from scrapers.matching import (
+    TrigramIndex,
+    find_similar_games,
+    find_similar_games_batch,
+    find_similarity,
+)
+from scrapers.qz.games import PARSERS as QZ_PARSERS
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+REPEAT = 7
+MIN_DURATION = 0.2  # seconds, a repeat runs the benchmark as many times as needed to last this long
+TOLERANCE = 0.3
+MATCHING_SAMPLE = 10  # AG records scored by the (slow) brute force
+CALIBRATION_LOOPS = 1_000_000
+
+# name -> (unit, callable returning a number of units processed)
+Benchmark = tuple[str, t.Callable[[], int]]
+
+
+def _calibrate() -> float:
+    # loops/s of a plain python loop: how fast this machine (and interpreter) is right now
+    started = time.perf_counter()
+    acc = 0
+    for i in range(CALIBRATION_LOOPS):
+        acc += i & 7
+    return CALIBRATION_LOOPS / (time.perf_counter() - started)
+
+
+def _parse(parse: t.Callable, files: list[Path]) -> t.Callable[[], int]:
+    def run() -> int:
+        for file in files:
+            parse(file)
+        return len(files)
+
+    return run
+
+
+def _matching_benchmarks() -> dict[str, Benchmark]:
+    with open(FIXTURES_DIR / "matching.json", encoding=ENCODING) as f:
+        dbs = json.load(f)
+    ag_db, qz_db = dbs["ag"], dbs["qz"]
+    sample = list(ag_db.values())[:MATCHING_SAMPLE]
+    qz_names = [v["name"] for v in qz_db.values()]
+
+    def similarity() -> int:
+        for v in sample:
+            for name in qz_names:
+                find_similarity(v["name"], name)
+        return len(sample) * len(qz_names)
+
+    def brute() -> int:
+        for v in sample:
+            find_similar_games(v, qz_db)
+        return len(sample)
+
+    def index() -> int:
+        # includes building the index, as every diff run does
+        idx = TrigramIndex(qz_db)
+        for v in ag_db.values():
+            idx.find_similar_games(v)
+        return len(ag_db)
+
+    res: dict[str, Benchmark] = {
+        "matching.similarity": ("pairs", similarity),
+        "matching.brute": ("records", brute),
+        "matching.index": ("records", index),
+    }
+    try:
+        import numpy  # noqa: F401 pylint: disable=import-outside-toplevel,unused-import
+
+        res["matching.batch"] = ("records", lambda: len(find_similar_games_batch(ag_db, qz_db)))
+    except ImportError:
+        pass
+    return res
+
+
+def _igdb_benchmarks(tmp_dir: Path) -> dict[str, Benchmark]:
+    with open(FIXTURES_DIR / "igdb" / "games.json", encoding=ENCODING) as f:
+        games = json.load(f)
+
+    def transform() -> int:
+        write_games_csv(tmp_dir, games)
+        return len(games)
+
+    return {"igdb.games_csv": ("records", transform)}
+
+
+def benchmarks(tmp_dir: Path) -> dict[str, Benchmark]:
+    res: dict[str, Benchmark] = {}
+    for target, parsers in (("ag", AG_PARSERS), ("qz", QZ_PARSERS)):
+        files = sorted((FIXTURES_DIR / target).glob("*.html"))
+        for engine, parse in parsers.items():
+            res[f"parse.{target}.{engine}"] = ("pages", _parse(parse, files))
+    res.update(_matching_benchmarks())
+    res.update(_igdb_benchmarks(tmp_dir))
+    return res
+
+
+def measure(run: t.Callable[[], int], repeat: int) -> tuple[float, float]:
+    """
+    Median throughput (units/s) of `repeat` repeats, after an untimed run (imports, parser and regex caches),
+    and the median of each repeat's throughput per million loops of the calibration run right after it
+    """
+    run()
+    throughputs = []
+    relative = []
+    for _ in range(repeat):
+        n = 0
+        started = time.perf_counter()
+        while (elapsed := time.perf_counter() - started) < MIN_DURATION or not n:
+            n += run()
+        throughputs.append(n / elapsed)
+        relative.append(throughputs[-1] / _calibrate() * 1e6)
+    return statistics.median(throughputs), statistics.median(relative)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", help="Run benchmarks whose name starts with this prefix only.")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed slowdown vs the baseline.")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline.exists():
+        with open(args.baseline, encoding=ENCODING) as f:
+            baseline = json.load(f)
+    results: dict[str, float] = {}
+    regressions = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, (unit, run) in benchmarks(Path(tmp_dir)).items():
+            if args.only and not name.startswith(args.only):
+                continue
+            throughput, results[name] = measure(run, args.repeat)
+            line = f"{name:24} {throughput:12.1f} {unit}/s"
+            if name in baseline:
+                ratio = results[name] / baseline[name]
+                line += f"  {ratio:6.2f}x baseline"
+                if ratio < 1 - args.tolerance:
+                    regressions.append(name)
+                    line += "  REGRESSION"
+            print(line)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding=ENCODING) as f:
+            json.dump({**baseline, **results}, f, indent=4, sort_keys=True)
+            f.write("\n")
+        print(f"baseline updated: {args.baseline}")
+    elif regressions:
+        print(f"regressions (> {args.tolerance:.0%} slower): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,267 @@
 import argparse
 import os
+import typing as t
 from pathlib import Path
 
-from scrapers.ag.games import run as ag_scrape_games
-from scrapers.ag.index import run as ag_scrape_index
-from scrapers.igdb.index import get_game_by_id
-from scrapers.igdb.index import run as igdb_scrape_index
-from scrapers.mg.index import run as mg_scrape_index
-from scrapers.qz.games import run as qz_scrape_games
-from scrapers.qz.index import run as qz_scrape_index
+from scrapers.cache import (
+    CACHE_MAX_SIZE,
+    CACHE_TTL,
+)
+from scrapers.crawl import (
+    CONCURRENCY,
+    RATE_LIMIT,
+)
+from scrapers.metrics import TEXTFILE_INTERVAL
+from scrapers.misc import (
+    POOL_MAXSIZE,
+    configure_cache,
+    configure_http,
+    configure_metrics,
+    finish_metrics,
+)
+from scrapers.output import (
+    DUMP_JSON,
+    DUMP_SUFFIXES,
+)
+from scrapers.profiling import (
+    INDEX_FETCH,
+    PROFILE_CPROFILE,
+    PROFILE_SAMPLE,
+    SAMPLE_INTERVAL,
+    TOP_N,
+    configure_profiling,
+    finish_profiling,
+    stage,
+)
 
 ENV_VAR_DATA_DIR = os.environ.get("DATA_DIR")
 if ENV_VAR_DATA_DIR is None:
     raise ValueError("DATA_DIR env var is not set")
 DATA_DIR = Path(ENV_VAR_DATA_DIR)
 
+# targets import their scrapers only when selected: e.g. qz runs don't need IGDB credentials or network at startup
+# pylint: disable=import-outside-toplevel
+
+
+def pack_html(data_path: Path) -> None:
+    from scrapers.archive import (
+        ARCHIVE_DIRNAME,
+        HtmlArchive,
+        pack_html_dir,
+    )
+
+    archive = HtmlArchive(data_path / ARCHIVE_DIRNAME)
+    try:
+        print(f"packed {pack_html_dir(data_path / 'html', archive)} html files into {archive.archive_dir}")
+    finally:
+        archive.close()
+
+
+def run_ag(args: argparse.Namespace, max_age: t.Optional[float]) -> None:
+    from scrapers.ag.games import run as ag_scrape_games
+    from scrapers.ag.index import run as ag_scrape_index
+
+    if args.pack_html:
+        pack_html(DATA_DIR / "ag")
+    if args.index:
+        with stage(INDEX_FETCH):
+            ag_scrape_index(
+                DATA_DIR / "ag", concurrency=args.concurrency, rate=args.rate, max_age=max_age, archive=args.archive
+            )
+    ag_scrape_games(
+        DATA_DIR / "ag",
+        args.covers,
+        workers=args.workers,
+        ordered=not args.unordered,
+        parser=args.parser,
+        incremental=args.incremental,
+        media_store=args.media_store,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        archive=args.archive,
+        parquet=args.parquet,
+    )
+
+
+def run_diff(args: argparse.Namespace, max_age: t.Optional[float]) -> None:  # pylint: disable=unused-argument
+    from scrapers.diff import run as diff_run
+
+    diff_run(DATA_DIR, rematch=args.rematch)
+
+
+def run_igdb(args: argparse.Namespace, max_age: t.Optional[float]) -> None:  # pylint: disable=unused-argument
+    from scrapers.igdb.index import get_game_by_id
+    from scrapers.igdb.index import run as igdb_scrape_index
+
+    if args.index:
+        igdb_scrape_index(
+            DATA_DIR / "igdb",
+            cursor=args.igdb_cursor,
+            incremental=args.incremental,
+            dump_format=args.dump_format,
+            union=args.igdb_union,
+            parquet=args.parquet,
+        )
+    elif args.game:
+        game = get_game_by_id(args.game)
+        print(game)
+
+
+def run_mg(args: argparse.Namespace, max_age: t.Optional[float]) -> None:  # pylint: disable=unused-argument
+    from scrapers.mg.index import run as mg_scrape_index
+
+    if args.index:
+        with stage(INDEX_FETCH):
+            mg_scrape_index(DATA_DIR / "mg", dump_format=args.dump_format, resume=args.resume)
+
+
+def run_qz(args: argparse.Namespace, max_age: t.Optional[float]) -> None:
+    from scrapers.qz.games import run as qz_scrape_games
+    from scrapers.qz.index import run as qz_scrape_index
+
+    if args.pack_html:
+        pack_html(DATA_DIR / "qz")
+    if args.index:
+        with stage(INDEX_FETCH):
+            qz_scrape_index(
+                DATA_DIR / "qz", concurrency=args.concurrency, rate=args.rate, max_age=max_age, archive=args.archive
+            )
+    qz_scrape_games(
+        DATA_DIR / "qz",
+        scrape_covers=args.covers,
+        scrape_screenshots=args.screenshots,
+        workers=args.workers,
+        ordered=not args.unordered,
+        parser=args.parser,
+        incremental=args.incremental,
+        media_store=args.media_store,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        archive=args.archive,
+        parquet=args.parquet,
+    )
+
+
+TARGETS: dict[str, t.Callable[[argparse.Namespace, t.Optional[float]], None]] = {
+    "ag": run_ag,
+    "diff": run_diff,
+    "igdb": run_igdb,
+    "mg": run_mg,
+    "qz": run_qz,
+}
+
 parser = argparse.ArgumentParser()
 parser.add_argument(
-    "--target", type=str, choices=["ag", "igdb", "mg", "qz"], help="Specify the target website (ag, igdb, mg, qz)."
+    "--target",
+    type=str,
+    choices=list(TARGETS),
+    help="Specify the target website (ag, igdb, mg, qz) or diff (AG games missing in QZ).",
 )
 parser.add_argument("--index", action="store_true", help="Scrape index.")
 parser.add_argument("--covers", action="store_true", help="Scrape covers.")
 parser.add_argument("--screenshots", action="store_true", help="Scrape screenshots.")
 parser.add_argument("--game", type=str, help="Get game info.")
+parser.add_argument("--http-pool-size", type=int, default=POOL_MAXSIZE, help="Max keep-alive connections per host.")
+parser.add_argument("--no-keep-alive", action="store_true", help="Close HTTP connections after each request.")
+parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Index crawl, media: requests kept in flight.")
+parser.add_argument("--rate", type=float, default=RATE_LIMIT, help="Index crawl, media: max requests/sec per host.")
+parser.add_argument("--cache-dir", type=Path, help="Cache HTTP responses here and revalidate them on re-runs.")
+parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL / 86400, help="Cache: evict entries after N days.")
+parser.add_argument(
+    "--cache-max-size", type=int, default=CACHE_MAX_SIZE // 1024**2, help="Cache: max size of bodies, MB."
+)
+parser.add_argument(
+    "--cache-fresh-for", type=float, default=0, help="Cache: serve entries younger than N hours without revalidating."
+)
+parser.add_argument("--resume", action="store_true", help="Index: skip pages already fetched by a previous run.")
+parser.add_argument("--max-age", type=float, help="Index: skip pages fetched less than N hours ago (implies --resume).")
+parser.add_argument("--workers", type=int, default=1, help="Parse stored html pages on N processes.")
+parser.add_argument("--unordered", action="store_true", help="Parse: collect results as soon as workers finish.")
+parser.add_argument("--parser", choices=["bs4", "lxml"], default="bs4", help="Engine used to parse html pages.")
+parser.add_argument(
+    "--incremental",
+    action="store_true",
+    help="Parse only new/changed html pages (parse cache); IGDB: fetch only records updated since the last sync.",
+)
+parser.add_argument(
+    "--archive", action="store_true", help="AG/QZ: store and parse html pages in a packed archive, not one file each."
+)
+parser.add_argument("--pack-html", action="store_true", help="AG/QZ: pack existing html files into the archive.")
+parser.add_argument(
+    "--media-store",
+    action="store_true",
+    help="Covers/screenshots: download concurrently into a content-addressed store shared by all targets.",
+)
+parser.add_argument(
+    "--igdb-cursor",
+    action="store_true",
+    help="IGDB: page by id (where id > last_id) instead of parallel offsets, stable while the catalog changes.",
+)
+parser.add_argument(
+    "--igdb-union",
+    action="store_true",
+    help="IGDB: fetch games of all genres with a single query instead of one per genre (no duplicate downloads).",
+)
+parser.add_argument(
+    "--dump-format",
+    choices=list(DUMP_SUFFIXES),
+    default=DUMP_JSON,
+    help="IGDB/MobyGames: raw dumps as pretty json, or gzip/zstd-compressed NDJSON written page by page.",
+)
+parser.add_argument(
+    "--parquet",
+    action="store_true",
+    help="AG/QZ/IGDB: also write csv outputs as typed Parquet files, lists and structs as such (needs pyarrow).",
+)
+parser.add_argument(
+    "--metrics-textfile",
+    type=Path,
+    help="Write HTTP metrics here in the Prometheus text format (e.g. into node-exporter's textfile directory).",
+)
+parser.add_argument(
+    "--metrics-interval", type=float, default=TEXTFILE_INTERVAL, help="Rewrite the metrics textfile every N seconds."
+)
+parser.add_argument(
+    "--metrics-json",
+    type=Path,
+    help="Summary of HTTP metrics written at exit (default: $DATA_DIR/metrics/TARGET.json).",
+)
+parser.add_argument(
+    "--profile",
+    nargs="?",
+    const=PROFILE_CPROFILE,
+    choices=[PROFILE_CPROFILE, PROFILE_SAMPLE],
+    help="Profile each stage (index fetch, html parse, media download, csv write, IGDB transform) with cProfile, "
+    "or by sampling stacks (cheap enough for production runs). Parse with --workers=1 to see parsing itself.",
+)
+parser.add_argument("--profile-dir", type=Path, help="Profiles output (default: $DATA_DIR/profile/TARGET).")
+parser.add_argument("--profile-top", type=int, default=TOP_N, help="Profile: functions listed per stage summary.")
+parser.add_argument(
+    "--profile-interval", type=float, default=SAMPLE_INTERVAL, help="Sampling profile: seconds between samples."
+)
+parser.add_argument("--rematch", action="store_true", help="Diff: ignore stored matches, match everything again.")
 
 args = parser.parse_args()
-if args.target == "ag":
-    if args.index:
-        ag_scrape_index(DATA_DIR / "ag")
-    ag_scrape_games(DATA_DIR / "ag", args.covers)
-elif args.target == "igdb":
-    if args.index:
-        igdb_scrape_index(DATA_DIR / "igdb")
-    elif args.game:
-        game = get_game_by_id(args.game)
-        print(game)
-elif args.target == "mg":
-    if args.index:
-        mg_scrape_index(DATA_DIR / "mg")
-elif args.target == "qz":
-    if args.index:
-        qz_scrape_index(DATA_DIR / "qz")
-    qz_scrape_games(DATA_DIR / "qz", scrape_covers=args.covers, scrape_screenshots=args.screenshots)
+configure_http(pool_maxsize=args.http_pool_size, keep_alive=not args.no_keep_alive)
+configure_cache(
+    args.cache_dir,
+    ttl=args.cache_ttl * 86400,
+    max_size=args.cache_max_size * 1024**2,
+    fresh_for=args.cache_fresh_for * 3600,
+)
+max_age = args.max_age * 3600 if args.max_age is not None else (float("inf") if args.resume else None)
+configure_metrics(args.metrics_textfile, args.metrics_interval)
+if args.target in TARGETS:
+    configure_profiling(
+        args.profile,
+        args.profile_dir or DATA_DIR / "profile" / args.target,
+        top_n=args.profile_top,
+        interval=args.profile_interval,
+    )
+    try:
+        TARGETS[args.target](args, max_age)
+    finally:
+        finish_profiling()
+        finish_metrics(args.metrics_json or DATA_DIR / "metrics" / f"{args.target}.json")
 else:
     print("Error: specify a target website")
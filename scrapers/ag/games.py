@@ -1,14 +1,53 @@
-import csv
 import json
-import os
+import typing as t
+from contextlib import nullcontext
 from pathlib import Path
 from time import sleep
 
-import requests
 from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+from lxml.etree import XPath
 
+from scrapers.archive import (
+    ARCHIVE_DIRNAME,
+    HtmlArchive,
+    Page,
+    read_page,
+)
 from scrapers.const import ENCODING
-from scrapers.misc import get_url
+from scrapers.crawl import (
+    CONCURRENCY,
+    RATE_LIMIT,
+    Crawler,
+)
+from scrapers.media import (
+    MEDIA_DIRNAME,
+    MediaStore,
+    download_media,
+)
+from scrapers.misc import (
+    download,
+    first,
+    xpath_has_class,
+)
+from scrapers.output import (
+    PARQUET_FLOAT,
+    PARQUET_INT,
+    PARQUET_LIST,
+    csv_writer,
+    flat_parquet_writer,
+)
+from scrapers.parse_cache import (
+    PARSE_CACHE_FILENAME,
+    parse_files_cached,
+)
+from scrapers.profiling import (
+    CSV_WRITE,
+    HTML_PARSE,
+    MEDIA_DOWNLOAD,
+    profiled,
+    stage,
+)
 
 COLUMNS = [
     "id",
@@ -37,22 +76,65 @@ COLUMNS = [
     "red_flags",
     "media",
 ]
+# descr.parquet: types of non-string columns; info rows (and some schema.org values) are lists only when
+# there are several values, they are always lists in parquet
+PARQUET_KINDS = {
+    "id": PARQUET_INT,
+    "gamePlatform": PARQUET_LIST,
+    "operatingSystem": PARQUET_LIST,
+    "author": PARQUET_LIST,
+    "publisher": PARQUET_LIST,
+    "ratingValue": PARQUET_FLOAT,
+    "ratingCount": PARQUET_INT,
+    "bestRating": PARQUET_INT,
+    "worstRating": PARQUET_INT,
+    "genre": PARQUET_LIST,
+    **dict.fromkeys(
+        [
+            "platform",
+            "perspective",
+            "control",
+            "gameplay",
+            "theme",
+            "graphic_style",
+            "presentation",
+            "action_compulsory",
+            "red_flags",
+            "media",
+        ],
+        PARQUET_LIST,
+    ),
+}
+# bump on any change of parsing logic: invalidates records stored in the parse cache
+PARSER_VERSION = 1
+
+# lxml engine: expressions mirror soup.find/find_all lookups of parse_html_file (descendant axis, first match)
+_LXML_PARSER = lxml_html.HTMLParser(encoding=ENCODING)
+_X_LD_JSON = XPath("//script[@type='application/ld+json']")
+_X_TITLE = XPath(f"//h1[{xpath_has_class('page_title')}]")
+_X_GAME_DESC = XPath("//div[@id='game_desc']")
+_X_P = XPath(".//p")
+_X_COVER = XPath("//img[@id='gamebox_new']")
+_X_VERDICT = XPath(f"//div[{xpath_has_class('our_verdict')}]")
+_X_REVIEW_RATING = XPath(".//div[@itemprop='reviewRating']")
+_X_STRONG = XPath(".//strong")
+_X_BUY = XPath(f".//div[{xpath_has_class('buy_product_new')}]")
+_X_A = XPath(".//a")
+_X_AGGREGATE_RATING = XPath(".//div[@itemprop='aggregateRating']")
+_X_RATING_VALUE = XPath(".//span[@itemprop='ratingValue']")
+_X_REVIEW_COUNT = XPath(".//span[@itemprop='reviewCount']")
+_X_COMMENTS = XPath("//div[@id='comment-container']")
+_X_PADDING = XPath(f".//div[{xpath_has_class('padding')}]")
+_X_INFO_TABLE = XPath(f".//table[{xpath_has_class('game_info_table')}]")
+_X_TR = XPath(".//tr")
+_X_TD = XPath(".//td")
 
 
 def download_file(url: str, filepath: Path) -> None:
     if filepath.exists():
         return
-    try:
-        r = get_url(url)
-    except requests.exceptions.RequestException as e:
-        print(e)
-        return
-    if r.status_code != 200:
-        print(f"error getting file: {url}")
-        return
-    with open(filepath, "wb") as f:
-        f.write(r.content)
-    sleep(0.5)
+    if download(url, filepath):
+        sleep(0.5)
 
 
 def download_cover(url: str, dest_dir: Path) -> None:
@@ -62,47 +144,65 @@ def download_cover(url: str, dest_dir: Path) -> None:
     download_file(url, filepath)
 
 
-def parse_html_file(html_file_path: Path, data_path: Path, scrape_covers: bool) -> dict:
-    with open(html_file_path, "rb") as f:
-        soup = BeautifulSoup(f, "html.parser")
-
-    descr = dict.fromkeys(COLUMNS, None)
-
-    descr["id"] = int(os.path.basename(html_file_path)[:-5])
-
-    game_info = None
-    data_scripts = soup.find_all("script", {"type": "application/ld+json"})
-    for ds in data_scripts:
-        ds_str = str(ds.string)
+def _find_game_info(scripts: t.Iterable[str], html_file_path: Page) -> t.Optional[dict]:
+    for ds_str in scripts:
         if "VideoGame" in ds_str:
             try:
-                game_info = json.loads(ds_str)
+                return json.loads(ds_str)
             except json.decoder.JSONDecodeError:
                 print(f"error decoding json for: {html_file_path}")
                 continue
-            break
+    return None
+
+
+def _apply_game_info(descr: dict, game_info: t.Optional[dict]) -> None:
     if not game_info:
         print(f"game info not found: id={descr['id']}")
-    else:
-        for k, v in game_info.items():
-            if k[0] == "@" or k == "url":
-                continue
-            if k not in descr and k not in ["aggregateRating"]:
-                raise ValueError(f"new field: {k}")
-            if k in ["author", "publisher"]:
-                # few authors/publishers have brackets in their name, this conflicts with final CSV formatting
-                descr[k] = [x.replace("[", "<").replace("]", ">") for x in v["name"]]
-            elif k == "aggregateRating":
-                for k_, v_ in v.items():
-                    if k_[0] == "@" or k_ == "itemReviewed":
-                        continue
-                    if k_ not in descr:
-                        raise ValueError(f"new field: {k_}")
-                    descr[k_] = v_
-            elif k == "datePublished" and v == "0":
-                descr[k] = None
-            else:
-                descr[k] = v
+        return
+    for k, v in game_info.items():
+        if k[0] == "@" or k == "url":
+            continue
+        if k not in descr and k not in ["aggregateRating"]:
+            raise ValueError(f"new field: {k}")
+        if k in ["author", "publisher"]:
+            # few authors/publishers have brackets in their name, this conflicts with final CSV formatting
+            descr[k] = [x.replace("[", "<").replace("]", ">") for x in v["name"]]
+        elif k == "aggregateRating":
+            for k_, v_ in v.items():
+                if k_[0] == "@" or k_ == "itemReviewed":
+                    continue
+                if k_ not in descr:
+                    raise ValueError(f"new field: {k_}")
+                descr[k_] = v_
+        elif k == "datePublished" and v == "0":
+            descr[k] = None
+        else:
+            descr[k] = v
+
+
+def _apply_info_row(descr: dict, field_text: str, value: str) -> None:
+    field = field_text.lower().replace(" ", "_").replace(")", "").replace("(", "")
+    if field not in COLUMNS:
+        print(f"addme: {field}")
+        return
+    if value == "-":
+        return
+    descr[field] = [x.strip() for x in value.split(",")] if "," in value else value
+
+
+def parse_html_file(html_file_path: Page) -> tuple[dict, dict]:
+    """
+    Parse a stored game page into (descr, media), media holds urls of images to download (if requested).
+    Has no side effects, so it's safe to run in worker processes.
+    """
+    soup = BeautifulSoup(read_page(html_file_path), "html.parser")
+
+    descr = dict.fromkeys(COLUMNS, None)
+
+    descr["id"] = int(html_file_path.name[:-5])
+
+    data_scripts = soup.find_all("script", {"type": "application/ld+json"})
+    _apply_game_info(descr, _find_game_info((str(ds.string) for ds in data_scripts), html_file_path))
 
     descr["name"] = soup.find("h1", {"class": "page_title"}).text
 
@@ -110,10 +210,10 @@ def parse_html_file(html_file_path: Path, data_path: Path, scrape_covers: bool)
     if game_desc_div:
         descr["description"] = game_desc_div.find("p").text
 
-    if scrape_covers:
-        cover_img = soup.find("img", {"id": "gamebox_new"})
-        if cover_img:
-            download_cover(cover_img["data-src"], data_path / "covers")
+    media = {"cover": None}
+    cover_img = soup.find("img", {"id": "gamebox_new"})
+    if cover_img:
+        media["cover"] = cover_img["data-src"]
 
     div = soup.find("div", {"class": "our_verdict"})
     if div:
@@ -137,42 +237,128 @@ def parse_html_file(html_file_path: Path, data_path: Path, scrape_covers: bool)
     tbl = div.find("table", {"class": "game_info_table"})
     for tr in tbl.find_all("tr"):
         tds = tr.find_all("td")
-        field = tds[0].text.lower().replace(" ", "_").replace(")", "").replace("(", "")
-        if field not in COLUMNS:
-            print(f"addme: {field}")
-            continue
-        value = tds[1].text
-        if value == "-":
-            continue
-        if "," in value:
-            value = [x.strip() for x in value.split(",")]
-        descr[field] = value
-    return descr
+        _apply_info_row(descr, tds[0].text, tds[1].text)
+    return descr, media
+
+
+def parse_html_file_lxml(html_file_path: Page) -> tuple[dict, dict]:
+    """
+    Same as parse_html_file, but on lxml with XPath expressions compiled once per process
+    """
+    doc = lxml_html.document_fromstring(read_page(html_file_path), parser=_LXML_PARSER)
+
+    descr = dict.fromkeys(COLUMNS, None)
+
+    descr["id"] = int(html_file_path.name[:-5])
+
+    _apply_game_info(descr, _find_game_info((str(ds.text) for ds in _X_LD_JSON(doc)), html_file_path))
+
+    descr["name"] = first(_X_TITLE(doc)).text_content()
+
+    game_desc_div = first(_X_GAME_DESC(doc))
+    if game_desc_div is not None:
+        descr["description"] = first(_X_P(game_desc_div)).text_content()
+
+    media = {"cover": None}
+    cover_img = first(_X_COVER(doc))
+    if cover_img is not None:
+        media["cover"] = cover_img.attrib["data-src"]
 
+    div = first(_X_VERDICT(doc))
+    if div is not None:
+        div_ = first(_X_REVIEW_RATING(div))
+        if div_ is not None:
+            descr["ag_rating"] = float(first(_X_STRONG(div_)).text_content().split(" ")[0])
+            div_ = first(_X_BUY(div))
+            if div_ is not None:
+                descr["store"] = [a.attrib["href"] for a in _X_A(div_)]
+        div = first(_X_AGGREGATE_RATING(div))
+        if div is not None:
+            descr["user_rating"] = float(first(_X_RATING_VALUE(div)).text_content())
+            descr["user_rating_count"] = float(first(_X_REVIEW_COUNT(div)).text_content())
 
-def run(data_path: Path, scrape_covers: bool = False) -> None:
+    div = first(_X_COMMENTS(doc))
+
+    div_ = _X_PADDING(div)
+    if div_ and len(div_) >= 2:
+        descr["sys_requirements"] = div_[1].text_content()
+
+    tbl = first(_X_INFO_TABLE(div))
+    for tr in _X_TR(tbl):
+        tds = _X_TD(tr)
+        _apply_info_row(descr, tds[0].text_content(), tds[1].text_content())
+    return descr, media
+
+
+PARSERS = {"bs4": parse_html_file, "lxml": parse_html_file_lxml}
+
+
+def run(
+    data_path: Path,
+    scrape_covers: bool = False,
+    workers: int = 1,
+    ordered: bool = True,
+    parser: str = "bs4",
+    incremental: bool = False,
+    media_store: bool = False,
+    concurrency: int = CONCURRENCY,
+    rate: float = RATE_LIMIT,
+    archive: bool = False,
+    parquet: bool = False,
+) -> None:
+    """
+    archive=True: parse pages from the html archive ("{data_path}/archive") instead of "{data_path}/html" files
+    parquet=True: also write descr.parquet (typed columns, lists as lists)
+    media_store=True: download covers concurrently (concurrency, rate per host) into the content-addressed store
+    shared by all scrapers ("{data_path}/../media") instead of one by one into "{data_path}/covers"
+    """
     res_file = data_path / "descr.csv"
     htmls_dir = data_path / "html"
-    all_files = htmls_dir.rglob("*")
-    all_html_files_count = len([f for f in htmls_dir.rglob("*") if f.suffix == ".html"])
+    all_html_files: t.Sequence[Page]
+    if archive:
+        archive_ = HtmlArchive(data_path / ARCHIVE_DIRNAME)
+        all_html_files = archive_.entries()
+        archive_.close()
+    else:
+        all_html_files = [f for f in htmls_dir.rglob("*") if f.suffix == ".html"]
+    all_html_files_count = len(all_html_files)
     i = 1
-    result = {}
-    for file in all_files:
-        if file.suffix != ".html":
-            continue
-        if i % 1000 == 1:
-            print(f"processing file {file}: {i} of {all_html_files_count}")
-        descr = parse_html_file(file, data_path, scrape_covers)
-        if descr["id"] in result:
-            print(f"duplicate entry found. id: {descr['id']}")
-        else:
-            result[descr["id"]] = descr
-        i += 1
-    try:
-        with open(res_file, "w", encoding=ENCODING) as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=COLUMNS)
-            writer.writeheader()
-            for _, descr in result.items():
+    known_ids: set[int] = set()
+    covers: list[str] = []
+    parsed = parse_files_cached(
+        PARSERS[parser],
+        all_html_files,
+        data_path / PARSE_CACHE_FILENAME if incremental else None,
+        f"{PARSER_VERSION}-{parser}",
+        workers=workers,
+        ordered=ordered,
+    )
+    # rows are written as soon as they are parsed, descr.csv is replaced only when all of them are written:
+    # on any error (parsing included) it is left untouched and the error propagates
+    with stage(CSV_WRITE), csv_writer(res_file, COLUMNS) as writer, (
+        flat_parquet_writer(data_path / "descr.parquet", COLUMNS, PARQUET_KINDS) if parquet else nullcontext(None)
+    ) as write_parquet:
+        for _, (descr, media) in profiled(HTML_PARSE, parsed):
+            if i % 1000 == 1:
+                print(f"processing file {i} of {all_html_files_count}: id={descr['id']}")
+            if descr["id"] in known_ids:
+                print(f"duplicate entry found. id: {descr['id']}")
+            else:
+                known_ids.add(descr["id"])
                 writer.writerow(descr)
-    except IOError:
-        print("I/O error")
+                if write_parquet:
+                    write_parquet(descr)
+            if scrape_covers and media["cover"]:
+                covers.append(media["cover"])
+            i += 1
+    # media downloads are dispatched from the main process, after parsing
+    with stage(MEDIA_DOWNLOAD):
+        if media_store:
+            store = MediaStore(data_path.parent / MEDIA_DIRNAME)
+            try:
+                download_media(store, Crawler(concurrency, rate), covers)
+            finally:
+                store.close()
+            return
+        for url in covers:
+            download_cover(url, data_path / "covers")
@@ -1,43 +1,103 @@
+import typing as t
 from pathlib import Path
-from time import sleep
 
 from bs4 import BeautifulSoup
 
-from scrapers.misc import get_url
+from scrapers.archive import (
+    ARCHIVE_DIRNAME,
+    HtmlArchive,
+)
+from scrapers.crawl import (
+    CONCURRENCY,
+    RATE_LIMIT,
+    Crawler,
+)
+from scrapers.manifest import (
+    KIND_GAME,
+    KIND_LISTING,
+    MANIFEST_FILENAME,
+    CrawlManifest,
+)
 
 DOMAIN = "https://adventuregamers.com"
 SECTIONS = {"all", "freeware"}
-SLEEP_OK = 0.5
 
 
-def run(data_path: Path) -> None:
+def _listing_links(
+    crawler: Crawler, manifest: CrawlManifest, url: str, max_age: t.Optional[float], page_size: t.Optional[int] = None
+) -> list:
     """
-    Fetch AG games index (all html pages of all games) and store into "{data_path}/html"
+    Game links of listing page url. Links of the last page of a section (empty, or shorter than page_size) are not
+    kept in the manifest: games added meanwhile land there, so it is always fetched again.
+    """
+    links = manifest.fresh_links(url, max_age)
+    if links is not None:
+        return links
+    print(f"parsing index from page: {url}")
+    res_idx_page = crawler.get(url)
+    soup = BeautifulSoup(res_idx_page.content, "html5lib")
+    base_div = soup.find_all("div", {"class": "item_holder"})
+    links = []
+    if len(base_div) >= 2:
+        for h in base_div[1].find_all("div", {"class": "card"}):
+            a = h.find("a")
+            url_parts = a["href"].split("/")
+            links.append((url_parts[3], f"{DOMAIN}{a['href']}"))
+    last_page = not links or (page_size is not None and len(links) < page_size)
+    manifest.record(url, KIND_LISTING, res_idx_page.status_code, None if last_page else links)
+    return links
+
+
+def _game_pages(crawler: Crawler, manifest: CrawlManifest, max_age: t.Optional[float]) -> t.Iterator[tuple[str, str]]:
+    """
+    Walk listing pages of all sections and yield (game_prefix, game_page_url) of pages which need to be fetched
     """
-    data_path.mkdir(parents=True, exist_ok=True)
     for s in SECTIONS:
         p = 1
+        page_size: t.Optional[int] = None
         while True:
-            url = f"{DOMAIN}/games/adventure/{s}-title-asc/page{p}"
-            print(f"parsing index from page: {url}")
-            res_idx_page = get_url(url)
-            soup = BeautifulSoup(res_idx_page.content, "html5lib")
-            base_div = soup.find_all("div", {"class": "item_holder"})
-            if len(base_div) < 2:
+            links = _listing_links(
+                crawler, manifest, f"{DOMAIN}/games/adventure/{s}-title-asc/page{p}", max_age, page_size
+            )
+            page_size = page_size or len(links)
+            if not links:
                 print(f"finished processing section '{s}'")
                 break  # no more games to process in this section
-            cards = base_div[1].find_all("div", {"class": "card"})
-            for h in cards:
-                a = h.find("a")
-                url = f"{DOMAIN}{a['href']}"
-                url_parts = a["href"].split("/")
-                game_prefix = url_parts[3]
-                print(f"getting game page: {url}")
-                game_page_html = get_url(url)
+            for game_prefix, url in links:
+                if not manifest.is_fresh(url, max_age):
+                    yield game_prefix, url
+            p += 1
+
+
+def run(
+    data_path: Path,
+    concurrency: int = CONCURRENCY,
+    rate: float = RATE_LIMIT,
+    max_age: t.Optional[float] = None,
+    archive: bool = False,
+) -> None:
+    """
+    Fetch AG games index (all html pages of all games) and store into "{data_path}/html".
+    Pages fetched successfully less than max_age seconds ago (according to the crawl manifest) are skipped.
+    archive=True: append pages to the html archive ("{data_path}/archive") instead of writing one file per page.
+    """
+    data_path.mkdir(parents=True, exist_ok=True)
+    crawler = Crawler(concurrency=concurrency, rate=rate)
+    manifest = CrawlManifest(data_path / MANIFEST_FILENAME)
+    html_archive = HtmlArchive(data_path / ARCHIVE_DIRNAME) if archive else None
+    try:
+        for game_prefix, url, game_page_html in crawler.fetch_all(_game_pages(crawler, manifest, max_age)):
+            print(f"got game page: {url}")
+            if html_archive:
+                html_archive.put(game_prefix + ".html", game_page_html.content)
+            else:
                 html_files_folder = data_path / "html" / game_prefix[:1]
                 html_files_folder.mkdir(parents=True, exist_ok=True)
                 html_file_path = html_files_folder / (game_prefix + ".html")
                 with open(html_file_path, "wb") as f:
                     f.write(game_page_html.content)
-                sleep(SLEEP_OK)
-            p += 1
+            manifest.record(url, KIND_GAME, game_page_html.status_code)
+    finally:
+        manifest.close()
+        if html_archive:
+            html_archive.close()
@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import mmap
+import sqlite3
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+ARCHIVE_DIRNAME = "archive"
+INDEX_FILENAME = "index.sqlite"
+SHARD_MAX_SIZE = 1024**3  # a new shard is started once the current one would grow past this
+
+
+class ArchiveEntry(t.NamedTuple):
+    """
+    Location of a page in an archive. Has name/stem like the Path of the same page stored as a file would have,
+    so parsers can take either.
+    """
+
+    archive_dir: Path
+    key: str
+    shard: int
+    offset: int
+    length: int
+    sha256: str
+    stored_at_ns: int
+
+    @property
+    def name(self) -> str:
+        return self.key
+
+    @property
+    def stem(self) -> str:
+        return Path(self.key).stem
+
+    def __str__(self) -> str:
+        return f"{self.archive_dir}:{self.key}"
+
+
+# a stored page: html file or archive entry
+Page = t.Union[Path, ArchiveEntry]
+
+
+class HtmlArchive:
+    """
+    Append-only store of html pages: "{archive_dir}/shard-NNNNN.gz" files made of one gzip member per page
+    (so each shard is also a plain gzip stream of all its pages), plus an index of (key -> shard, offset, length).
+    Storing a key again appends the new version and points the index to it. Shards are read through mmap.
+    """
+
+    def __init__(self, archive_dir: Path) -> None:
+        self.archive_dir = archive_dir
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(archive_dir / INDEX_FILENAME, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "key TEXT PRIMARY KEY, shard INTEGER NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL, "
+            "sha256 TEXT NOT NULL, stored_at_ns INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._maps: dict[int, mmap.mmap] = {}
+        shard = self._conn.execute("SELECT MAX(shard) FROM pages").fetchone()[0]
+        self._shard = shard or 0
+
+    def close(self) -> None:
+        for m in self._maps.values():
+            m.close()
+        self._maps.clear()
+        self._conn.close()
+
+    def _shard_path(self, shard: int) -> Path:
+        return self.archive_dir / f"shard-{shard:05d}.gz"
+
+    def put(self, key: str, content: bytes) -> None:
+        # mtime=0: same content, same bytes
+        member = gzip.compress(content, mtime=0)
+        with self._lock:
+            path = self._shard_path(self._shard)
+            if path.exists() and path.stat().st_size + len(member) > SHARD_MAX_SIZE:
+                self._shard += 1
+                path = self._shard_path(self._shard)
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write(member)
+            # the index is updated only once the page is written: it never points past the end of a shard
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, shard, offset, length, sha256, stored_at_ns) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self._shard, offset, len(member), hashlib.sha256(content).hexdigest(), time.time_ns()),
+            )
+            self._conn.commit()
+
+    def __contains__(self, key: str) -> bool:
+        return self._conn.execute("SELECT 1 FROM pages WHERE key = ?", (key,)).fetchone() is not None
+
+    def entries(self) -> list[ArchiveEntry]:
+        """
+        All pages, by key
+        """
+        return [
+            ArchiveEntry(self.archive_dir, *row)
+            for row in self._conn.execute(
+                "SELECT key, shard, offset, length, sha256, stored_at_ns FROM pages ORDER BY key"
+            )
+        ]
+
+    def entry(self, key: str) -> t.Optional[ArchiveEntry]:
+        row = self._conn.execute(
+            "SELECT key, shard, offset, length, sha256, stored_at_ns FROM pages WHERE key = ?", (key,)
+        ).fetchone()
+        return ArchiveEntry(self.archive_dir, *row) if row else None
+
+    def _map(self, shard: int, end: int) -> mmap.mmap:
+        with self._lock:
+            m = self._maps.get(shard)
+            if m is None or len(m) < end:
+                # not mapped yet, or the shard grew since it was mapped (the old map is left to readers still using it)
+                with open(self._shard_path(shard), "rb") as f:
+                    m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[shard] = m
+            return m
+
+    def read(self, entry: ArchiveEntry) -> bytes:
+        m = self._map(entry.shard, entry.offset + entry.length)
+        return gzip.decompress(m[entry.offset : entry.offset + entry.length])
+
+    def get(self, key: str) -> t.Optional[bytes]:
+        entry = self.entry(key)
+        return self.read(entry) if entry else None
+
+
+# archives opened by read_page, one per archive dir and process (parsers run in worker processes)
+_readers: dict[Path, HtmlArchive] = {}
+
+
+def read_page(page: Page) -> bytes:
+    """
+    Content of a stored page: an html file or an archive entry
+    """
+    if isinstance(page, ArchiveEntry):
+        if page.archive_dir not in _readers:
+            _readers[page.archive_dir] = HtmlArchive(page.archive_dir)
+        return _readers[page.archive_dir].read(page)
+    with open(page, "rb") as f:
+        return f.read()
+
+
+def pack_html_dir(html_dir: Path, archive: HtmlArchive) -> int:
+    """
+    Store all "*.html" files found under html_dir into archive (keyed by file name), return their number
+    """
+    n = 0
+    for path in sorted(html_dir.rglob("*.html")):
+        archive.put(path.name, path.read_bytes())
+        n += 1
+    return n
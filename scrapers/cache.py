@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import typing as t
+from pathlib import Path
+from urllib.parse import (
+    parse_qsl,
+    urlencode,
+    urlsplit,
+)
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from scrapers.const import ENCODING
+
+CACHE_TTL = 30 * 24 * 3600  # entries older than this are evicted and fetched in full again
+CACHE_MAX_SIZE = 4 * 1024**3  # bytes of cached bodies, least recently stored entries are evicted first
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+# query parameters never written to disk (in metadata, nor hashed into keys)
+SECRET_PARAMS = frozenset({"api_key"})
+
+
+def redact_url(url: str) -> str:
+    """
+    url without its SECRET_PARAMS query parameters
+    """
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SECRET_PARAMS]
+    return parts._replace(query=urlencode(query)).geturl()
+
+
+class HttpCache:
+    """
+    On-disk store of GET response bodies and their validators (ETag / Last-Modified).
+
+    Layout: "{cache_dir}/{key_hash[:2]}/{key_hash}.json" (metadata) + "{key_hash}.body" (raw body).
+    """
+
+    def __init__(
+        self, cache_dir: Path, ttl: float = CACHE_TTL, max_size: int = CACHE_MAX_SIZE, fresh_for: float = 0
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        # entries younger than this are served without contacting the server at all
+        self.fresh_for = fresh_for
+        # guards _size and the files it accounts for; reentrant: eviction removes entries while holding it
+        self._lock = threading.RLock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._size = sum(p.stat().st_size for p in self.cache_dir.rglob("*.body"))
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        h = hashlib.sha256(key.encode(ENCODING)).hexdigest()
+        base = self.cache_dir / h[:2] / h
+        return base.with_suffix(".json"), base.with_suffix(".body")
+
+    def _remove(self, meta_path: Path, body_path: Path) -> None:
+        with self._lock:
+            if body_path.exists():
+                self._size -= body_path.stat().st_size
+                body_path.unlink()
+            meta_path.unlink(missing_ok=True)
+
+    def load(self, key: str) -> t.Optional[dict]:
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding=ENCODING) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return None
+        if not body_path.exists() or time.time() - meta["stored_at"] > self.ttl:
+            self._remove(meta_path, body_path)
+            return None
+        return meta
+
+    def is_fresh(self, meta: dict) -> bool:
+        return time.time() - meta["stored_at"] < self.fresh_for
+
+    @staticmethod
+    def conditional_headers(meta: dict) -> dict:
+        headers = {}
+        if meta["headers"].get("ETag"):
+            headers["If-None-Match"] = meta["headers"]["ETag"]
+        if meta["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+        return headers
+
+    def store(self, key: str, res: Response) -> None:
+        meta_path, body_path = self._paths(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        # write to temp files first: a concurrent reader never sees a partially written body
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        body_tmp = body_path.with_suffix(tmp_suffix)
+        with open(body_tmp, "wb") as f:
+            f.write(res.content)
+        with self._lock:
+            old_size = body_path.stat().st_size if body_path.exists() else 0
+            os.replace(body_tmp, body_path)
+            self._size += len(res.content) - old_size
+        self._write_meta(
+            meta_path,
+            {
+                "url": redact_url(res.url),
+                "stored_at": time.time(),
+                "encoding": res.encoding,
+                "headers": {h: res.headers[h] for h in KEPT_HEADERS if h in res.headers},
+            },
+        )
+        with self._lock:
+            # checked and evicted under the lock: concurrent stores don't both start an eviction
+            if self._size > self.max_size:
+                self.evict()
+
+    def touch(self, key: str, meta: dict) -> None:
+        """
+        Server confirmed (304) that the cached body is still current: restart its TTL
+        """
+        meta["stored_at"] = time.time()
+        self._write_meta(self._paths(key)[0], meta)
+
+    @staticmethod
+    def _write_meta(meta_path: Path, meta: dict) -> None:
+        meta_tmp = meta_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(meta_tmp, "w", encoding=ENCODING) as f:
+            json.dump(meta, f)
+        os.replace(meta_tmp, meta_path)
+
+    def to_response(self, key: str, meta: dict, cache_status: str) -> Response:
+        res = Response()
+        res.status_code = 200
+        res.url = meta["url"]
+        res.encoding = meta["encoding"]
+        res.headers = CaseInsensitiveDict({**meta["headers"], "X-Cache": cache_status})
+        with open(self._paths(key)[1], "rb") as f:
+            res._content = f.read()  # pylint: disable=protected-access
+        return res
+
+    def evict(self) -> None:
+        """
+        Drop expired entries, then the oldest ones until the cache is 10% below max_size
+        (so that eviction does not rescan the whole cache on every subsequent store)
+        """
+        with self._lock:
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        now = time.time()
+        for body_path in self.cache_dir.rglob("*.body"):
+            meta_path = body_path.with_suffix(".json")
+            try:
+                with open(meta_path, "r", encoding=ENCODING) as f:
+                    stored_at = json.load(f)["stored_at"]
+            except (FileNotFoundError, json.decoder.JSONDecodeError):
+                stored_at = 0
+            if now - stored_at > self.ttl:
+                self._remove(meta_path, body_path)
+            else:
+                entries.append((stored_at, meta_path, body_path))
+        entries.sort()
+        for _, meta_path, body_path in entries:
+            if self._size <= self.max_size * 0.9:
+                break
+            self._remove(meta_path, body_path)
@@ -0,0 +1,169 @@
+import email.utils
+import threading
+import time
+import typing as t
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from urllib.parse import urlsplit
+
+from requests import Response
+
+from scrapers.misc import get_url
+
+# requests in flight / requests per second allowed against a single host
+CONCURRENCY = 4
+RATE_LIMIT = 2.0
+
+K = t.TypeVar("K")
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to `capacity`
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+def _retry_after(value: t.Optional[str]) -> t.Optional[float]:
+    # Retry-After: seconds or an http date
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_float(res: Response, name: str) -> t.Optional[float]:
+    try:
+        return float(res.headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class AdaptivePacer:
+    """
+    Spaces requests to a single API by default_interval (a pace safe for its quota), slowed down on 429 and by
+    Retry-After. Goes faster (down to min_interval) only as far as X-RateLimit-Remaining / X-RateLimit-Reset headers
+    of responses allow it.
+    """
+
+    def __init__(
+        self, min_interval: float, default_interval: t.Optional[float] = None, max_interval: float = 3600.0
+    ) -> None:
+        self.min_interval = min_interval
+        self.default_interval = max(default_interval or min_interval, min_interval)
+        self.max_interval = max_interval
+        self.interval = self.default_interval
+        self._next = 0.0
+
+    def wait(self) -> None:
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def update(self, res: Response) -> None:
+        """
+        Adjust the pace to the response of the last request
+        """
+        now = time.monotonic()
+        retry_after = _retry_after(res.headers.get("Retry-After"))
+        remaining = _header_float(res, "X-RateLimit-Remaining")
+        reset = _header_float(res, "X-RateLimit-Reset")
+        if res.status_code == 429 or retry_after is not None:
+            self.interval = min(self.interval * 2, self.max_interval)
+            self._next = now + (retry_after if retry_after is not None else self.interval)
+            return
+        if remaining is not None and reset is not None:
+            # reset: seconds until the quota resets or its unix time
+            reset = reset - time.time() if reset > 1e9 else reset
+            # spread the remaining quota over the time left
+            self.interval = min(max(reset / max(remaining, 1), self.min_interval), self.max_interval)
+        else:
+            # no quota hints: recover from 429 backoffs, but not faster than the quota-safe default
+            self.interval = max(self.interval / 2, self.default_interval)
+        self._next = now + self.interval
+
+
+class Crawler:
+    """
+    Keeps up to `concurrency` requests in flight while limiting each host to `rate` requests per second
+    """
+
+    def __init__(self, concurrency: int = CONCURRENCY, rate: float = RATE_LIMIT) -> None:
+        self.concurrency = max(concurrency, 1)
+        self.rate = rate
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate)
+            return self._buckets[host]
+
+    def throttle(self, url: str) -> None:
+        """
+        Wait until a request to url's host is allowed
+        """
+        self._bucket(url).acquire()
+
+    def get(self, url: str) -> Response:
+        self.throttle(url)
+        return get_url(url)
+
+    def fetch_all(
+        self, jobs: t.Iterable[tuple[K, str]], fetch: t.Optional[t.Callable[[str], t.Any]] = None
+    ) -> t.Iterator[tuple[K, str, t.Any]]:
+        """
+        Fetch (key, url) jobs concurrently and yield (key, url, response) in completion order.
+        Jobs are pulled from the iterable lazily, only when a slot frees up.
+        fetch: called with each url instead of get (it must apply the host's rate limit itself, e.g. via get)
+        """
+        fetch = fetch or self.get
+        jobs_it = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="crawl") as pool:
+            pending: dict[Future, tuple[K, str]] = {}
+
+            def submit_next() -> None:
+                job = next(jobs_it, None)
+                if job is not None:
+                    pending[pool.submit(fetch, job[1])] = job
+
+            for _ in range(self.concurrency):
+                submit_next()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    key, url = pending.pop(fut)
+                    yield key, url, fut.result()
+                    submit_next()
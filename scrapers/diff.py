@@ -1,27 +1,15 @@
-#  type: ignore
-
 import csv
 import datetime
-import os
-import re
+import hashlib
+import json
+import sqlite3
+import typing as t
 from pathlib import Path
-from typing import (
-    Any,
-    Optional,
-)
 
 from scrapers.const import ENCODING
+from scrapers.matching import find_all_similar_games
 
-ENV_VAR_DATA_DIR = os.environ.get("DATA_DIR")
-if ENV_VAR_DATA_DIR is None:
-    raise ValueError("DATA_DIR env var is not set")
-DATA_DIR = Path(ENV_VAR_DATA_DIR)
-
-QZ_DESCR_DB_PATH = DATA_DIR / "qz" / "descr.csv"
-AG_DESCR_DB_PATH = DATA_DIR / "ag" / "descr.csv"
-MISSING_PATH = DATA_DIR / "qz" / "missing.csv"
-MATCHING_PATH = DATA_DIR / "qz" / "matching.csv"
-TARGET_SIMILARITY = 0.55
+MATCH_STORE_FILENAME = "matches.sqlite"
 
 COLUMNS_AG = [
     "id",
@@ -41,140 +29,185 @@ COLUMNS_AG = [
     "genre",
 ]
 
+# only these fields affect matching, a record's version is a hash of them
+MATCH_FIELDS_AG = ["name"]
+MATCH_FIELDS_QZ = ["name", "other_names"]
 
-def find_ngrams(text: str, number: int = 3) -> set[str]:
-    """
-    returns a set of ngrams for the given string
-    :param text: the string to find ngrams for
-    :param number: the length the ngrams should be. defaults to 3 (trigrams)
-    :return: set of ngram strings
-    """
 
-    if not text:
-        return set()
+def ts_similarity(ts1: datetime.datetime, ts2: datetime.datetime, days_diff: int) -> bool:
+    return abs((ts1 - ts2).days) < days_diff
 
-    words = [f"  {x} " for x in re.split(r"\W+", text.lower()) if x.strip()]
 
-    ngrams = set()
+def _read_db(path: Path) -> dict:
+    with open(path, mode="r", encoding=ENCODING) as f:
+        csv_reader = csv.DictReader(f)
+        return {row["id"]: row for row in csv_reader}
 
-    for word in words:
-        for x in range(0, len(word) - number + 1):
-            ngrams.add(word[x : x + number])
 
-    return ngrams
+def _version(record: dict, fields: list[str]) -> str:
+    return hashlib.sha1(json.dumps([record[f] for f in fields]).encode(ENCODING), usedforsecurity=False).hexdigest()
 
 
-def find_similarity(text1: str, text2: str, number: int = 3) -> float:
+class MatchStore:
     """
-    Finds the similarity between 2 strings using ngrams.
-    0 being completely different strings, and 1 being equal strings
+    Best QZ match (or no match) of every AG record, with versions of both records it was computed against,
+    plus versions of all QZ records seen by the last diff run.
     """
 
-    ngrams1 = find_ngrams(text1, number)
-    ngrams2 = find_ngrams(text2, number)
-
-    num_unique = len(ngrams1 | ngrams2)
-    num_equal = len(ngrams1 & ngrams2)
-
-    if num_unique == 0:
-        print(text1, text2)
-
-    return (float(num_equal) / float(num_unique)) if num_unique else 0
+    def __init__(self, db_path: Path) -> None:
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS matches ("
+            "ag_id TEXT PRIMARY KEY, ag_version TEXT NOT NULL, qz_id TEXT, qz_version TEXT, similarity REAL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS qz_records (qz_id TEXT PRIMARY KEY, qz_version TEXT NOT NULL)")
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM matches")
+        self._conn.execute("DELETE FROM qz_records")
+        self._conn.commit()
+
+    def matches(self) -> dict[str, tuple[str, t.Optional[str], t.Optional[float]]]:
+        return {
+            r[0]: (r[1], r[2], r[3])
+            for r in self._conn.execute("SELECT ag_id, ag_version, qz_id, similarity FROM matches")
+        }
+
+    def qz_versions(self) -> dict[str, str]:
+        return dict(self._conn.execute("SELECT qz_id, qz_version FROM qz_records").fetchall())
+
+    def save(
+        self,
+        matches: dict[str, t.Optional[tuple[float, str]]],
+        ag_versions: dict[str, str],
+        qz_versions: dict[str, str],
+    ) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM matches")
+            self._conn.executemany(
+                "INSERT INTO matches (ag_id, ag_version, qz_id, qz_version, similarity) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        (ag_id, ag_versions[ag_id], m[1], qz_versions[m[1]], m[0])
+                        if m
+                        else (ag_id, ag_versions[ag_id], None, None, None)
+                    )
+                    for ag_id, m in matches.items()
+                ),
+            )
+            self._conn.execute("DELETE FROM qz_records")
+            self._conn.executemany("INSERT INTO qz_records (qz_id, qz_version) VALUES (?, ?)", qz_versions.items())
+
+
+def _match_ids(descrs: dict, db: dict) -> dict[str, t.Optional[tuple[float, str]]]:
+    return {k: (m[0], m[1]["id"]) if m else None for k, m in find_all_similar_games(descrs, db).items()}
+
+
+def match_incremental(ag_db: dict, qz_db: dict, store: MatchStore) -> dict[str, t.Optional[tuple[float, str]]]:
+    """
+    Best QZ match (similarity, qz id) of every AG record, same as matching everything from scratch, but only:
+        - new/changed AG records and those whose stored best match changed or disappeared are matched against all QZ
+        - other AG records are matched against new/changed QZ records only, their stored match is kept unless beaten
+    Ties are resolved by the current QZ order, as in find_similar_games.
+    """
+    ag_versions = {k: _version(v, MATCH_FIELDS_AG) for k, v in ag_db.items()}
+    qz_versions = {k: _version(v, MATCH_FIELDS_QZ) for k, v in qz_db.items()}
+    old_qz_versions = store.qz_versions()
+    stale_qz = {k for k, ver in qz_versions.items() if old_qz_versions.get(k) != ver}
+    stale_qz |= old_qz_versions.keys() - qz_versions.keys()
+    stored = store.matches()
+
+    rematch = {
+        k
+        for k in ag_db
+        if k not in stored or stored[k][0] != ag_versions[k] or (stored[k][1] is not None and stored[k][1] in stale_qz)
+    }
+    keep = [k for k in ag_db if k not in rematch]
+    changed_qz_db = {k: v for k, v in qz_db.items() if k in stale_qz}
+    print(
+        f"diff: {len(rematch)} of {len(ag_db)} AG records to re-match, "
+        f"{len(keep)} to check against {len(changed_qz_db)} new/changed QZ records"
+    )
 
+    res = _match_ids({k: ag_db[k] for k in ag_db if k in rematch}, qz_db)
+    qz_pos = {k: i for i, k in enumerate(qz_db)}
+    delta = _match_ids({k: ag_db[k] for k in keep}, changed_qz_db) if changed_qz_db else {}
+    for k in keep:
+        _, qz_id, sim = stored[k]
+        best = (sim, qz_id) if qz_id is not None and sim is not None else None
+        new = delta.get(k)
+        if new and (best is None or (new[0], -qz_pos[new[1]]) > (best[0], -qz_pos[best[1]])):
+            best = new
+        res[k] = best
 
-def ts_similarity(ts1: datetime.datetime, ts2: datetime.datetime, days_diff: int) -> bool:
-    return abs((ts1 - ts2).days) < days_diff
+    store.save(res, ag_versions, qz_versions)
+    return {k: res[k] for k in ag_db}
 
 
-def find_similar_games(descr: dict, db: dict) -> Optional[tuple[float, Any]]:
-    res = []
-    for _, val in db.items():
-        sim = find_similarity(descr["name"], val["name"])
-        if sim >= TARGET_SIMILARITY:
-            res.append((sim, val))
-            # do not break here, there might be better matches further in db
-        elif val["other_names"]:
-            for othn in val["other_names"].split(","):
-                sim = find_similarity(descr["name"], othn)
-                if sim >= TARGET_SIMILARITY:
-                    res.append((sim, val))
-                    break
-    if not res:  # no similarities found
-        return None
-    elif len(res) > 1:
-        # find the best match among many
-        res.sort(key=lambda x: (x[0]), reverse=True)
-    return res[0]
-
-
-with open(QZ_DESCR_DB_PATH, mode="r", encoding=ENCODING) as f:
-    csv_reader = csv.DictReader(f)
-    qz_db = {row["id"]: row for row in csv_reader}
-
-with open(AG_DESCR_DB_PATH, mode="r", encoding=ENCODING) as f:
-    csv_reader = csv.DictReader(f)
-    ag_db = {row["id"]: row for row in csv_reader}
-
-misses = []
-matches = []
-manual: list[str] = []
-i = 0
-
-# trying to find games present in AG, but absent in QZ
-for _, v in ag_db.items():
-    print(f'{i} processing: {v["name"]}')
-    similar_games = find_similar_games(v, qz_db)
-    if similar_games is None:
-        misses.append(v)
-        print("\t\tmissing")
-    else:
-        matches.append((v, similar_games))
-        print("\t\tmatching")
-    i += 1
-
-print(f"missing: {len(misses)}")
-print(f"matches: {len(matches)}")
-print(f"manual: {len(manual)}")
-
-
-with open(MISSING_PATH, "w", encoding=ENCODING) as csvfile:
-    writer = csv.DictWriter(csvfile, fieldnames=COLUMNS_AG)
-    writer.writeheader()
-    for el in misses:
-        writer.writerow(el)
-
-
-with open(MATCHING_PATH, "w", encoding=ENCODING) as csvfile:
-    writer = csv.DictWriter(
-        csvfile,
-        fieldnames=[
-            "id_ag",
-            "name_ag",
-            "date_ag",
-            "author_ag",
-            "publisher_ag",
-            "similarity",
-            "id_qz",
-            "name_qz",
-            "date_qz",
-            "author_qz",
-            "publisher_qz",
-        ],
-    )
-    writer.writeheader()
-    for el in matches:
-        writer.writerow(
-            {
-                "id_ag": el[0]["id"],
-                "name_ag": el[0]["name"],
-                "date_ag": el[0]["datePublished"],
-                "author_ag": el[0]["author"],
-                "publisher_ag": el[0]["publisher"],
-                "similarity": el[1][0],
-                "id_qz": el[1][1]["id"],
-                "name_qz": el[1][1]["name"],
-                "date_qz": el[1][1]["date_published"],
-                "author_qz": el[1][1]["developer"],
-                "publisher_qz": el[1][1]["publisher"],
-            }
+def run(data_path: Path, rematch: bool = False) -> None:
+    """
+    Find games present in AG, but absent in QZ: writes "{data_path}/qz/missing.csv" and "{data_path}/qz/matching.csv".
+    Matches are kept in a persistent store, so a re-run only re-matches records added or changed since the last one
+    (rematch=True: match everything from scratch).
+    """
+    qz_db = _read_db(data_path / "qz" / "descr.csv")
+    ag_db = _read_db(data_path / "ag" / "descr.csv")
+
+    store = MatchStore(data_path / "qz" / MATCH_STORE_FILENAME)
+    try:
+        if rematch:
+            store.clear()
+        similar = match_incremental(ag_db, qz_db, store)
+    finally:
+        store.close()
+
+    misses = [ag_db[k] for k, m in similar.items() if m is None]
+    matches = [(ag_db[k], (m[0], qz_db[m[1]])) for k, m in similar.items() if m is not None]
+
+    print(f"missing: {len(misses)}")
+    print(f"matches: {len(matches)}")
+
+    with open(data_path / "qz" / "missing.csv", "w", encoding=ENCODING) as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=COLUMNS_AG, extrasaction="ignore")
+        writer.writeheader()
+        for el in misses:
+            writer.writerow(el)
+
+    with open(data_path / "qz" / "matching.csv", "w", encoding=ENCODING) as csvfile:
+        writer = csv.DictWriter(
+            csvfile,
+            fieldnames=[
+                "id_ag",
+                "name_ag",
+                "date_ag",
+                "author_ag",
+                "publisher_ag",
+                "similarity",
+                "id_qz",
+                "name_qz",
+                "date_qz",
+                "author_qz",
+                "publisher_qz",
+            ],
         )
+        writer.writeheader()
+        for el in matches:
+            writer.writerow(
+                {
+                    "id_ag": el[0]["id"],
+                    "name_ag": el[0]["name"],
+                    "date_ag": el[0]["datePublished"],
+                    "author_ag": el[0]["author"],
+                    "publisher_ag": el[0]["publisher"],
+                    "similarity": el[1][0],
+                    "id_qz": el[1][1]["id"],
+                    "name_qz": el[1][1]["name"],
+                    "date_qz": el[1][1]["date_published"],
+                    "author_qz": el[1][1]["developer"],
+                    "publisher_qz": el[1][1]["publisher"],
+                }
+            )
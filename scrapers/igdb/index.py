@@ -1,39 +1,80 @@
 import csv
 import json
+import typing as t
+from contextlib import nullcontext
 from pathlib import Path
 
-from scrapers.const import ENCODING
-from scrapers.igdb.misc import get_data
+from scrapers.igdb.misc import (
+    add_where,
+    get_data,
+    iter_data,
+)
+from scrapers.igdb.store import (
+    STORE_FILENAME,
+    IgdbStore,
+)
+from scrapers.output import (
+    DUMP_JSON,
+    PARQUET_INT,
+    csv_writer,
+    dump_records,
+    flat_parquet_writer,
+    parquet_writer,
+    require_pyarrow,
+)
+from scrapers.profiling import (
+    CSV_WRITE,
+    IGDB_TRANSFORM,
+    INDEX_FETCH,
+    stage,
+)
 
 HOST_URL = "https://api.igdb.com/v4"
 
-JSON_INDENT = 4
-
 GENRE_ID_POINT_AND_CLICK = 2
 GENRE_PUZZLE = 9
 GENRE_ID_ADVENTURE = 31
+# scraped games: those having any of these genres
+GAMES_GENRES = (GENRE_ID_ADVENTURE, GENRE_ID_POINT_AND_CLICK, GENRE_PUZZLE)
+# "=" with a set matches games having any of the genres
+GAMES_WHERE = f"genres = ({','.join(str(g) for g in GAMES_GENRES)})"
 
+QUERIES = {
+    "genres": "fields *;exclude checksum,url;sort id asc;",
+    "platforms": "fields *,platform_logo.image_id,versions.*,platform_family.name;exclude checksum,url;sort id asc;",
+    "companies": (
+        "fields *, logo.image_id, websites.url, websites.category; "
+        "exclude developed, published, checksum, url; "
+        "sort id asc;"
+    ),
+}
+COMPANY_ROLES = ("developer", "publisher", "porting", "supporting")
+# csv outputs of endpoints other than games
+CSV_FIELDS = {
+    "genres": ["id", "name"],
+    "platforms": ["id", "name", "abbreviation", "alternative_name", "slug"],
+    "companies": ["id", "name"],
+}
 
-def get_genres() -> list:
-    return get_data(f"{HOST_URL}/genres", data="fields *;exclude checksum,url;sort id asc;")
+# incremental sync re-fetches records updated up to this many seconds before the last high-water mark,
+# so records updated while the previous sync was running are not missed (re-fetched ones are simply replaced)
+SYNC_OVERLAP = 3600
 
 
-def get_platforms() -> list:
-    return get_data(
-        f"{HOST_URL}/platforms",
-        data="fields *,platform_logo.image_id,versions.*,platform_family.name;exclude checksum,url;sort id asc;",
-    )
+def _since(data: str, since: t.Optional[int]) -> str:
+    return add_where(data, f"updated_at >= {since}") if since is not None else data
 
 
-def get_companies() -> list:
-    return get_data(
-        f"{HOST_URL}/companies",
-        data=(
-            "fields *, logo.image_id, websites.url, websites.category; "
-            "exclude developed, published, checksum, url; "
-            "sort id asc;"
-        ),
-    )
+def get_genres(cursor: bool = False, since: t.Optional[int] = None) -> list:
+    return list(iter_records("genres", cursor=cursor, since=since))
+
+
+def get_platforms(cursor: bool = False, since: t.Optional[int] = None) -> list:
+    return list(iter_records("platforms", cursor=cursor, since=since))
+
+
+def get_companies(cursor: bool = False, since: t.Optional[int] = None) -> list:
+    return list(iter_records("companies", cursor=cursor, since=since))
 
 
 def get_age_ratings() -> list:
@@ -50,186 +91,298 @@ def get_regions() -> list:
     )
 
 
-def get_games() -> list:
-    res = []
-    for genre in (GENRE_ID_ADVENTURE, GENRE_ID_POINT_AND_CLICK, GENRE_PUZZLE):
-        res += get_data(
-            f"{HOST_URL}/games",
-            data=f"\
-                fields\
-                    *\
-                    ,alternative_names.name\
-                    ,bundles.name\
-                    ,cover.image_id\
-                    ,franchises.name\
-                    ,game_modes.name\
-                    ,genres.name\
-                    ,involved_companies.*\
-                    ,game_engines.name\
-                    ,release_dates.human,release_dates.region\
-                    ,age_ratings.category,age_ratings.rating,age_ratings.synopsis,age_ratings.content_descriptions.description\
-                    ,screenshots.image_id,screenshots.height,screenshots.width\
-                ;sort id asc;where genres={[genre]};",
-        )
-    return res
+def _games_query(where: str) -> str:
+    return f"\
+    fields\
+        *\
+        ,alternative_names.name\
+        ,bundles.name\
+        ,cover.image_id\
+        ,franchises.name\
+        ,game_modes.name\
+        ,genres.name\
+        ,involved_companies.*\
+        ,game_engines.name\
+        ,release_dates.human,release_dates.region\
+        ,age_ratings.category,age_ratings.rating,age_ratings.synopsis,age_ratings.content_descriptions.description\
+        ,screenshots.image_id,screenshots.height,screenshots.width\
+    ;sort id asc;where {where};"
+
+
+def get_games(cursor: bool = False, since: t.Optional[int] = None, union: bool = False) -> list:
+    return list(iter_records("games", cursor=cursor, since=since, union=union))
+
+
+def _queries(endpoint: str, union: bool = False) -> list[str]:
+    if endpoint == "games":
+        if union:
+            return [_games_query(GAMES_WHERE)]
+        return [_games_query(f"genres={[genre]}") for genre in GAMES_GENRES]
+    return [QUERIES[endpoint]]
+
+
+def iter_records(
+    endpoint: str, cursor: bool = False, since: t.Optional[int] = None, union: bool = False
+) -> t.Iterator[dict]:
+    """
+    Stream records of endpoint (updated since `since`, if set) page by page as they arrive.
+    union=True: fetch games of all GAMES_GENRES with a single query (instead of one query per genre,
+    which returns games having several of them two or three times), deduplicated by id
+    """
+    seen_ids: set[int] = set()
+    for data in _queries(endpoint, union):
+        for page in iter_data(f"{HOST_URL}/{endpoint}", _since(data, since), cursor=cursor):
+            if not union:
+                yield from page
+                continue
+            for record in page:
+                # offset pages may overlap when the catalog changes during the pull
+                if record["id"] not in seen_ids:
+                    seen_ids.add(record["id"])
+                    yield record
+
+
+def _first_genre(game: dict) -> t.Optional[int]:
+    genres = {g["id"] for g in game.get("genres", [])}
+    return next((g for g in GAMES_GENRES if g in genres), None)
+
+
+def _union_savings(games: t.Iterable[dict]) -> t.Iterator[dict]:
+    """
+    Pass games through, reporting how many rows/bytes per-genre queries would have downloaded again
+    (a game having k of GAMES_GENRES is returned by k of them)
+    """
+    n = rows = size = 0
+    for game in games:
+        dups = len({g["id"] for g in game.get("genres", [])} & set(GAMES_GENRES)) - 1
+        if dups > 0:
+            rows += dups
+            size += dups * len(json.dumps(game))
+        n += 1
+        yield game
+    print(f"igdb: games: union query returned {n} rows, saved {rows} duplicate rows (~{size / 1024**2:.1f} MB)")
+
+
+def _in_genre_order(games: t.Iterable[dict]) -> t.Iterator[dict]:
+    """
+    Union results in the order per-genre queries return them once deduplicated: games of the 1st genre by id,
+    then games of the 2nd genre (not of the 1st one) by id, etc. Iterates games once per genre.
+    """
+    for genre in GAMES_GENRES:
+        yield from (g for g in games if _first_genre(g) == genre)
 
 
 def get_game_by_id(game_id: int) -> list:
-    return get_data(
-        f"{HOST_URL}/games",
-        data=f"\
-            fields\
-                *\
-                ,alternative_names.name\
-                ,bundles.name\
-                ,cover.image_id\
-                ,franchises.name\
-                ,game_modes.name\
-                ,genres.name\
-                ,involved_companies.*\
-                ,game_engines.name\
-                ,release_dates.human,release_dates.region\
-                ,age_ratings.category,age_ratings.rating,age_ratings.synopsis,age_ratings.content_descriptions.description\
-                ,screenshots.image_id,screenshots.height,screenshots.width\
-            ;sort id asc;where id={game_id};",
+    return get_data(f"{HOST_URL}/games", data=_games_query(f"id={game_id}"))
+
+
+def _write_csv(
+    data_path: Path, name: str, records: t.Iterable[dict], fields_to_write: list[str], parquet: bool = False
+) -> None:
+    # csv and parquet files are both replaced only once complete
+    with csv_writer(data_path / f"{name}.csv", fields_to_write) as writer, (
+        flat_parquet_writer(data_path / f"{name}.parquet", fields_to_write, {"id": PARQUET_INT})
+        if parquet
+        else nullcontext(None)
+    ) as write_parquet:
+        for i in records:
+            row = {field: i.get(field, None) for field in fields_to_write}
+            writer.writerow(row)
+            if write_parquet:
+                write_parquet(row)
+
+
+def _ids_query(endpoint: str) -> str:
+    # same records as _queries(endpoint), ids only
+    return f"fields id;sort id asc;where {GAMES_WHERE};" if endpoint == "games" else "fields id;sort id asc;"
+
+
+def _sync(store: IgdbStore, endpoint: str, cursor: bool, union: bool) -> t.Iterator[dict]:
+    """
+    Fetch records updated since the last sync of endpoint, merge them into the local store, drop the ones IGDB
+    doesn't return anymore (deleted, or games which lost all of GAMES_GENRES; found with an id-only pull of the
+    endpoint, a few requests) and return the whole (updated) store content of endpoint
+    """
+    high_water = store.high_water(endpoint)
+    since = high_water - SYNC_OVERLAP if high_water is not None else None
+    records = iter_records(endpoint, cursor=cursor, since=since, union=union)
+    n = store.upsert(endpoint, _union_savings(records) if union and endpoint == "games" else records)
+    ids = (r["id"] for page in iter_data(f"{HOST_URL}/{endpoint}", _ids_query(endpoint), cursor=cursor) for r in page)
+    removed = store.prune(endpoint, ids)
+    print(
+        f"igdb: {endpoint}: {n} new/updated records"
+        + (f" since {since}" if since is not None else "")
+        + f", {removed} removed"
+    )
+    return store.records(endpoint)
+
+
+# games.csv columns; games.parquet has the same ones, with list/struct types instead of postgres arrays and json
+GAMES_FIELDS = [
+    "name",
+    "alternative_names",
+    "short_descr",
+    "long_descr",
+    "genres",
+    "companies",
+    "platforms",
+    "media_assets",
+    "esrb_rating",
+    "igdb",
+]
+
+
+def _games_schema() -> t.Any:
+    pa = require_pyarrow()
+    ids = pa.list_(pa.int64())
+    company = pa.struct([(f, pa.int64() if f == "company" else pa.bool_()) for f in ("company", *COMPANY_ROLES)])
+    screenshot = pa.struct([("height", pa.int64()), ("width", pa.int64()), ("image_id", pa.string())])
+    return pa.schema(
+        [
+            ("name", pa.string()),
+            ("alternative_names", pa.list_(pa.string())),
+            ("short_descr", pa.string()),
+            ("long_descr", pa.string()),
+            ("genres", ids),
+            ("companies", pa.list_(company)),
+            ("platforms", ids),
+            (
+                "media_assets",
+                pa.struct([("screenshots", pa.list_(screenshot)), ("cover", pa.struct([("image_id", pa.string())]))]),
+            ),
+            ("esrb_rating", pa.int64()),
+            ("igdb", pa.struct([("id", pa.int64()), ("slug", pa.string()), ("similar_ids", ids)])),
+        ]
     )
 
 
-def run(data_path: Path) -> None:
-    data_path.mkdir(parents=True, exist_ok=True)
-
-    genres = get_genres()
-    with open(data_path / "genres.json", "w", encoding=ENCODING) as f:
-        json.dump(genres, f, indent=JSON_INDENT)
-
-    fields_to_write = ["id", "name"]
-    with open(data_path / "genres.csv", "w", newline="", encoding=ENCODING) as f:
-        writer = csv.DictWriter(f, fieldnames=fields_to_write)
-        writer.writeheader()
-        for i in genres:
-            writer.writerow({field: i[field] for field in fields_to_write})
-
-    platforms = get_platforms()
-    with open(data_path / "platforms.json", "w", encoding=ENCODING) as f:
-        json.dump(platforms, f, indent=JSON_INDENT)
-
-    fields_to_write = ["id", "name", "abbreviation", "alternative_name", "slug"]
-    with open(data_path / "platforms.csv", "w", newline="", encoding=ENCODING) as f:
-        writer = csv.DictWriter(f, fieldnames=fields_to_write)
-        writer.writeheader()
-        for i in platforms:
-            writer.writerow({field: i.get(field, None) for field in fields_to_write})
-
-    companies = get_companies()
-    with open(data_path / "companies.json", "w", encoding=ENCODING) as f:
-        json.dump(companies, f, indent=JSON_INDENT)
-
-    fields_to_write = ["id", "name"]
-    with open(data_path / "companies.csv", "w", newline="", encoding=ENCODING) as f:
-        writer = csv.DictWriter(f, fieldnames=fields_to_write)
-        writer.writeheader()
-        for i in companies:
-            writer.writerow({field: i[field] for field in fields_to_write})
-
-    games = get_games()
-    with open(data_path / "games.json", "w", encoding=ENCODING) as f:
-        json.dump(games, f, indent=JSON_INDENT)
-
-    fields_to_write = [
-        "name",
-        "alternative_names",
-        "short_descr",
-        "long_descr",
-        "genres",
-        "companies",
-        "platforms",
-        "media_assets",
-        "esrb_rating",
-        "igdb",
-    ]
-    # shortcut: comment all above and uncomment this
-    # with open(data_path / "games.json", "r", encoding=ENCODING) as ff:
-    #     games = json.load(ff)
-
-    # postgres' COPY supports only UTF-8 encoding
-    with open(data_path / "games.csv", "w", newline="", encoding=ENCODING) as f:
-        writer = csv.DictWriter(f, fieldnames=fields_to_write, quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
-        writer.writeheader()
+def _game_record(i: dict) -> dict:
+    """
+    Output record of a game, with lists and dicts (absent/empty values of the source left as they are)
+    """
+    # alternative_names
+    alternative_names = i.get("alternative_names", None)
+    if alternative_names:
+        alternative_names = [an["name"] for an in alternative_names]
+
+    # companies
+    companies = i.get("involved_companies", None)
+    if companies:
+        companies = [{"company": c["company"], **{r: c[r] for r in COMPANY_ROLES}} for c in companies]
+
+    # esrb_rating
+    age_ratings = i.get("age_ratings", None)
+    esrb_rating = None
+    if age_ratings:
+        for ar in age_ratings:
+            if ar["category"] == 1:
+                esrb_rating = ar["rating"]
+                break
+
+    # media_assets
+    screenshots = i.get("screenshots", None)
+    if screenshots:
+        screenshots = [
+            {
+                "height": s.get("height", None),
+                "width": s.get("width", None),
+                "image_id": s["image_id"],
+            }
+            for s in screenshots
+        ]
+    cover = {"image_id": i["cover"]["image_id"]} if "cover" in i else None
+
+    return {
+        "name": i["name"],
+        "alternative_names": alternative_names,
+        "short_descr": i.get("summary", None),
+        "long_descr": i.get("storyline", None),
+        "genres": [g["id"] for g in i["genres"]],
+        "companies": companies,
+        "platforms": i.get("platforms", None),
+        "media_assets": {"screenshots": screenshots, "cover": cover},
+        "esrb_rating": esrb_rating,
+        "igdb": {"id": i["id"], "slug": i["slug"], "similar_ids": i.get("similar_games", None)},
+    }
+
+
+def _csv_row(record: dict) -> dict:
+    # postgres' array literals for lists of scalars, json for the rest
+    alternative_names = record["alternative_names"]
+    if alternative_names:
+        alternative_names = "{" + ",".join(['"' + an.replace('"', "") + '"' for an in alternative_names]) + "}"
+    platforms = record["platforms"]
+    if platforms:
+        platforms = "{" + ",".join([str(p) for p in platforms]) + "}"
+    companies = record["companies"]
+    return {
+        **record,
+        "alternative_names": alternative_names,
+        "genres": "{" + ",".join([str(g) for g in record["genres"]]) + "}",
+        "companies": json.dumps(companies) if companies else companies,
+        "platforms": platforms,
+        "media_assets": json.dumps(record["media_assets"]),
+        "igdb": json.dumps(record["igdb"]),
+    }
+
+
+def write_games_csv(data_path: Path, games: t.Iterable[dict], parquet: bool = False) -> None:
+    """
+    Write games.csv (and games.parquet when parquet=True, in the same pass over games)
+    """
+    # postgres' COPY supports only UTF-8 encoding (csv_writer's); games.csv and games.parquet are replaced only once
+    # complete, a failed run leaves the previous pair
+    with csv_writer(data_path / "games.csv", GAMES_FIELDS, quoting=csv.QUOTE_MINIMAL, lineterminator="\n") as writer, (
+        parquet_writer(data_path / "games.parquet", _games_schema()) if parquet else nullcontext(None)
+    ) as write_parquet:
         # there are duplicates because of how igdb handles genres parameter
         known_slugs = set()
         for i in games:
-            # igdb
             if i["slug"] in known_slugs:
                 continue
-            igdb = json.dumps({"id": i["id"], "slug": i["slug"], "similar_ids": i.get("similar_games", None)})
             known_slugs.add(i["slug"])
-
-            # alternative_names
-            alternative_names = i.get("alternative_names", None)
-            if alternative_names:
-                alternative_names = (
-                    "{" + ",".join(['"' + an["name"].replace('"', "") + '"' for an in alternative_names]) + "}"
-                )
-
-            # genres
-            genres_str = "{" + ",".join([str(g["id"]) for g in i["genres"]]) + "}"
-
-            # platforms
-            platforms_str = i.get("platforms", None)
-            if platforms_str:
-                platforms_str = "{" + ",".join([str(p) for p in i["platforms"]]) + "}"
-
-            # companies
-            companies_str = i.get("involved_companies", None)
-            if companies_str:
-                companies_str = json.dumps(
-                    [
-                        {
-                            "company": c["company"],
-                            "developer": c["developer"],
-                            "publisher": c["publisher"],
-                            "porting": c["porting"],
-                            "supporting": c["supporting"],
-                        }
-                        for c in companies_str
-                    ]
-                )
-
-            # esrb_rating
-            age_ratings = i.get("age_ratings", None)
-            esrb_rating = None
-            if age_ratings:
-                for ar in age_ratings:
-                    if ar["category"] == 1:
-                        esrb_rating = ar["rating"]
-                        break
-
-            # media_assets
-            screenshots = i.get("screenshots", None)
-            if screenshots:
-                screenshots = [
-                    {
-                        "height": s.get("height", None),
-                        "width": s.get("width", None),
-                        "image_id": s["image_id"],
-                    }
-                    for s in screenshots
-                ]
-            cover = {"image_id": i["cover"]["image_id"]} if "cover" in i else None
-            media_assets = {"screenshots": screenshots, "cover": cover}
-            media_assets_str = json.dumps(media_assets)
-
-            writer.writerow(
-                {
-                    "name": i["name"],
-                    "alternative_names": alternative_names,
-                    "short_descr": i.get("summary", None),
-                    "long_descr": i.get("storyline", None),
-                    "genres": genres_str,
-                    "companies": companies_str,
-                    "platforms": platforms_str,
-                    "media_assets": media_assets_str,
-                    "esrb_rating": esrb_rating,
-                    "igdb": igdb,
-                }
-            )
+            record = _game_record(i)
+            writer.writerow(_csv_row(record))
+            if write_parquet:
+                write_parquet(record)
+
+
+def run(
+    data_path: Path,
+    cursor: bool = False,
+    incremental: bool = False,
+    dump_format: str = DUMP_JSON,
+    union: bool = False,
+    parquet: bool = False,
+) -> None:
+    """
+    cursor=True: page through IGDB by id (keyset pagination) instead of parallel offset pages
+    incremental=True: fetch only records updated since the previous incremental run, merge them into a local store
+    (keyed by id), prune records gone from IGDB and regenerate outputs from it; the first run pulls everything
+    dump_format: raw dumps as one pretty-printed json array, or compressed NDJSON (gzip/zstd) appended page by page,
+    the csv transforms then stream records back from it, so memory stays flat whatever the catalog size
+    union=True: fetch games of all genres with one query; games.json has no duplicates, games.csv is unchanged
+    parquet=True: also write each csv output as parquet (lists and structs instead of postgres arrays and json)
+    """
+    data_path.mkdir(parents=True, exist_ok=True)
+    store = IgdbStore(data_path / STORE_FILENAME) if incremental else None
+    try:
+        for endpoint in (*CSV_FIELDS, "games"):
+            # records are fetched (and merged into the store) while dumped
+            with stage(INDEX_FETCH):
+                if store:
+                    records = _sync(store, endpoint, cursor, union)
+                else:
+                    records = iter_records(endpoint, cursor=cursor, union=union)
+                    if union and endpoint == "games":
+                        records = _union_savings(records)
+                records = dump_records(data_path, endpoint, records, dump_format)
+            if endpoint == "games":
+                with stage(IGDB_TRANSFORM):
+                    write_games_csv(data_path, _in_genre_order(records) if union else records, parquet=parquet)
+            else:
+                with stage(CSV_WRITE):
+                    _write_csv(data_path, endpoint, records, CSV_FIELDS[endpoint], parquet=parquet)
+    finally:
+        if store:
+            store.close()
@@ -1,17 +1,37 @@
+import json
+import math
 import os
+import re
+import threading
 import time
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import requests
 
+from scrapers.const import ENCODING
+from scrapers.crawl import TokenBucket
 from scrapers.misc import post_url
 
 CLIENT_ID = os.environ.get("IGDB_CLIENT_ID")
 CLIENT_SECRET = os.environ.get("IGDB_CLIENT_SECRET")
-MIN_SLEEP = 0.25
+# access tokens are valid for ~60 days, reuse them across runs
+TOKEN_CACHE_PATH = Path(os.environ.get("IGDB_TOKEN_CACHE", Path.home() / ".cache" / "scrapers" / "igdb_token.json"))
+TOKEN_EXPIRY_MARGIN = 300  # seconds, don't use a cached token this close to its expiry
 
+# https://api-docs.igdb.com/#rate-limits: 4 requests per second, up to 8 open requests
+MAX_RATE = 4
+MAX_IN_FLIGHT = 8
+PAGE_LIMIT = 500  # max rows returned by one query
+MULTIQUERY_MAX = 10  # max queries in one /multiquery request
 
-def get_access_token() -> str:
+_rate_limiter = TokenBucket(MAX_RATE)
+_token: t.Optional[str] = None
+_token_lock = threading.Lock()
+
+
+def _request_access_token() -> dict:
     # POST: https://id.twitch.tv/oauth2/token?client_id=abcde&client_secret=fghijk&grant_type=client_credentials
     res = post_url(
         "https://id.twitch.tv/oauth2/token",
@@ -21,32 +41,162 @@ def get_access_token() -> str:
             "grant_type": "client_credentials",
         },
     )
-    return res.json()["access_token"]
+    return res.json()
+
+
+def _load_token() -> t.Optional[str]:
+    try:
+        with open(TOKEN_CACHE_PATH, "r", encoding=ENCODING) as f:
+            cached = json.load(f)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return None
+    if cached.get("client_id") != CLIENT_ID or cached.get("expires_at", 0) - TOKEN_EXPIRY_MARGIN < time.time():
+        return None
+    return cached["access_token"]
+
+
+def _save_token(token: dict) -> None:
+    TOKEN_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = TOKEN_CACHE_PATH.with_name(TOKEN_CACHE_PATH.name + ".tmp")
+    # readable by the owner only: the token grants API access
+    with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding=ENCODING) as f:
+        json.dump(
+            {
+                "client_id": CLIENT_ID,
+                "access_token": token["access_token"],
+                "expires_at": time.time() + token["expires_in"],
+            },
+            f,
+        )
+    os.replace(tmp_path, TOKEN_CACHE_PATH)
 
 
-ACCESS_TOKEN = get_access_token()
+def get_access_token(stale: t.Optional[str] = None) -> str:
+    """
+    Access token from memory or the on-disk cache; a new one is requested (and cached) only when there is none,
+    it expired or the API rejected it (stale)
+    """
+    global _token  # pylint: disable=global-statement
+    with _token_lock:
+        if _token is None or _token == stale:
+            token = _load_token()
+            if token is None or token == stale:
+                res = _request_access_token()
+                if "access_token" not in res:
+                    raise ValueError(f"error getting IGDB access token: {res}")
+                _save_token(res)
+                token = res["access_token"]
+            _token = token
+        return _token
 
 
 def _post_url(url: str, data: t.Optional[str] = None) -> requests.Response:
-    return post_url(
-        url,
-        headers={"Client-ID": CLIENT_ID, "Authorization": f"Bearer {ACCESS_TOKEN}", "Accept": "application/json"},
-        data=data,
+    token = get_access_token()
+    for _ in range(2):
+        _rate_limiter.acquire()
+        res = post_url(
+            url,
+            headers={"Client-ID": CLIENT_ID, "Authorization": f"Bearer {token}", "Accept": "application/json"},
+            data=data,
+        )
+        if res.status_code != 401:
+            break
+        # token expired or was revoked
+        token = get_access_token(stale=token)
+    return res
+
+
+def _is_error(res: t.Any) -> bool:
+    return bool(res) and ("id" not in res[0]) and ("status" in res[0]) and (res[0]["status"] != 200)
+
+
+def get_count(url: str, data: str) -> int:
+    res = _post_url(url=f"{url}/count", data=data).json()
+    if "count" not in res:
+        raise ValueError(f"error counting {url}: {res}")
+    return res["count"]
+
+
+def _get_pages(url: str, data: str, offsets: list[int]) -> list[dict]:
+    """
+    Fetch pages starting at offsets with a single /multiquery request
+    """
+    base_url, endpoint = url.rsplit("/", 1)
+    body = "".join(
+        f'query {endpoint} "{offset}" {{ {data}offset {offset};limit {PAGE_LIMIT}; }};' for offset in offsets
     )
+    res = _post_url(url=f"{base_url}/multiquery", data=body).json()
+    if _is_error(res) or len(res) != len(offsets):
+        raise ValueError(f"error getting {url} pages at {offsets}: {res}")
+    pages = {int(q["name"]): q["result"] for q in res}
+    return [row for offset in offsets for row in pages[offset]]
+
+
+def add_where(data: str, condition: str) -> str:
+    """
+    AND condition into the where clause of data (an apicalypse query), or add a where clause if there is none
+    """
+    data, found = re.subn(r"where\s+([^;]*);", lambda m: f"where ({m.group(1)}) & {condition};", data, count=1)
+    if not found:
+        data += f"where {condition};"
+    return data
+
+
+def _with_cursor(data: str, last_id: int) -> str:
+    data = add_where(data, f"id > {last_id}")
+    if not re.search(r"sort\s+id\s+asc\s*;", data):
+        raise ValueError(f"cursor pagination needs 'sort id asc;' in the query: {data}")
+    return data
 
 
-def get_data(url: str, data: str) -> list[dict]:
-    offset = 0
-    limit = 500
-    res = []
+def iter_pages(url: str, data: str) -> t.Iterator[list[dict]]:
+    """
+    Keyset pagination: yields pages of rows matching data (an apicalypse query sorted by id, without offset/limit)
+    as they arrive, each next page starts after the last id seen, so deep pages are as fast as the first one and
+    rows inserted/deleted mid-pull don't shift pages
+    """
+    last_id = 0
     while True:
-        cur_res = _post_url(
-            url=url,
-            data=data + f"offset {offset};limit {limit};",
-        ).json()
-        if not cur_res or (("id" not in cur_res[0]) and ("status" in cur_res[0]) and (cur_res[0]["status"] != 200)):
-            break
-        res += cur_res
-        offset += limit
-        time.sleep(MIN_SLEEP)
-    return res
+        page = _post_url(url=url, data=_with_cursor(data, last_id) + f"limit {PAGE_LIMIT};").json()
+        if _is_error(page):
+            raise ValueError(f"error getting {url} after id {last_id}: {page}")
+        if page:
+            yield page
+        if len(page) < PAGE_LIMIT:
+            return
+        last_id = page[-1]["id"]
+
+
+def iter_data(url: str, data: str, cursor: bool = False) -> t.Iterator[list[dict]]:
+    """
+    Yield pages of rows matching data (an apicalypse query without offset/limit) in id order, as they arrive:
+    counts them first, then fetches pages in parallel, batched MULTIQUERY_MAX pages per /multiquery request,
+    within IGDB's rate limits.
+    cursor=True: sequential keyset pagination (see iter_pages)
+    """
+    if cursor:
+        yield from iter_pages(url, data)
+        return
+    count = get_count(url, data)
+    offsets = [i * PAGE_LIMIT for i in range(math.ceil(count / PAGE_LIMIT))]
+    batches = [offsets[i : i + MULTIQUERY_MAX] for i in range(0, len(offsets), MULTIQUERY_MAX)]
+    n = 0
+    with ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="igdb") as pool:
+        # map() keeps the order of batches, so rows come in the same order as with sequential paging
+        for rows in pool.map(lambda b: _get_pages(url, data, b), batches):
+            n += len(rows)
+            yield rows
+    # the last page is full: rows may have been added since counting, continue sequentially until a short page
+    offset = len(offsets) * PAGE_LIMIT
+    while n == offset:
+        rows = _get_pages(url, data, [offset])
+        n += len(rows)
+        offset += PAGE_LIMIT
+        yield rows
+
+
+def get_data(url: str, data: str, cursor: bool = False) -> list[dict]:
+    """
+    All rows of iter_data as one list
+    """
+    return [row for rows in iter_data(url, data, cursor) for row in rows]
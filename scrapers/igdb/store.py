@@ -0,0 +1,77 @@
+import json
+import sqlite3
+import typing as t
+from pathlib import Path
+
+STORE_FILENAME = "store.sqlite"
+
+
+class IgdbStore:
+    """
+    Local copy of IGDB endpoints (genres, platforms, games, ...) keyed by record id,
+    plus the high-water updated_at of each endpoint, so that syncs only fetch records changed since the last one.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "endpoint TEXT NOT NULL, id INTEGER NOT NULL, updated_at INTEGER, record TEXT NOT NULL, "
+            "PRIMARY KEY (endpoint, id))"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sync (endpoint TEXT PRIMARY KEY, high_water INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def high_water(self, endpoint: str) -> t.Optional[int]:
+        """
+        Max updated_at seen for endpoint, None if it was never synced
+        """
+        row = self._conn.execute("SELECT high_water FROM sync WHERE endpoint = ?", (endpoint,)).fetchone()
+        return row[0] if row else None
+
+    def upsert(self, endpoint: str, records: t.Iterable[dict]) -> int:
+        """
+        Insert new records and replace changed ones, then advance the endpoint's high-water mark.
+        Returns the number of records written.
+        """
+        high_water = self.high_water(endpoint) or 0
+        n = 0
+        with self._conn:
+            for r in records:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO records (endpoint, id, updated_at, record) VALUES (?, ?, ?, ?)",
+                    (endpoint, r["id"], r.get("updated_at"), json.dumps(r)),
+                )
+                high_water = max(high_water, r.get("updated_at") or 0)
+                n += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync (endpoint, high_water) VALUES (?, ?)", (endpoint, high_water)
+            )
+        return n
+
+    def prune(self, endpoint: str, ids: t.Iterable[int]) -> int:
+        """
+        Delete records of endpoint whose id is not in ids (all ids IGDB currently returns for it): upserts alone
+        would keep records deleted upstream, or games which no longer match the query, forever.
+        Returns the number of records deleted.
+        """
+        keep = set(ids)
+        gone = [
+            (endpoint, r[0])
+            for r in self._conn.execute("SELECT id FROM records WHERE endpoint = ?", (endpoint,))
+            if r[0] not in keep
+        ]
+        with self._conn:
+            self._conn.executemany("DELETE FROM records WHERE endpoint = ? AND id = ?", gone)
+        return len(gone)
+
+    def records(self, endpoint: str) -> t.Iterator[dict]:
+        """
+        Stored records of endpoint in id order, read one at a time
+        """
+        for r in self._conn.execute("SELECT record FROM records WHERE endpoint = ? ORDER BY id", (endpoint,)):
+            yield json.loads(r[0])
@@ -0,0 +1,61 @@
+import json
+import sqlite3
+import time
+import typing as t
+from pathlib import Path
+
+MANIFEST_FILENAME = "manifest.sqlite"
+KIND_LISTING = "listing"
+KIND_GAME = "game"
+# listings change as games are added: their links are reused for a day at most, whatever max_age (even on --resume)
+LISTING_MAX_AGE = 24 * 3600.0
+
+
+class CrawlManifest:
+    """
+    Persistent record of fetched index pages: which urls were fetched, when and with what status.
+    Listing pages also keep the (key, url) game links found on them, so they don't need to be re-fetched on resume
+    (for LISTING_MAX_AGE at most).
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, kind TEXT NOT NULL, status INTEGER NOT NULL, fetched_at REAL NOT NULL, links TEXT)"
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _fresh_row(self, url: str, max_age: t.Optional[float]) -> t.Optional[tuple]:
+        if max_age is None:
+            return None
+        row = self._conn.execute("SELECT status, fetched_at, links FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None or row[0] != 200 or time.time() - row[1] > max_age:
+            return None
+        return row
+
+    def is_fresh(self, url: str, max_age: t.Optional[float]) -> bool:
+        """
+        True if url was successfully fetched less than max_age seconds ago (max_age=None: never fresh)
+        """
+        return self._fresh_row(url, max_age) is not None
+
+    def fresh_links(self, url: str, max_age: t.Optional[float]) -> t.Optional[list[tuple[str, str]]]:
+        """
+        Links recorded for listing page url, if it was fetched less than max_age (and LISTING_MAX_AGE) seconds ago
+        """
+        row = self._fresh_row(url, min(max_age, LISTING_MAX_AGE) if max_age is not None else None)
+        if row is None or row[2] is None:
+            return None
+        return [(k, u) for k, u in json.loads(row[2])]
+
+    def record(self, url: str, kind: str, status: int, links: t.Optional[list[tuple[str, str]]] = None) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO pages (url, kind, status, fetched_at, links) VALUES (?, ?, ?, ?, ?)",
+            (url, kind, status, time.time(), json.dumps(links) if links is not None else None),
+        )
+        self._conn.commit()
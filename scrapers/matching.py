@@ -0,0 +1,233 @@
+import math
+import re
+import typing as t
+from collections import defaultdict
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional (extra "matching"), needed by find_similar_games_batch only
+    np = None  # type: ignore
+    sparse = None  # type: ignore
+
+TARGET_SIMILARITY = 0.55
+BATCH_CHUNK_SIZE = 2048  # query records scored per sparse product, bounds memory of the intersection matrix
+
+
+def find_ngrams(text: str, number: int = 3) -> set[str]:
+    """
+    returns a set of ngrams for the given string
+    :param text: the string to find ngrams for
+    :param number: the length the ngrams should be. defaults to 3 (trigrams)
+    :return: set of ngram strings
+    """
+
+    if not text:
+        return set()
+
+    words = [f"  {x} " for x in re.split(r"\W+", text.lower()) if x.strip()]
+
+    ngrams = set()
+
+    for word in words:
+        for x in range(0, len(word) - number + 1):
+            ngrams.add(word[x : x + number])
+
+    return ngrams
+
+
+def ngrams_similarity(ngrams1: set[str], ngrams2: set[str]) -> float:
+    num_unique = len(ngrams1 | ngrams2)
+    num_equal = len(ngrams1 & ngrams2)
+    return (float(num_equal) / float(num_unique)) if num_unique else 0
+
+
+def find_similarity(text1: str, text2: str, number: int = 3) -> float:
+    """
+    Finds the similarity between 2 strings using ngrams.
+    0 being completely different strings, and 1 being equal strings
+    """
+
+    ngrams1 = find_ngrams(text1, number)
+    ngrams2 = find_ngrams(text2, number)
+
+    if not ngrams1 and not ngrams2:
+        print(text1, text2)
+
+    return ngrams_similarity(ngrams1, ngrams2)
+
+
+def record_names(record: dict) -> list[str]:
+    """
+    Name followed by alternative names of a QZ record (as stored in descr.csv)
+    """
+    return [record["name"]] + (record["other_names"].split(",") if record["other_names"] else [])
+
+
+def find_similar_games(
+    descr: dict, db: dict, target_similarity: float = TARGET_SIMILARITY
+) -> t.Optional[tuple[float, t.Any]]:
+    """
+    Brute force: scores descr's name against every name and alternative name of every db record
+    """
+    res = []
+    for _, val in db.items():
+        sim = find_similarity(descr["name"], val["name"])
+        if sim >= target_similarity:
+            res.append((sim, val))
+            # do not break here, there might be better matches further in db
+        elif val["other_names"]:
+            for othn in val["other_names"].split(","):
+                sim = find_similarity(descr["name"], othn)
+                if sim >= target_similarity:
+                    res.append((sim, val))
+                    break
+    if not res:  # no similarities found
+        return None
+    elif len(res) > 1:
+        # find the best match among many
+        res.sort(key=lambda x: (x[0]), reverse=True)
+    return res[0]
+
+
+class TrigramIndex:
+    """
+    Inverted index ngram -> db records, ngram sets of all names are computed once.
+
+    find_similar_games gives the same results as the brute force function, but scores only records sharing at least
+    target_similarity * |query ngrams| ngrams with the query: jaccard(q, s) >= t implies |q & s| >= t * |q|.
+    """
+
+    def __init__(self, db: dict, number: int = 3, target_similarity: float = TARGET_SIMILARITY) -> None:
+        self.number = number
+        self.target_similarity = target_similarity
+        self.records = list(db.values())
+        self._ngrams = [[find_ngrams(n, number) for n in record_names(val)] for val in self.records]
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        for pos, names_ngrams in enumerate(self._ngrams):
+            for ngram in set().union(*names_ngrams):
+                self._postings[ngram].append(pos)
+
+    def candidates(self, query: set[str]) -> list[int]:
+        """
+        Positions (in db order) of records which may reach target_similarity against query
+        """
+        if not query:
+            return []
+        shared: dict[int, int] = defaultdict(int)
+        for ngram in query:
+            for pos in self._postings.get(ngram, ()):
+                shared[pos] += 1
+        # small epsilon: never drop a record because of float rounding of the bound
+        min_shared = math.ceil(self.target_similarity * len(query) - 1e-9)
+        return sorted(pos for pos, cnt in shared.items() if cnt >= min_shared)
+
+    def find_similar_games(self, descr: dict) -> t.Optional[tuple[float, t.Any]]:
+        query = find_ngrams(descr["name"], self.number)
+        res = []
+        for pos in self.candidates(query):
+            # same order of checks as the brute force: the name first, then the first matching alternative name
+            for ngrams in self._ngrams[pos]:
+                sim = ngrams_similarity(query, ngrams)
+                if sim >= self.target_similarity:
+                    res.append((sim, self.records[pos]))
+                    break
+        if not res:
+            return None
+        res.sort(key=lambda x: (x[0]), reverse=True)
+        return res[0]
+
+
+def _incidence_matrix(ngram_sets: list[set[str]], vocabulary: dict[str, int]) -> t.Any:
+    """
+    Binary CSR matrix (strings x vocabulary), ngrams missing in vocabulary are skipped
+    """
+    indptr = [0]
+    indices: list[int] = []
+    for ngrams in ngram_sets:
+        indices.extend(vocabulary[g] for g in ngrams if g in vocabulary)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.int32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(ngram_sets), len(vocabulary)))
+
+
+def find_similar_games_batch(
+    descrs: dict,
+    db: dict,
+    target_similarity: float = TARGET_SIMILARITY,
+    top_k: int = 1,
+    number: int = 3,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+) -> dict[t.Any, list[tuple[float, t.Any]]]:
+    """
+    Bulk version of find_similar_games for all descrs at once: names are encoded as sparse ngram incidence matrices
+    (same find_ngrams tokenization), intersections of all pairs come from one sparse product per chunk of descrs,
+    jaccard = |q & s| / (|q| + |s| - |q & s|).
+
+    Returns {descrs key: up to top_k (similarity, db record) best first}, record scores follow find_similar_games:
+    the name if it reaches target_similarity, otherwise the first alternative name that does.
+    With top_k=1 the single match is the one find_similar_games returns.
+    """
+    if np is None:
+        raise RuntimeError("numpy and scipy are required for batch matching (install the matching extra)")
+
+    records = list(db.values())
+    db_ngrams: list[set[str]] = []
+    owner: list[int] = []  # db record position of each name
+    kind: list[int] = []  # 0: name, N: N-th alternative name
+    for pos, val in enumerate(records):
+        for k, name in enumerate(record_names(val)):
+            db_ngrams.append(find_ngrams(name, number))
+            owner.append(pos)
+            kind.append(k)
+    vocabulary: dict[str, int] = {}
+    for ngrams in db_ngrams:
+        for g in ngrams:
+            vocabulary.setdefault(g, len(vocabulary))
+    db_matrix_t = _incidence_matrix(db_ngrams, vocabulary).T.tocsr()
+    db_len = np.array([len(g) for g in db_ngrams], dtype=np.int64)
+    owner_arr = np.array(owner, dtype=np.int64)
+    kind_arr = np.array(kind, dtype=np.int64)
+
+    keys = list(descrs.keys())
+    res: dict[t.Any, list[tuple[float, t.Any]]] = {}
+    for start in range(0, len(keys), chunk_size):
+        chunk_keys = keys[start : start + chunk_size]
+        query_ngrams = [find_ngrams(descrs[k]["name"], number) for k in chunk_keys]
+        # |q| must include ngrams unknown to db: they count in the union
+        query_len = np.array([len(g) for g in query_ngrams], dtype=np.int64)
+        inter = (_incidence_matrix(query_ngrams, vocabulary) @ db_matrix_t).tocoo()
+        rows, cols, shared = inter.row, inter.col, inter.data.astype(np.int64)
+        sims = shared / (query_len[rows] + db_len[cols] - shared)
+        passing = sims >= target_similarity
+        rows, cols, sims = rows[passing], cols[passing], sims[passing]
+        recs, kinds = owner_arr[cols], kind_arr[cols]
+
+        # per (query, record) keep the passing name with the lowest kind: the name, else the first alternative name
+        order = np.lexsort((kinds, recs, rows))
+        rows, recs, sims = rows[order], recs[order], sims[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (recs[1:] != recs[:-1])
+        rows, recs, sims = rows[first], recs[first], sims[first]
+
+        # best first, ties in db order (as the stable sort of find_similar_games)
+        order = np.lexsort((recs, -sims, rows))
+        rows, recs, sims = rows[order], recs[order], sims[order]
+        for k in chunk_keys:
+            res[k] = []
+        for row, rec, sim in zip(rows.tolist(), recs.tolist(), sims.tolist()):
+            matches = res[chunk_keys[row]]
+            if len(matches) < top_k:
+                matches.append((sim, records[rec]))
+    return res
+
+
+def find_all_similar_games(descrs: dict, db: dict) -> dict[t.Any, t.Optional[tuple[float, t.Any]]]:
+    """
+    find_similar_games for every record of descrs: sparse batch scoring when numpy/scipy are installed,
+    the trigram index otherwise
+    """
+    if np is not None:
+        return {k: (m[0] if m else None) for k, m in find_similar_games_batch(descrs, db).items()}
+    index = TrigramIndex(db)
+    return {k: index.find_similar_games(v) for k, v in descrs.items()}
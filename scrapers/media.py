@@ -0,0 +1,150 @@
+import hashlib
+import mimetypes
+import os
+import sqlite3
+import time
+import typing as t
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests import Response
+
+from scrapers.const import ENCODING
+from scrapers.crawl import Crawler
+from scrapers.misc import (
+    DOWNLOAD_CHUNK_SIZE,
+    download,
+)
+
+# shared by all scrapers ("{DATA_DIR}/media"), so the same image found on several websites is stored once
+MEDIA_DIRNAME = "media"
+MEDIA_MANIFEST_FILENAME = "manifest.sqlite"
+
+
+class MediaStore:
+    """
+    Content-addressed image store: files are kept as "{store_dir}/{sha256[:2]}/{sha256}{ext}",
+    a manifest maps every source url to the hash of its content.
+    """
+
+    def __init__(self, store_dir: Path) -> None:
+        self.store_dir = store_dir
+        store_dir.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(store_dir / MEDIA_MANIFEST_FILENAME)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS media ("
+            "url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, suffix TEXT NOT NULL, size INTEGER NOT NULL, "
+            "fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def path(self, sha256: str, suffix: str) -> Path:
+        return self.store_dir / sha256[:2] / f"{sha256}{suffix}"
+
+    def lookup(self, url: str) -> t.Optional[Path]:
+        """
+        Stored file of url, None if it was never downloaded (or its file is gone)
+        """
+        row = self._conn.execute("SELECT sha256, suffix FROM media WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        path = self.path(*row)
+        return path if path.exists() else None
+
+    def partial_path(self, url: str) -> Path:
+        """
+        Where url is downloaded to before it's hashed (kept across runs, so interrupted downloads resume)
+        """
+        return self.store_dir / "partial" / hashlib.sha256(url.encode(ENCODING)).hexdigest()
+
+    def add(self, url: str, downloaded: Path, content_type: t.Optional[str] = None) -> Path:
+        """
+        Move a downloaded file into the store (unless the same content is already there) and record url
+        """
+        sha256 = hashlib.sha256()
+        with open(downloaded, "rb") as f:
+            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        suffix = Path(urlsplit(url).path).suffix.lower()
+        if not suffix and content_type:
+            suffix = mimetypes.guess_extension(content_type.split(";")[0]) or ""
+        path = self.path(digest, suffix)
+        size = downloaded.stat().st_size
+        if path.exists():
+            downloaded.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(downloaded, path)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO media (url, sha256, suffix, size, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (url, digest, suffix, size, time.time()),
+        )
+        self._conn.commit()
+        return path
+
+
+def _safe_get(crawler: Crawler) -> t.Callable[[str], t.Optional[Response]]:
+    def get(url: str) -> t.Optional[Response]:
+        try:
+            return crawler.get(url)
+        except requests.exceptions.RequestException as e:
+            print(url)
+            print(e)
+            return None
+
+    return get
+
+
+def fetch_pages(crawler: Crawler, urls: t.Iterable[str]) -> t.Iterator[tuple[str, Response]]:
+    """
+    Fetch html pages (e.g. screenshot galleries) concurrently, yield (url, response) of the successful ones
+    """
+    for url, _, res in crawler.fetch_all(((u, u) for u in urls), fetch=_safe_get(crawler)):
+        if res is None or res.status_code != 200:
+            print(f"error getting page: {url}")
+            continue
+        yield url, res
+
+
+def download_media(store: MediaStore, crawler: Crawler, urls: t.Iterable[str]) -> dict[str, Path]:
+    """
+    Download urls not in the store yet, up to crawler.concurrency at a time within per-host rate limits.
+    urls are consumed lazily, so they can be produced while downloads run. Returns stored files of all urls
+    (but failed ones).
+    """
+    res: dict[str, Path] = {}
+    seen: set[str] = set()
+    n_stored = n_failed = 0
+
+    def missing() -> t.Iterator[tuple[str, str]]:
+        nonlocal n_stored
+        for url in urls:
+            if url in seen:
+                continue
+            seen.add(url)
+            path = store.lookup(url)
+            if path:
+                res[url] = path
+                n_stored += 1
+            else:
+                yield url, url
+
+    def fetch(url: str) -> t.Optional[Response]:
+        crawler.throttle(url)
+        path = store.partial_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return download(url, path)
+
+    # the manifest is written from this thread only (jobs are pulled from it too), workers just download
+    for url, _, r in crawler.fetch_all(missing(), fetch=fetch):
+        if r is None:
+            n_failed += 1
+            continue
+        res[url] = store.add(url, store.partial_path(url), r.headers.get("Content-Type"))
+    print(f"media: {len(seen)} files, {n_stored} already stored, {len(res) - n_stored} downloaded, {n_failed} failed")
+    return res
@@ -0,0 +1,233 @@
+import json
+import re
+import threading
+import time
+import typing as t
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from scrapers.const import ENCODING
+from scrapers.output import (
+    JSON_INDENT,
+    atomic_open,
+)
+
+# request durations (seconds, retries and backoff included)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+TEXTFILE_INTERVAL = 15.0
+ENDPOINT_MAX_SEGMENTS = 3
+PREFIX = "scrapers_http"
+
+# (host, endpoint)
+Labels = tuple[str, str]
+# host -> (connections opened, requests sent) of its connection pool
+PoolStats = dict[str, tuple[int, int]]
+
+# path segments holding an id, a page number or a file name (but API versions: "/v4/games")
+_ID_SEGMENT = re.compile(r"^(?!v\d+$).*[\d.]")
+
+
+def endpoint_labels(url: str) -> Labels:
+    """
+    (host, endpoint) of url. Path segments holding ids or file names are replaced by "*" and only the first few are
+    kept, so every game page (or image) of a website falls into the same series: "/games/view/123" -> "/games/view/*"
+    """
+    parts = urlsplit(url)
+    segments = [s for s in parts.path.split("/") if s][:ENDPOINT_MAX_SEGMENTS]
+    return parts.netloc, "/" + "/".join("*" if _ID_SEGMENT.search(s) else s for s in segments)
+
+
+class _Series:
+    def __init__(self) -> None:
+        self.statuses: dict[tuple[str, str], int] = {}  # (method, status) -> count
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.bytes = 0
+        self.retries = 0
+        self.backoff = 0.0
+
+
+class HttpMetrics:
+    """
+    Per (host, endpoint) counters of HTTP requests: latency histogram, bytes received, status codes,
+    retries and time spent backing off between them. Thread-safe.
+    Retries happen inside urllib3, out of sight of the caller: they are attributed to the request the current
+    thread is making (see `current`).
+    """
+
+    def __init__(self) -> None:
+        self._series: dict[Labels, _Series] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.time()
+
+    def _get(self, labels: Labels) -> _Series:
+        if labels not in self._series:
+            self._series[labels] = _Series()
+        return self._series[labels]
+
+    @contextmanager
+    def current(self, labels: Labels) -> t.Iterator[None]:
+        """
+        Attribute retries and backoff of the current thread to labels while in the block
+        """
+        self._local.labels = labels
+        try:
+            yield
+        finally:
+            self._local.labels = None
+
+    def observe(self, labels: Labels, method: str, status: str, duration: float, n_bytes: int = 0) -> None:
+        with self._lock:
+            s = self._get(labels)
+            s.statuses[(method, status)] = s.statuses.get((method, status), 0) + 1
+            for i, le in enumerate(LATENCY_BUCKETS):
+                if duration <= le:
+                    s.buckets[i] += 1
+                    break
+            s.count += 1
+            s.latency_sum += duration
+            s.latency_max = max(s.latency_max, duration)
+            s.bytes += n_bytes
+
+    def add_bytes(self, labels: Labels, n_bytes: int) -> None:
+        with self._lock:
+            self._get(labels).bytes += n_bytes
+
+    def retried(self) -> None:
+        labels = getattr(self._local, "labels", None)
+        if labels:
+            with self._lock:
+                self._get(labels).retries += 1
+
+    def backed_off(self, seconds: float) -> None:
+        labels = getattr(self._local, "labels", None)
+        if labels:
+            with self._lock:
+                self._get(labels).backoff += seconds
+
+    def prometheus(self, pools: t.Optional[PoolStats] = None) -> str:
+        """
+        Metrics in the Prometheus text exposition format
+        """
+        lines: list[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        with self._lock:
+            series = sorted(self._series.items())
+            family("requests_total", "counter", "HTTP requests by method and response status (error: no response).")
+            for labels, s in series:
+                for (method, status), n in sorted(s.statuses.items()):
+                    lines.append(f"{PREFIX}_requests_total{{{_labels(labels, method=method, status=status)}}} {n}")
+            family("request_duration_seconds", "histogram", "HTTP request durations, retries included.")
+            for labels, s in series:
+                cumulative = 0
+                for le, n in zip(LATENCY_BUCKETS, s.buckets):
+                    cumulative += n
+                    lines.append(
+                        f"{PREFIX}_request_duration_seconds_bucket{{{_labels(labels, le=str(le))}}} {cumulative}"
+                    )
+                lines.append(f'{PREFIX}_request_duration_seconds_bucket{{{_labels(labels, le="+Inf")}}} {s.count}')
+                lines.append(f"{PREFIX}_request_duration_seconds_sum{{{_labels(labels)}}} {s.latency_sum}")
+                lines.append(f"{PREFIX}_request_duration_seconds_count{{{_labels(labels)}}} {s.count}")
+            for name, attr, help_text in (
+                ("response_bytes_total", "bytes", "Bytes of response bodies received."),
+                ("retries_total", "retries", "Requests retried by the HTTP layer."),
+                ("backoff_seconds_total", "backoff", "Time spent waiting between retries."),
+            ):
+                family(name, "counter", help_text)
+                for labels, s in series:
+                    lines.append(f"{PREFIX}_{name}{{{_labels(labels)}}} {getattr(s, attr)}")
+        if pools:
+            family("pool_connections_total", "counter", "Connections opened by the host's connection pool.")
+            for host, (connections, _) in sorted(pools.items()):
+                lines.append(f"{PREFIX}_pool_connections_total{{{_labels((host, None))}}} {connections}")
+            family("pool_requests_total", "counter", "Requests sent through the host's connection pool.")
+            for host, (_, requests) in sorted(pools.items()):
+                lines.append(f"{PREFIX}_pool_requests_total{{{_labels((host, None))}}} {requests}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, pools: t.Optional[PoolStats] = None) -> dict:
+        """
+        Totals per host and endpoint, as plain data
+        """
+        with self._lock:
+            endpoints = [
+                {
+                    "host": host,
+                    "endpoint": endpoint,
+                    "requests": s.count,
+                    "statuses": {f"{method} {status}": n for (method, status), n in sorted(s.statuses.items())},
+                    "latency": {
+                        "mean": s.latency_sum / s.count if s.count else None,
+                        "max": s.latency_max,
+                        "buckets": dict(zip(map(str, LATENCY_BUCKETS), s.buckets)),
+                    },
+                    "bytes": s.bytes,
+                    "retries": s.retries,
+                    "backoff_seconds": s.backoff,
+                }
+                for (host, endpoint), s in sorted(self._series.items())
+            ]
+        return {
+            "started": self.started,
+            "duration": time.time() - self.started,
+            "endpoints": endpoints,
+            # reused: requests sent over an already open connection
+            "pools": {
+                host: {"connections": connections, "requests": requests, "reused": max(requests - connections, 0)}
+                for host, (connections, requests) in sorted((pools or {}).items())
+            },
+        }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple[str, t.Optional[str]], **extra: str) -> str:
+    host, endpoint = labels
+    pairs = {"host": host, **({"endpoint": endpoint} if endpoint is not None else {}), **extra}
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items())
+
+
+def write_textfile(path: Path, text: str) -> None:
+    # node-exporter's textfile collector must never see a partial file
+    with atomic_open(path, "w", encoding=ENCODING) as f:
+        f.write(text)
+
+
+def write_summary(path: Path, summary: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_open(path, "w", encoding=ENCODING) as f:
+        json.dump(summary, f, indent=JSON_INDENT)
+
+
+class TextfileWriter:
+    """
+    Rewrites a Prometheus textfile every `interval` seconds from a daemon thread, and once more on stop()
+    """
+
+    def __init__(self, path: Path, render: t.Callable[[], str], interval: float = TEXTFILE_INTERVAL) -> None:
+        self.path = path
+        self.render = render
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            write_textfile(self.path, self.render())
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+        write_textfile(self.path, self.render())
@@ -1,85 +1,111 @@
 import json
 import os
-import time
+import shutil
 import typing as t
 from pathlib import Path
 
 import requests
 
 from scrapers.const import ENCODING
+from scrapers.crawl import AdaptivePacer
 from scrapers.misc import get_url
+from scrapers.output import (
+    DUMP_JSON,
+    atomic_open,
+    dump_records,
+)
 
 API_KEY = os.environ.get("MOBYGAMES_API_KEY")
 
-MIN_SLEEP = 10
-JSON_INDENT = 4
+# https://www.mobygames.com/info/api/: at most one request per second, 429 + Retry-After when the quota is used up.
+# Without rate limit headers in responses requests are spaced by DEFAULT_INTERVAL: 360 per hour fit the hourly quota
+MIN_INTERVAL = 1.0
+DEFAULT_INTERVAL = 10.0
+MAX_ATTEMPTS = 10
+PAGE_LIMIT = 100
+CHECKPOINTS_DIRNAME = "checkpoints"
 
 HOST_URL = "https://api.mobygames.com/v1"
 GENRE_ADVENTURE = 2
 FORMAT_NORMAL = "normal"
 
 
+_pacer = AdaptivePacer(MIN_INTERVAL, DEFAULT_INTERVAL)
+
+
 def _get_url(url: str, params: t.Optional[dict] = None) -> requests.Response:
     if not params:
         params = {}
     params["api_key"] = API_KEY
-    return get_url(url, params=params)
+    for _ in range(MAX_ATTEMPTS):
+        _pacer.wait()
+        # paced: 429 responses come back here (urllib3 would retry them blindly), the pacer follows their headers
+        res = get_url(url, params=params, paced=True)
+        _pacer.update(res)
+        if res.status_code != 429:
+            return res
+        print(f"mg: rate limited, next request in {_pacer.interval:.0f}s or after Retry-After")
+    raise RuntimeError(f"mg: still rate limited after {MAX_ATTEMPTS} attempts: {url}")
 
 
 def get_genres() -> list:
     return _get_url(f"{HOST_URL}/genres").json()["genres"]
 
 
-def get_groups() -> list:
-    res_groups = []
+def _iter_paged(endpoint: str, params: dict, checkpoints: t.Optional[Path] = None) -> t.Iterator[dict]:
+    """
+    Records of a paged endpoint. With checkpoints, every page is saved as "{checkpoints}/{endpoint}/{offset}.json"
+    as soon as it is fetched, pages already saved there (by an interrupted run) are not fetched again.
+    """
     offset = 0
-    limit = 100
     while True:
-        groups = _get_url(f"{HOST_URL}/groups", params={"limit": limit, "offset": offset})
-        groups_ = groups.json()["groups"]
-        if not groups_:
+        path = checkpoints / endpoint / f"{offset:08d}.json" if checkpoints else None
+        if path and path.exists():
+            with open(path, "r", encoding=ENCODING) as f:
+                page = json.load(f)
+        else:
+            res = _get_url(f"{HOST_URL}/{endpoint}", params={**params, "limit": PAGE_LIMIT, "offset": offset})
+            page = res.json()[endpoint]
+            if path and page:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with atomic_open(path, "w", encoding=ENCODING) as f:
+                    json.dump(page, f)
+        if not page:
             break
-        res_groups += groups_
-        offset += limit
-        time.sleep(MIN_SLEEP)
-    return res_groups
+        yield from page
+        offset += PAGE_LIMIT
+
+
+def iter_groups(checkpoints: t.Optional[Path] = None) -> t.Iterator[dict]:
+    return _iter_paged("groups", {}, checkpoints)
+
+
+def get_groups() -> list:
+    return list(iter_groups())
+
+
+def iter_games(checkpoints: t.Optional[Path] = None) -> t.Iterator[dict]:
+    return _iter_paged("games", {"genre": GENRE_ADVENTURE, "format": FORMAT_NORMAL}, checkpoints)
 
 
 def get_games() -> list:
-    res_games = []
-    offset = 0
-    limit = 100
-    while True:
-        games = _get_url(
-            f"{HOST_URL}/games",
-            params={"limit": limit, "offset": offset, "genre": GENRE_ADVENTURE, "format": FORMAT_NORMAL},
-        )
-        games_ = games.json()["games"]
-        if not games_:
-            break
-        res_games += games_
-        offset += limit
-        time.sleep(MIN_SLEEP)
-    return res_games
+    return list(iter_games())
 
 
 def get_platforms() -> list:
     return _get_url(f"{HOST_URL}/platforms").json()["platforms"]
 
 
-def run(data_path: Path) -> None:
+def run(data_path: Path, dump_format: str = DUMP_JSON, resume: bool = False) -> None:
+    """
+    dump_format: one pretty-printed json array per endpoint, or compressed NDJSON (gzip/zstd) appended page by page
+    resume=True: reuse pages checkpointed by a previous (interrupted) run instead of fetching them again
+    """
     data_path.mkdir(parents=True, exist_ok=True)
-    genres = get_genres()
-    with open(data_path / "genres.json", "w", encoding=ENCODING) as f:
-        json.dump(genres, f, indent=JSON_INDENT)
-    time.sleep(MIN_SLEEP)
-    groups = get_groups()
-    with open(data_path / "groups.json", "w", encoding=ENCODING) as f:
-        json.dump(groups, f, indent=JSON_INDENT)
-    time.sleep(MIN_SLEEP)
-    platforms = get_platforms()
-    with open(data_path / "platforms.json", "w", encoding=ENCODING) as f:
-        json.dump(platforms, f, indent=JSON_INDENT)
-    games = get_games()
-    with open(data_path / "games.json", "w", encoding=ENCODING) as f:
-        json.dump(games, f, indent=JSON_INDENT)
+    checkpoints = data_path / CHECKPOINTS_DIRNAME
+    if not resume:
+        shutil.rmtree(checkpoints, ignore_errors=True)
+    dump_records(data_path, "genres", get_genres(), dump_format)
+    dump_records(data_path, "groups", iter_groups(checkpoints), dump_format)
+    dump_records(data_path, "platforms", get_platforms(), dump_format)
+    dump_records(data_path, "games", iter_games(checkpoints), dump_format)
@@ -1,4 +1,8 @@
+import os
+import threading
+import time
 import typing as t
+from pathlib import Path
 
 import requests
 from requests import Response
@@ -7,37 +11,285 @@ from requests.adapters import (
     Retry,
 )
 
+from scrapers.cache import (
+    CACHE_MAX_SIZE,
+    CACHE_TTL,
+    HttpCache,
+    redact_url,
+)
+from scrapers.metrics import (
+    HttpMetrics,
+    PoolStats,
+    TextfileWriter,
+    endpoint_labels,
+    write_summary,
+)
+
 # requests
 CONNECT_TIMEOUT = 3
 READ_TIMEOUT = 120
+# number of per-host connection pools to cache and max connections kept alive in each of them
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 16
+# downloads
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = ".part"
+
+# statuses retried by urllib3 (with backoff) before a response is returned
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# shared sessions, by paced (see get_session)
+_sessions: dict[bool, requests.Session] = {}
+_session_lock = threading.Lock()
+_pool_connections = POOL_CONNECTIONS
+_pool_maxsize = POOL_MAXSIZE
+_keep_alive = True
+_cache: t.Optional[HttpCache] = None
+# requests made by all scrapers of this process
+metrics = HttpMetrics()
+_metrics_writer: t.Optional[TextfileWriter] = None
+
+
+class _MeteredRetry(Retry):
+    """
+    Retry that reports retries and the time slept before them to `metrics`
+    """
+
+    def increment(self, *args: t.Any, **kwargs: t.Any) -> Retry:
+        retry = super().increment(*args, **kwargs)  # raises once retries are exhausted
+        metrics.retried()
+        return retry
+
+    def sleep(self, response: t.Any = None) -> None:
+        started = time.perf_counter()
+        super().sleep(response)
+        metrics.backed_off(time.perf_counter() - started)
 
 
 def _get_requests_session(
     total: int = 5,
     backoff_factor: int = 3,
     allowed_methods: frozenset = frozenset({"GET", "POST"}),
-    status_forcelist: frozenset = frozenset({429, 500, 502, 503, 504}),
+    status_forcelist: frozenset = RETRY_STATUSES,
+    pool_connections: int = POOL_CONNECTIONS,
+    pool_maxsize: int = POOL_MAXSIZE,
+    keep_alive: bool = True,
+    respect_retry_after_header: bool = True,
 ) -> requests.Session:
     # backoff_factor = 3: 5, 10, 20, 40, 80, 160, 320, 640, 1280, 2560
-    retries = Retry(
+    retries = _MeteredRetry(
         total=total,
         backoff_factor=backoff_factor,
         allowed_methods=allowed_methods,
         status_forcelist=status_forcelist,
+        respect_retry_after_header=respect_retry_after_header,
     )
     sess = requests.Session()
-    sess.mount("http://", HTTPAdapter(max_retries=retries))
-    sess.mount("https://", HTTPAdapter(max_retries=retries))
+    for prefix in ("http://", "https://"):
+        sess.mount(
+            prefix, HTTPAdapter(max_retries=retries, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        )
+    if not keep_alive:
+        sess.headers["Connection"] = "close"
     return sess
 
 
-def get_url(url: str, params: t.Optional[dict] = None, headers: t.Optional[dict] = None) -> Response:
-    s = _get_requests_session()
-    return s.get(url, params=params, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+def configure_http(
+    pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE, keep_alive: bool = True
+) -> None:
+    """
+    Set pooling options of the shared sessions; current sessions (if any) are closed and rebuilt on next use
+    """
+    global _pool_connections, _pool_maxsize, _keep_alive  # pylint: disable=global-statement
+    with _session_lock:
+        for sess in _sessions.values():
+            sess.close()
+        _sessions.clear()
+        _pool_connections = pool_connections
+        _pool_maxsize = pool_maxsize
+        _keep_alive = keep_alive
+
+
+def get_session(paced: bool = False) -> requests.Session:
+    """
+    Return the process-wide session, so connections (and TLS handshakes) are reused across all scrapers.
+    paced=True: the session of clients pacing their requests themselves: 429 responses are returned to them
+    (with their Retry-After and rate limit headers) instead of being retried here
+    """
+    sess = _sessions.get(paced)
+    if sess is None:
+        with _session_lock:
+            sess = _sessions.get(paced)
+            if sess is None:
+                # urllib3 retries any 429 having a Retry-After header too, unless told not to
+                sess = _sessions[paced] = _get_requests_session(
+                    status_forcelist=RETRY_STATUSES - {429} if paced else RETRY_STATUSES,
+                    respect_retry_after_header=not paced,
+                    pool_connections=_pool_connections,
+                    pool_maxsize=_pool_maxsize,
+                    keep_alive=_keep_alive,
+                )
+    return sess
+
+
+def configure_cache(
+    cache_dir: t.Optional[Path], ttl: float = CACHE_TTL, max_size: int = CACHE_MAX_SIZE, fresh_for: float = 0
+) -> None:
+    """
+    Enable (or disable, when cache_dir is None) the on-disk cache used by get_url
+    """
+    global _cache  # pylint: disable=global-statement
+    _cache = HttpCache(cache_dir, ttl=ttl, max_size=max_size, fresh_for=fresh_for) if cache_dir else None
+
+
+def pool_stats() -> PoolStats:
+    """
+    (connections opened, requests sent) of the connection pool of each host the shared session talks to
+    """
+    res: PoolStats = {}
+    for adapter in [a for sess in list(_sessions.values()) for a in sess.adapters.values()]:
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections, requests_sent = res.get(pool.host, (0, 0))
+                res[pool.host] = (connections + pool.num_connections, requests_sent + pool.num_requests)
+    return res
+
+
+def configure_metrics(textfile: t.Optional[Path], interval: float) -> None:
+    """
+    Start (or stop, when textfile is None) rewriting a Prometheus textfile of the HTTP metrics every interval seconds
+    """
+    global _metrics_writer  # pylint: disable=global-statement
+    if _metrics_writer is not None:
+        _metrics_writer.stop()
+    _metrics_writer = None
+    if textfile:
+        _metrics_writer = TextfileWriter(textfile, lambda: metrics.prometheus(pool_stats()), interval=interval)
+
+
+def finish_metrics(summary_path: t.Optional[Path]) -> None:
+    """
+    Write the textfile (if enabled) a last time and a json summary of the HTTP metrics to summary_path
+    """
+    configure_metrics(None, 0)
+    if summary_path:
+        write_summary(summary_path, metrics.summary(pool_stats()))
+
+
+def _send(method: str, url: str, paced: bool = False, **kwargs: t.Any) -> Response:
+    # every request of the shared sessions goes through here to be accounted for
+    labels = endpoint_labels(url)
+    started = time.perf_counter()
+    with metrics.current(labels):
+        try:
+            res = get_session(paced).request(method, url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
+        except requests.exceptions.RequestException:
+            metrics.observe(labels, method, "error", time.perf_counter() - started)
+            raise
+    # streamed bodies aren't read yet: their caller adds the bytes it reads
+    metrics.observe(
+        labels,
+        method,
+        str(res.status_code),
+        time.perf_counter() - started,
+        0 if kwargs.get("stream") else len(res.content),
+    )
+    return res
+
+
+def get_url(
+    url: str, params: t.Optional[dict] = None, headers: t.Optional[dict] = None, paced: bool = False
+) -> Response:
+    """
+    paced=True: 429 responses are returned instead of retried (see get_session)
+    """
+    if _cache is None:
+        return _send("GET", url, paced=paced, params=params, headers=headers)
+
+    key = redact_url(requests.Request("GET", url, params=params).prepare().url or url)
+    meta = _cache.load(key)
+    if meta and _cache.is_fresh(meta):
+        return _cache.to_response(key, meta, "HIT")
+    if meta:
+        headers = {**(headers or {}), **_cache.conditional_headers(meta)}
+    res = _send("GET", url, paced=paced, params=params, headers=headers)
+    if res.status_code == 304 and meta:
+        _cache.touch(key, meta)
+        return _cache.to_response(key, meta, "REVALIDATED")
+    if res.status_code == 200:
+        _cache.store(key, res)
+    return res
 
 
 def post_url(
     url: str, params: t.Optional[dict] = None, headers: t.Optional[dict] = None, data: t.Optional[str] = None
 ) -> Response:
-    s = _get_requests_session()
-    return s.post(url, params=params, headers=headers, data=data, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    return _send("POST", url, params=params, headers=headers, data=data)
+
+
+def download(url: str, path: Path, headers: t.Optional[dict] = None) -> t.Optional[Response]:
+    """
+    Stream url into path without holding the body in memory: chunks are written to "{path}.part", which is fsynced
+    and renamed to path only when complete (its size matches Content-Length), so path never holds a partial file.
+    A .part file left by an interrupted download is resumed with a Range request.
+    Returns the response (its body already consumed) or None on failure.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = path.with_name(path.name + PARTIAL_SUFFIX)
+    offset = part.stat().st_size if part.exists() else 0
+    # byte ranges and Content-Length refer to the raw body: ask for it uncompressed
+    headers = {**(headers or {}), "Accept-Encoding": "identity"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    try:
+        with _send("GET", url, headers=headers, stream=True) as res:
+            if res.status_code == 416 or (res.status_code == 206 and not _range_starts_at(res, offset)):
+                # the partial file doesn't match the current resource anymore: start over
+                part.unlink(missing_ok=True)
+                return download(url, path, headers={k: v for k, v in headers.items() if k != "Range"})
+            if res.status_code not in (200, 206):
+                print(f"error getting file: {url} ({res.status_code})")
+                return None
+            if res.status_code == 200:
+                offset = 0  # no range support: the full body is sent again
+            expected = int(res.headers["Content-Length"]) + offset if "Content-Length" in res.headers else None
+            with open(part, "ab" if offset else "wb") as f:
+                for chunk in res.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                metrics.add_bytes(endpoint_labels(url), f.tell() - offset)
+                f.flush()
+                os.fsync(f.fileno())
+    except requests.exceptions.RequestException as e:
+        print(url)
+        print(e)
+        return None
+    size = part.stat().st_size
+    if expected is not None and size != expected:
+        print(f"incomplete file: {url} ({size} of {expected} bytes)")
+        if size > expected:
+            part.unlink()
+        return None
+    os.replace(part, path)
+    return res
+
+
+def _range_starts_at(res: Response, offset: int) -> bool:
+    # Content-Range: bytes 100-199/200
+    content_range = res.headers.get("Content-Range", "")
+    return content_range.startswith(f"bytes {offset}-")
+
+
+def xpath_has_class(name: str) -> str:
+    """
+    XPath predicate matching elements having css class `name` (same as BeautifulSoup's {"class": name})
+    """
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def first(elements: list) -> t.Any:
+    """
+    First element of an lxml xpath result (like soup.find), None if nothing matched
+    """
+    return elements[0] if elements else None
@@ -0,0 +1,211 @@
+import csv
+import gzip
+import io
+import json
+import os
+import typing as t
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from scrapers.const import ENCODING
+
+try:
+    import zstandard
+except ImportError:  # optional (extra "zstd"), needed by zstd dumps only
+    zstandard = None  # type: ignore
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional (extra "parquet"), needed by parquet outputs only
+    pyarrow = None  # type: ignore
+
+TMP_SUFFIX = ".tmp"
+JSON_INDENT = 4
+
+# raw API dumps: one pretty-printed json array, or compressed NDJSON (one record per line) written as pages arrive
+DUMP_JSON = "json"
+DUMP_GZIP = "gzip"
+DUMP_ZSTD = "zstd"
+DUMP_SUFFIXES = {DUMP_JSON: ".json", DUMP_GZIP: ".ndjson.gz", DUMP_ZSTD: ".ndjson.zst"}
+
+# parquet outputs: rows buffered and written one row group at a time
+PARQUET_BATCH_SIZE = 10000
+# kinds of columns of flat datasets (csv-like rows of scalars and lists of strings), the default one is string
+PARQUET_STRING = "string"
+PARQUET_INT = "int"
+PARQUET_FLOAT = "float"
+PARQUET_LIST = "list"
+PARQUET_TIMESTAMP = "timestamp"
+
+
+@contextmanager
+def atomic_open(path: Path, mode: str = "w", **kwargs: t.Any) -> t.Iterator[t.IO]:
+    """
+    Write into "{path}.tmp" and rename it to path only when the block completes without errors,
+    so a reader never sees a partially written file. After a failure the partial .tmp file is left for inspection.
+    """
+    tmp_path = path.with_name(path.name + TMP_SUFFIX)
+    with open(tmp_path, mode, **kwargs) as f:
+        yield f
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def csv_writer(path: Path, fieldnames: list[str], **kwargs: t.Any) -> t.Iterator[csv.DictWriter]:
+    """
+    Streaming DictWriter (header already written) over an atomically replaced file
+    """
+    with atomic_open(path, "w", newline="", encoding=ENCODING) as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, **kwargs)
+        writer.writeheader()
+        yield writer
+
+
+def require_pyarrow() -> t.Any:
+    """
+    The pyarrow module, for building schemas of parquet outputs
+    """
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is required for parquet outputs (install the parquet extra)")
+    return pyarrow
+
+
+@contextmanager
+def parquet_writer(
+    path: Path,
+    schema: "pyarrow.Schema",
+    batch_size: int = PARQUET_BATCH_SIZE,
+    convert: t.Optional[t.Callable[[dict], dict]] = None,
+) -> t.Iterator[t.Callable[[dict], None]]:
+    """
+    Yields a function adding a record (converted by convert, if given) to a Parquet file of schema; records are
+    written in row groups of batch_size, the file is replaced atomically when the block completes
+    """
+    require_pyarrow()
+    rows: list[dict] = []
+    with atomic_open(path, "wb") as f:
+        writer = pyarrow.parquet.ParquetWriter(f, schema)
+
+        def flush() -> None:
+            writer.write_batch(pyarrow.RecordBatch.from_pylist(rows, schema=schema))
+            rows.clear()
+
+        def write(record: dict) -> None:
+            rows.append(convert(record) if convert else record)
+            if len(rows) >= batch_size:
+                flush()
+
+        try:
+            yield write
+            if rows:
+                flush()
+        finally:
+            writer.close()
+
+
+def _flat_value(value: t.Any, kind: str) -> t.Any:
+    # scraped values aren't typed consistently (e.g. a list only when there are several values): normalize them
+    if value is None:
+        return None
+    if kind == PARQUET_LIST:
+        return [str(v) for v in value] if isinstance(value, list) else [str(value)]
+    if kind == PARQUET_INT:
+        return int(value)
+    if kind == PARQUET_FLOAT:
+        return float(value)
+    if kind == PARQUET_TIMESTAMP:
+        return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    return value if isinstance(value, str) else str(value)
+
+
+def flat_parquet_writer(
+    path: Path, columns: list[str], kinds: dict[str, str], batch_size: int = PARQUET_BATCH_SIZE
+) -> t.ContextManager[t.Callable[[dict], None]]:
+    """
+    parquet_writer of csv-like rows: columns of kinds[column] (PARQUET_STRING by default), values converted to it
+    """
+    require_pyarrow()
+    types = {
+        PARQUET_STRING: pyarrow.string(),
+        PARQUET_INT: pyarrow.int64(),
+        PARQUET_FLOAT: pyarrow.float64(),
+        PARQUET_LIST: pyarrow.list_(pyarrow.string()),
+        PARQUET_TIMESTAMP: pyarrow.timestamp("us"),
+    }
+    schema = pyarrow.schema([(c, types[kinds.get(c, PARQUET_STRING)]) for c in columns])
+    return parquet_writer(
+        path,
+        schema,
+        batch_size,
+        convert=lambda r: {c: _flat_value(r.get(c), kinds.get(c, PARQUET_STRING)) for c in columns},
+    )
+
+
+def _compressed(f: t.IO[bytes], path: Path, mode: str) -> t.IO[bytes]:
+    if path.name.endswith(DUMP_SUFFIXES[DUMP_GZIP]):
+        return gzip.GzipFile(fileobj=f, mode=mode)
+    if path.name.endswith(DUMP_SUFFIXES[DUMP_ZSTD]):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required for zstd dumps (install the zstd extra)")
+        if mode == "wb":
+            return zstandard.ZstdCompressor().stream_writer(f, closefd=False)
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=False)
+    raise ValueError(f"unknown NDJSON compression: {path}")
+
+
+@contextmanager
+def ndjson_writer(path: Path) -> t.Iterator[t.Callable[[t.Iterable[dict]], None]]:
+    """
+    Yields a function appending records to a compressed (by path suffix: .ndjson.gz or .ndjson.zst) NDJSON file,
+    one json document per line; the file is replaced atomically when the block completes
+    """
+    with atomic_open(path, "wb") as f, _compressed(f, path, "wb") as cf:
+
+        def write(records: t.Iterable[dict]) -> None:
+            for r in records:
+                cf.write(json.dumps(r).encode(ENCODING) + b"\n")
+
+        yield write
+
+
+def read_ndjson(path: Path) -> t.Iterator[dict]:
+    """
+    Stream records back from a file written by ndjson_writer, one at a time
+    """
+    with open(path, "rb") as f, _compressed(f, path, "rb") as cf:
+        for line in io.TextIOWrapper(cf, encoding=ENCODING):
+            yield json.loads(line)
+
+
+class NdjsonFile:
+    """
+    Records of an NDJSON file, streamed from disk again on every iteration
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def __iter__(self) -> t.Iterator[dict]:
+        return read_ndjson(self.path)
+
+
+def dump_records(
+    data_path: Path, name: str, records: t.Iterable[dict], dump_format: str = DUMP_JSON
+) -> t.Iterable[dict]:
+    """
+    Write records into "{data_path}/{name}{suffix}" in dump_format and return them for further transforms:
+    the in-memory list for json dumps, an NdjsonFile streaming them back from disk for NDJSON ones
+    (so memory stays flat)
+    """
+    path = data_path / f"{name}{DUMP_SUFFIXES[dump_format]}"
+    if dump_format == DUMP_JSON:
+        records = list(records)
+        with open(path, "w", encoding=ENCODING) as f:
+            json.dump(records, f, indent=JSON_INDENT)
+        return records
+    with ndjson_writer(path) as write:
+        write(records)
+    return NdjsonFile(path)
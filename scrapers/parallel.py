@@ -0,0 +1,43 @@
+import typing as t
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    as_completed,
+)
+
+R = t.TypeVar("R")
+F = t.TypeVar("F")  # a stored page: html file path or archive entry
+
+# files sent to a worker process at once: amortizes pickling/IPC overhead of short parse jobs
+CHUNKSIZE = 64
+
+
+def _parse_chunk(parse: t.Callable[[F], R], files: t.Sequence[F]) -> list[tuple[F, R]]:
+    return [(f, parse(f)) for f in files]
+
+
+def parse_files(
+    parse: t.Callable[[F], R],
+    files: t.Sequence[F],
+    workers: int = 1,
+    chunksize: int = CHUNKSIZE,
+    ordered: bool = True,
+) -> t.Iterator[tuple[F, R]]:
+    """
+    Apply a side effect free, picklable (module level) parse function to files on a process pool,
+    yields (file, result) pairs.
+
+    workers <= 1 parses in the current process. ordered=True yields results in the order of files, ordered=False
+    yields whole chunks as soon as they are done (faster when files differ a lot in size).
+    """
+    if workers <= 1:
+        yield from ((f, parse(f)) for f in files)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if ordered:
+            yield from zip(files, pool.map(parse, files, chunksize=chunksize))
+        else:
+            futures = [
+                pool.submit(_parse_chunk, parse, files[i : i + chunksize]) for i in range(0, len(files), chunksize)
+            ]
+            for fut in as_completed(futures):
+                yield from fut.result()
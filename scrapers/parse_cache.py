@@ -0,0 +1,130 @@
+import hashlib
+import os
+import pickle  # nosec B403: the cache is a local file written by this very module
+import sqlite3
+import typing as t
+from pathlib import Path
+
+from scrapers.archive import (
+    ArchiveEntry,
+    Page,
+)
+from scrapers.parallel import (
+    CHUNKSIZE,
+    parse_files,
+)
+
+PARSE_CACHE_FILENAME = "parse_cache.sqlite"
+COMMIT_EVERY = 1000
+
+R = t.TypeVar("R")
+
+
+def _file_hash(path: Page) -> str:
+    if isinstance(path, ArchiveEntry):
+        return path.sha256
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _stat(path: Page) -> tuple[int, int]:
+    """
+    (mtime_ns, size) of a page
+    """
+    if isinstance(path, ArchiveEntry):
+        return path.stored_at_ns, path.length
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class ParseCache:
+    """
+    Parsed records of html files (or archived pages) keyed by file path. A record is valid while the parser version
+    is the same and the file is unchanged: same mtime+size, or (when those changed, e.g. after a re-crawl) the same
+    content hash.
+    """
+
+    def __init__(self, db_path: Path, parser_version: str) -> None:
+        self.parser_version = parser_version
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, sha256 TEXT, parser_version TEXT, record BLOB)"
+        )
+        # records of any other parser version will never be used again
+        self._conn.execute("DELETE FROM records WHERE parser_version != ?", (parser_version,))
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+
+    def is_valid(self, path: Page) -> bool:
+        row = self._conn.execute("SELECT mtime_ns, size, sha256 FROM records WHERE path = ?", (str(path),)).fetchone()
+        if row is None:
+            return False
+        mtime_ns, size = _stat(path)
+        if (mtime_ns, size) != (row[0], row[1]):
+            if size != row[1] or _file_hash(path) != row[2]:
+                return False
+            # content is the same, remember the new mtime
+            self._conn.execute("UPDATE records SET mtime_ns = ? WHERE path = ?", (mtime_ns, str(path)))
+        return True
+
+    def get(self, path: Page) -> t.Any:
+        row = self._conn.execute("SELECT record FROM records WHERE path = ?", (str(path),)).fetchone()
+        return pickle.loads(row[0])  # nosec B301
+
+    def put(self, path: Page, record: t.Any) -> None:
+        mtime_ns, size = _stat(path)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO records (path, mtime_ns, size, sha256, parser_version, record) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (str(path), mtime_ns, size, _file_hash(path), self.parser_version, pickle.dumps(record)),
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+
+def parse_files_cached(
+    parse: t.Callable[[Page], R],
+    files: t.Sequence[Page],
+    cache_path: t.Optional[Path],
+    parser_version: str,
+    workers: int = 1,
+    chunksize: int = CHUNKSIZE,
+    ordered: bool = True,
+) -> t.Iterator[tuple[Page, R]]:
+    """
+    Same as parallel.parse_files, but only new or changed files are parsed, the rest come from the cache
+    at cache_path (cache_path=None: parse everything)
+    """
+    if cache_path is None:
+        yield from parse_files(parse, files, workers=workers, chunksize=chunksize, ordered=ordered)
+        return
+    cache = ParseCache(cache_path, parser_version)
+    try:
+        hits = {f for f in files if cache.is_valid(f)}
+        misses = [f for f in files if f not in hits]
+        print(f"parse cache: {len(hits)} unchanged files, {len(misses)} to parse")
+        parsed = parse_files(parse, misses, workers=workers, chunksize=chunksize, ordered=ordered)
+        if not ordered:
+            for f in files:
+                if f in hits:
+                    yield f, cache.get(f)
+            for f, record in parsed:
+                cache.put(f, record)
+                yield f, record
+            return
+        for f in files:
+            if f in hits:
+                yield f, cache.get(f)
+            else:
+                f_, record = next(parsed)
+                cache.put(f_, record)
+                yield f_, record
+    finally:
+        cache.close()
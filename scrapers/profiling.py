@@ -0,0 +1,206 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import typing as t
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from scrapers.const import ENCODING
+
+# pipeline stages
+INDEX_FETCH = "index_fetch"
+HTML_PARSE = "html_parse"
+MEDIA_DOWNLOAD = "media_download"
+CSV_WRITE = "csv_write"
+IGDB_TRANSFORM = "igdb_transform"
+
+# modes: deterministic (every call, slow) or statistical (stacks sampled every SAMPLE_INTERVAL, cheap)
+PROFILE_CPROFILE = "cprofile"
+PROFILE_SAMPLE = "sample"
+TOP_N = 30
+SAMPLE_INTERVAL = 0.02
+
+T = t.TypeVar("T")
+
+# sampled stacks of threads blocked in these (idle pool workers, waits on futures) are not counted
+_IDLE_FILES = ("threading.py", "queue.py")
+
+
+class _CProfiler:
+    """
+    One cProfile.Profile per stage, enabled while the stage is the innermost one (profiles only the calling thread)
+    """
+
+    def __init__(self) -> None:
+        self._profiles: dict[str, cProfile.Profile] = {}
+
+    def start(self, name: str) -> None:
+        self._profiles.setdefault(name, cProfile.Profile()).enable()
+
+    def stop(self, name: str) -> None:
+        self._profiles[name].disable()
+
+    def finish(self, out_dir: Path, top_n: int, wall: dict[str, float]) -> None:
+        for name, profile in self._profiles.items():
+            profile.dump_stats(out_dir / f"{name}.pstats")
+            buf = io.StringIO()
+            pstats.Stats(profile, stream=buf).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top_n)
+            _write_summary(out_dir / f"{name}.txt", name, wall, buf.getvalue())
+
+
+def _frame_name(frame: t.Any) -> str:
+    code = frame.f_code
+    return f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+
+
+class _Sampler:
+    """
+    Records the stacks of all threads every `interval` seconds from a daemon thread, under the current stage.
+    Costs one stack walk per thread and sample whatever the workload, so it can stay on for production runs.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self._stacks: dict[str, Counter] = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def start(self, name: str) -> None:
+        pass
+
+    def stop(self, name: str) -> None:
+        pass
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            stage_name = _stack[-1] if _stack else None
+            if stage_name is None:
+                continue
+            stacks = self._stacks.setdefault(stage_name, Counter())
+            for thread_id, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if thread_id == own or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stacks[tuple(reversed(stack))] += 1
+
+    def finish(self, out_dir: Path, top_n: int, wall: dict[str, float]) -> None:
+        self._stopped.set()
+        self._thread.join()
+        for name, stacks in self._stacks.items():
+            # collapsed stacks, one "outer;...;inner count" line each: input of flamegraph.pl, speedscope
+            with open(out_dir / f"{name}.collapsed", "w", encoding=ENCODING) as f:
+                for stack, n in stacks.most_common():
+                    f.write(f"{';'.join(stack)} {n}\n")
+            total = sum(stacks.values())
+            own_samples: Counter = Counter()
+            cumulative: Counter = Counter()
+            for stack, n in stacks.items():
+                own_samples[stack[-1]] += n
+                for frame_name in set(stack):
+                    cumulative[frame_name] += n
+            lines = [f"{total} samples every {self.interval}s"]
+            for title, counter in (("self", own_samples), ("cumulative", cumulative)):
+                lines += ["", f"{'samples':>8} {'%':>6}  {title}"]
+                lines += [f"{n:8} {100 * n / total:6.1f}  {frame_name}" for frame_name, n in counter.most_common(top_n)]
+            _write_summary(out_dir / f"{name}.txt", name, wall, "\n".join(lines) + "\n")
+
+
+def _write_summary(path: Path, name: str, wall: dict[str, float], text: str) -> None:
+    with open(path, "w", encoding=ENCODING) as f:
+        f.write(f"stage {name}: {wall.get(name, 0):.1f}s wall time (nested stages excluded)\n\n")
+        f.write(text)
+
+
+_profiler: t.Optional[t.Union[_CProfiler, _Sampler]] = None
+_out_dir: t.Optional[Path] = None
+_top_n = TOP_N
+# stages entered (from the main thread) and not left yet, innermost last
+_stack: list[str] = []
+_wall: dict[str, float] = {}
+_entered: float = 0.0
+
+
+def configure_profiling(
+    mode: t.Optional[str], out_dir: Path, top_n: int = TOP_N, interval: float = SAMPLE_INTERVAL
+) -> None:
+    """
+    Profile pipeline stages (see `stage`) with cProfile or the stack sampler, results go to out_dir on finish_profiling
+    """
+    global _profiler, _out_dir, _top_n  # pylint: disable=global-statement
+    _profiler = None
+    _wall.clear()
+    if mode is None:
+        return
+    out_dir.mkdir(parents=True, exist_ok=True)
+    _out_dir = out_dir
+    _top_n = top_n
+    _profiler = _Sampler(interval) if mode == PROFILE_SAMPLE else _CProfiler()
+
+
+def finish_profiling() -> None:
+    """
+    Write "{stage}.pstats" (cProfile) or "{stage}.collapsed" (sampling) files plus a top-N "{stage}.txt" per stage
+    """
+    global _profiler  # pylint: disable=global-statement
+    if _profiler is None or _out_dir is None:
+        return
+    _profiler.finish(_out_dir, _top_n, _wall)
+    _profiler = None
+    print("profile: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in _wall.items()) + f" -> {_out_dir}")
+
+
+def _switch(leaving: t.Optional[str], entering: t.Optional[str]) -> None:
+    global _entered  # pylint: disable=global-statement
+    now = time.perf_counter()
+    if leaving is not None and _profiler is not None:
+        _profiler.stop(leaving)
+        _wall[leaving] = _wall.get(leaving, 0.0) + now - _entered
+    if entering is not None and _profiler is not None:
+        _profiler.start(entering)
+    _entered = now
+
+
+@contextmanager
+def stage(name: str) -> t.Iterator[None]:
+    """
+    Account the block to stage `name` (no-op unless profiling is on). Stages nest: the enclosing one is paused
+    meanwhile, so each stage's profile covers its own work only.
+    """
+    if _profiler is None:
+        yield
+        return
+    _switch(_stack[-1] if _stack else None, name)
+    _stack.append(name)
+    try:
+        yield
+    finally:
+        _stack.pop()
+        _switch(name, _stack[-1] if _stack else None)
+
+
+def _profiled(name: str, items: t.Iterable[T]) -> t.Iterator[T]:
+    it = iter(items)
+    while True:
+        with stage(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+
+def profiled(name: str, items: t.Iterable[T]) -> t.Iterable[T]:
+    """
+    Account the work done producing each item of a lazy iterable (e.g. parsing) to stage `name`,
+    and not to the stage consuming them
+    """
+    return _profiled(name, items) if _profiler is not None else items
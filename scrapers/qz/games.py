@@ -1,16 +1,63 @@
-import csv
 import datetime
+import itertools
 import os
 import re
+import typing as t
+from contextlib import nullcontext
+from functools import partial
 from pathlib import Path
 from time import sleep
 
 import dateparser
 import requests
-from bs4 import BeautifulSoup
+from bs4 import (
+    BeautifulSoup,
+    Tag,
+)
+from lxml import html as lxml_html
+from lxml.etree import XPath
 
-from scrapers.const import ENCODING
-from scrapers.misc import get_url
+from scrapers.archive import (
+    ARCHIVE_DIRNAME,
+    HtmlArchive,
+    Page,
+    read_page,
+)
+from scrapers.crawl import (
+    CONCURRENCY,
+    RATE_LIMIT,
+    Crawler,
+)
+from scrapers.media import (
+    MEDIA_DIRNAME,
+    MediaStore,
+    download_media,
+    fetch_pages,
+)
+from scrapers.misc import (
+    download,
+    first,
+    get_url,
+    xpath_has_class,
+)
+from scrapers.output import (
+    PARQUET_INT,
+    PARQUET_LIST,
+    PARQUET_TIMESTAMP,
+    csv_writer,
+    flat_parquet_writer,
+)
+from scrapers.parse_cache import (
+    PARSE_CACHE_FILENAME,
+    parse_files_cached,
+)
+from scrapers.profiling import (
+    CSV_WRITE,
+    HTML_PARSE,
+    MEDIA_DOWNLOAD,
+    profiled,
+    stage,
+)
 from scrapers.qz.conf import DOMAIN
 
 COLUMNS = [
@@ -38,6 +85,32 @@ COLUMNS = [
     "project_status",
     "store_link",
 ]
+# descr.parquet: types of non-string columns
+PARQUET_KINDS = {
+    "id": PARQUET_INT,
+    "other_names": PARQUET_LIST,
+    "website": PARQUET_LIST,
+    "developer": PARQUET_LIST,
+    "date_published": PARQUET_TIMESTAMP,
+    "other_lang": PARQUET_LIST,
+    "genre": PARQUET_LIST,
+    "media": PARQUET_LIST,
+}
+# bump on any change of parsing logic: invalidates records stored in the parse cache
+PARSER_VERSION = 1
+
+# lxml engine: expressions mirror soup.find/find_all lookups of parse_html_file (descendant axis, first match)
+_X_TABLE = XPath(f"//table[{xpath_has_class('txt')}]")
+_X_NAME = XPath(f".//div[{xpath_has_class('hdr0')}]")
+_X_FONT = XPath(".//font")
+_X_OTHER_NAMES = XPath(".//div[@id='names']")
+_X_I = XPath(".//i")
+_X_COVER = XPath(".//img[@alt='Обложка']")
+_X_TR = XPath(".//tr")
+_X_TD = XPath(".//td")
+_X_JUSTIFY = XPath(".//div[@align='justify']")
+_X_A = XPath(".//a")
+_X_B = XPath(".//b")
 
 
 def download_file(url: str, output_dir: Path) -> None:
@@ -45,18 +118,8 @@ def download_file(url: str, output_dir: Path) -> None:
     filepath = output_dir / filename
     if filepath.exists():
         return
-    try:
-        r = get_url(url)
-    except requests.exceptions.RequestException as e:
-        print(url)
-        print(e)
-        return
-    if r.status_code != 200:
-        print(f"error getting file: {url}")
-        return
-    with open(filepath, "wb", encoding=ENCODING) as f:
-        f.write(r.content)
-    sleep(0.5)
+    if download(url, filepath):
+        sleep(0.5)
 
 
 def download_screenshots(url: str, data_path: Path) -> None:
@@ -74,18 +137,124 @@ def download_screenshots(url: str, data_path: Path) -> None:
     if r.status_code != 200:
         print(f"error getting page: {url}")
         return
-    soup = BeautifulSoup(r.content, "html5lib")
+    for url_ in _screenshot_urls(r.content):
+        download_file(url_, dirpath)
+
+
+def _screenshot_urls(content: bytes) -> list[str]:
+    """
+    Full size screenshot urls of a screenshots page
+    """
+    soup = BeautifulSoup(content, "html5lib")
     tbl = soup.find("table")
+    res = []
     for img in tbl.find_all("img"):
         if "/screenshots/" in img["src"]:
             url_path = img["src"].strip()
             url_path = url_path.replace("_s.jpg", ".jpg")
-            download_file(f"{DOMAIN}{url_path}", dirpath)
+            res.append(f"{DOMAIN}{url_path}")
+    return res
+
 
+def _parse_date(value: str) -> t.Optional[datetime.datetime]:
+    date_published = dateparser.parse(value, languages=["ru"], settings={"TIMEZONE": "UTC"})
+    if not date_published:
+        # try to handle cases like "в ноябре 2005", find year and make up a date
+        match = re.match(r".*([1-3][0-9]{3})", value)
+        if match is not None:
+            date_published = datetime.datetime(int(match.group(1)), 1, 1, 0, 0, 0)
+    return date_published
 
-def parse_html_file(html_file_path: Path, data_path: Path, scrape_covers: bool, scrape_screenshots: bool) -> dict:
-    with open(html_file_path, "rb") as f:
-        soup = BeautifulSoup(f.read().decode("cp1251"), "html5lib")
+
+def _apply_row(
+    descr: dict,
+    field: str,
+    value: str,
+    links: t.Callable[[], list[str]],
+    bold: t.Callable[[], t.Optional[str]],
+    html_file_path: Page,
+) -> None:
+    """
+    Store a "field: value" row of the game table, links/bold lazily return hrefs of the value cell and
+    text of its first <b>
+    """
+    if "Сайт(ы) игры" in field:
+        descr["website"] = links()
+    elif "Разработка" in field:
+        descr["developer"] = [x.strip() for x in value.split("/") if x != "-"]
+    elif "Издание" in field:
+        descr["publisher"] = value
+    elif "Вышла:" in field or "Дата выхода" in field or "Выйдет:" in field:
+        descr["date_published"] = _parse_date(value)
+    elif "Язык" in field:
+        descr["lang"] = value
+    elif "Другие" in field:
+        descr["other_lang"] = [x.strip() for x in value.split("/") if x.strip() != "-"]
+    elif "Платформы" in field:
+        platform = bold()
+        descr["platform"] = platform if platform is not None else value
+    elif "Жанры" in field:
+        descr["genre"] = [x.strip() for x in value.split("/") if x != "-"]
+    elif "Вид" in field:
+        descr["view"] = value.strip()
+    elif "Управление" in field:
+        if value != "-":
+            descr["control"] = value
+    elif "Носитель" in field:
+        descr["media"] = [x.strip() for x in value.split("/") if x != "-"]
+    elif "Лицензия" in field:
+        descr["license"] = value
+    elif "Системные требования" in field:
+        descr["sys_requirements"] = value
+    elif "Движок" in field:
+        descr["engine"] = value.strip()
+    elif "Можно запустить" in field:
+        descr["emulator"] = value
+    elif "Новеллы" in field:
+        descr["novel"] = value
+    elif "Проект" in field:
+        descr["project_status"] = value
+    elif "Купить" in field:
+        store_links = links()
+        if store_links:
+            descr["store_link"] = store_links[0]
+    else:
+        if (
+            "Обзоры" not in field
+            and "Тип локализации" not in field
+            and "Прохождения" not in field
+            and "Переводы" not in field
+            and "Ролики" not in field
+            and "Скачать" not in field
+            and "России" not in field
+            and "Локализация" not in field
+            and "Создатели поимённо" not in field
+            and "Российская поставка" not in field
+            and "Российская дата" not in field
+            and "<<" not in field
+            and ">>" not in field
+            and ": " != field
+            and ":" != field
+        ):
+            print(html_file_path)
+            print(field)
+
+
+def _soup_hrefs(td: Tag) -> list[str]:
+    return [a["href"] for a in td.find_all("a")]
+
+
+def _soup_bold(td: Tag) -> t.Optional[str]:
+    b = td.find("b")
+    return b.text if b else None
+
+
+def parse_html_file(html_file_path: Page) -> tuple[dict, dict]:
+    """
+    Parse a stored game page into (descr, media), media holds urls of images to download (if requested).
+    Has no side effects, so it's safe to run in worker processes.
+    """
+    soup = BeautifulSoup(read_page(html_file_path).decode("cp1251"), "html5lib")
 
     tbl = soup.find("table", {"class": "txt"})
 
@@ -102,12 +271,10 @@ def parse_html_file(html_file_path: Path, data_path: Path, scrape_covers: bool,
     if other_names:
         descr["other_names"] = [x.strip().replace('"', "") for x in other_names.find("i").text.split("\n")]
 
-    if scrape_covers:
-        cover = tbl.find("img", {"alt": "Обложка"})
-        if cover:
-            descr["cover"] = cover["src"]
-            download_file(f"{DOMAIN}{cover['src']}", data_path / "covers")
-            pass
+    media: dict = {"cover": None, "screenshots": []}
+    cover = tbl.find("img", {"alt": "Обложка"})
+    if cover:
+        media["cover"] = f"{DOMAIN}{cover['src']}"
 
     for tr in tbl.find_all("tr"):
         tds = tr.find_all("td")
@@ -115,113 +282,164 @@ def parse_html_file(html_file_path: Path, data_path: Path, scrape_covers: bool,
             if tds[0].find("div", {"align": "justify"}):
                 descr["description"] = tds[0].text
             else:
-                if scrape_screenshots:
-                    links = tds[0].find_all("a")
-                    if links:
-                        link = links[-1]["href"][:-1]
-                        if "questzone.ru/screenshots" in link:
-                            download_screenshots(link, data_path)
+                links = tds[0].find_all("a")
+                if links:
+                    link = links[-1]["href"][:-1]
+                    if "questzone.ru/screenshots" in link:
+                        media["screenshots"].append(link)
         elif len(tds) >= 2:
-            field = tds[0].text
-            value = tds[1].text
-            if "Сайт(ы) игры" in field:
-                descr["website"] = [a["href"] for a in tds[1].find_all("a")]
-            elif "Разработка" in field:
-                descr["developer"] = [x.strip() for x in value.split("/") if x != "-"]
-            elif "Издание" in field:
-                descr["publisher"] = value
-            elif "Вышла:" in field or "Дата выхода" in field or "Выйдет:" in field:
-                date_published = dateparser.parse(value, languages=["ru"], settings={"TIMEZONE": "UTC"})
-                if not date_published:
-                    # try to handle cases like "в ноябре 2005", find year and make up a date
-                    match = re.match(r".*([1-3][0-9]{3})", value)
-                    if match is not None:
-                        date_published = datetime.datetime(int(match.group(1)), 1, 1, 0, 0, 0)
-                descr["date_published"] = date_published
-            elif "Язык" in field:
-                descr["lang"] = value
-            elif "Другие" in field:
-                descr["other_lang"] = [x.strip() for x in value.split("/") if x.strip() != "-"]
-            elif "Платформы" in field:
-                platform = tds[1].find("b")
-                if platform:
-                    descr["platform"] = platform.text
-                else:
-                    descr["platform"] = value
-            elif "Жанры" in field:
-                descr["genre"] = [x.strip() for x in value.split("/") if x != "-"]
-            elif "Вид" in field:
-                descr["view"] = value.strip()
-            elif "Управление" in field:
-                if value != "-":
-                    descr["control"] = value
-            elif "Носитель" in field:
-                descr["media"] = [x.strip() for x in value.split("/") if x != "-"]
-            elif "Лицензия" in field:
-                descr["license"] = value
-            elif "Системные требования" in field:
-                descr["sys_requirements"] = value
-            elif "Движок" in field:
-                descr["engine"] = value.strip()
-            elif "Можно запустить" in field:
-                descr["emulator"] = value
-            elif "Новеллы" in field:
-                descr["novel"] = value
-            elif "Проект" in field:
-                descr["project_status"] = value
-            elif "Купить" in field:
-                store_link = tds[1].find("a")
-                if store_link:
-                    descr["store_link"] = store_link["href"]
+            _apply_row(
+                descr,
+                tds[0].text,
+                tds[1].text,
+                partial(_soup_hrefs, tds[1]),
+                partial(_soup_bold, tds[1]),
+                html_file_path,
+            )
+
+    return descr, media
+
+
+def _lxml_hrefs(td: lxml_html.HtmlElement) -> list[str]:
+    return [a.attrib["href"] for a in _X_A(td)]
+
+
+def _lxml_bold(td: lxml_html.HtmlElement) -> t.Optional[str]:
+    b = first(_X_B(td))
+    return b.text_content() if b is not None else None
+
+
+def parse_html_file_lxml(html_file_path: Page) -> tuple[dict, dict]:
+    """
+    Same as parse_html_file, but on lxml with XPath expressions compiled once per process
+    """
+    doc = lxml_html.document_fromstring(read_page(html_file_path).decode("cp1251"))
+
+    tbl = first(_X_TABLE(doc))
+
+    descr = dict.fromkeys(COLUMNS, None)
+
+    descr["id"] = int(html_file_path.stem)
+    descr["name"] = first(_X_NAME(tbl)).text_content()
+
+    rus_name = first(_X_FONT(tbl))
+    if rus_name is not None and "/" not in rus_name.text_content():
+        descr["rus_name"] = rus_name.text_content()
+
+    other_names = first(_X_OTHER_NAMES(tbl))
+    if other_names is not None:
+        descr["other_names"] = [x.strip().replace('"', "") for x in first(_X_I(other_names)).text_content().split("\n")]
+
+    media: dict = {"cover": None, "screenshots": []}
+    cover = first(_X_COVER(tbl))
+    if cover is not None:
+        media["cover"] = f"{DOMAIN}{cover.attrib['src']}"
+
+    for tr in _X_TR(tbl):
+        tds = _X_TD(tr)
+        if len(tds) == 1:
+            if _X_JUSTIFY(tds[0]):
+                descr["description"] = tds[0].text_content()
             else:
-                if (
-                    "Обзоры" not in field
-                    and "Тип локализации" not in field
-                    and "Прохождения" not in field
-                    and "Переводы" not in field
-                    and "Ролики" not in field
-                    and "Скачать" not in field
-                    and "России" not in field
-                    and "Локализация" not in field
-                    and "Создатели поимённо" not in field
-                    and "Российская поставка" not in field
-                    and "Российская дата" not in field
-                    and "<<" not in field
-                    and ">>" not in field
-                    and ": " != field
-                    and ":" != field
-                ):
-                    print(html_file_path)
-                    print(field)
-
-    return descr
-
-
-def run(data_path: Path, scrape_covers: bool = False, scrape_screenshots: bool = False) -> None:
+                links = _X_A(tds[0])
+                if links:
+                    link = links[-1].attrib["href"][:-1]
+                    if "questzone.ru/screenshots" in link:
+                        media["screenshots"].append(link)
+        elif len(tds) >= 2:
+            _apply_row(
+                descr,
+                tds[0].text_content(),
+                tds[1].text_content(),
+                partial(_lxml_hrefs, tds[1]),
+                partial(_lxml_bold, tds[1]),
+                html_file_path,
+            )
+
+    return descr, media
+
+
+PARSERS = {"bs4": parse_html_file, "lxml": parse_html_file_lxml}
+
+
+def run(
+    data_path: Path,
+    scrape_covers: bool = False,
+    scrape_screenshots: bool = False,
+    workers: int = 1,
+    ordered: bool = True,
+    parser: str = "bs4",
+    incremental: bool = False,
+    media_store: bool = False,
+    concurrency: int = CONCURRENCY,
+    rate: float = RATE_LIMIT,
+    archive: bool = False,
+    parquet: bool = False,
+) -> None:
+    """
+    archive=True: parse pages from the html archive ("{data_path}/archive") instead of "{data_path}/html" files
+    parquet=True: also write descr.parquet (typed columns, lists as lists)
+    media_store=True: download covers and screenshots concurrently (concurrency, rate per host) into the
+    content-addressed store shared by all scrapers ("{data_path}/../media") instead of one by one
+    """
     html_dir = data_path / "html"
     res_file = data_path / "descr.csv"
-    files = os.listdir(html_dir)
-    i = 1
-    result = {}
-
-    for filename in files:
-        if i % 1000 == 1:
-            print(f"processing file {filename}: {i} of {len(files)}")
+    html_files: t.Sequence[Page]
+    if archive:
+        archive_ = HtmlArchive(data_path / ARCHIVE_DIRNAME)
+        html_files = archive_.entries()
+        archive_.close()
+    else:
+        files = os.listdir(html_dir)
         # filename = '507+eng.html'
-        if not filename.endswith(".html"):
-            continue
-        # print(filename)
-        descr = parse_html_file(html_dir / filename, data_path, scrape_covers, scrape_screenshots)
-        if descr["id"] in result:
-            print(f"duplicate entry found. id: {descr['id']}")
-        else:
-            result[descr["id"]] = descr
-        i += 1
-    try:
-        with open(res_file, "w", encoding=ENCODING) as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=COLUMNS)
-            writer.writeheader()
-            for _, descr in result.items():
+        html_files = [html_dir / filename for filename in files if filename.endswith(".html")]
+    i = 1
+    known_ids: set[int] = set()
+    covers: list[str] = []
+    screenshots: list[str] = []
+    parsed = parse_files_cached(
+        PARSERS[parser],
+        html_files,
+        data_path / PARSE_CACHE_FILENAME if incremental else None,
+        f"{PARSER_VERSION}-{parser}",
+        workers=workers,
+        ordered=ordered,
+    )
+    # rows are written as soon as they are parsed, descr.csv is replaced only when all of them are written:
+    # on any error (parsing included) it is left untouched and the error propagates
+    with stage(CSV_WRITE), csv_writer(res_file, COLUMNS) as writer, (
+        flat_parquet_writer(data_path / "descr.parquet", COLUMNS, PARQUET_KINDS) if parquet else nullcontext(None)
+    ) as write_parquet:
+        for _, (descr, media) in profiled(HTML_PARSE, parsed):
+            if i % 1000 == 1:
+                print(f"processing file {i} of {len(html_files)}: id={descr['id']}")
+            if descr["id"] in known_ids:
+                print(f"duplicate entry found. id: {descr['id']}")
+            else:
+                known_ids.add(descr["id"])
                 writer.writerow(descr)
-    except IOError:
-        print("I/O error")
+                if write_parquet:
+                    write_parquet(descr)
+            if scrape_covers and media["cover"]:
+                covers.append(media["cover"])
+            if scrape_screenshots:
+                screenshots += media["screenshots"]
+            i += 1
+    # media downloads are dispatched from the main process, after parsing
+    with stage(MEDIA_DOWNLOAD):
+        if media_store:
+            crawler = Crawler(concurrency, rate)
+            # screenshot pages are fetched concurrently too, images are queued as soon as their page is parsed
+            images = itertools.chain(
+                covers, (u for _, r in fetch_pages(crawler, screenshots) for u in _screenshot_urls(r.content))
+            )
+            store = MediaStore(data_path.parent / MEDIA_DIRNAME)
+            try:
+                download_media(store, crawler, images)
+            finally:
+                store.close()
+            return
+        for url in covers:
+            download_file(url, data_path / "covers")
+        for url in screenshots:
+            download_screenshots(url, data_path)
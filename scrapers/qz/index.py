@@ -1,9 +1,23 @@
+import typing as t
 from pathlib import Path
-from time import sleep
 
 from bs4 import BeautifulSoup
 
-from scrapers.misc import get_url
+from scrapers.archive import (
+    ARCHIVE_DIRNAME,
+    HtmlArchive,
+)
+from scrapers.crawl import (
+    CONCURRENCY,
+    RATE_LIMIT,
+    Crawler,
+)
+from scrapers.manifest import (
+    KIND_GAME,
+    KIND_LISTING,
+    MANIFEST_FILENAME,
+    CrawlManifest,
+)
 from scrapers.qz.conf import DOMAIN
 
 INDEX_BASE_URL = f"{DOMAIN}/enzi/game"
@@ -12,30 +26,74 @@ LANGUAGES = {
     "eng": [chr(i) for i in range(ord("A"), ord("Z") + 1)] + ["0-9"],
     "rus": [chr(i) for i in range(ord("А"), ord("Я") + 1)],
 }
-SLEEP_OK = 0.5
 
 
-def run(data_path: Path) -> None:
-    data_path.mkdir(parents=True, exist_ok=True)
+def _listing_links(crawler: Crawler, manifest: CrawlManifest, url: str, max_age: t.Optional[float]) -> list:
+    """
+    Game links of letter page url. Each letter is a single page, which grows as games are added: its links are
+    reused for LISTING_MAX_AGE at most (see CrawlManifest.fresh_links), and not kept at all when there are none.
+    """
+    links = manifest.fresh_links(url, max_age)
+    if links is not None:
+        return links
+    print(f"parsing index from page: {url}")
+    res_idx_page = crawler.get(url)
+    soup = BeautifulSoup(res_idx_page.content, "html.parser")
+    links = []
+    for a in soup.find_all("div", {"class": "txt"})[1].find_all("a"):
+        url_parts = a["href"].split("/")
+        if len(url_parts) < 4:
+            continue
+        game_prefix = url_parts[3]
+        if "letter" in game_prefix:
+            continue
+        links.append((game_prefix, f"{INDEX_BASE_URL}/{game_prefix}"))
+    manifest.record(url, KIND_LISTING, res_idx_page.status_code, links or None)
+    return links
+
+
+def _game_pages(crawler: Crawler, manifest: CrawlManifest, max_age: t.Optional[float]) -> t.Iterator[tuple[str, str]]:
+    """
+    Walk letter index pages and yield (game_prefix, game_page_url) of pages which need to be fetched
+    """
     for lang, letters in LANGUAGES.items():
         for letter in letters:
-            url = f"{INDEX_BASE_URL}/letter_{lang}+{letter}"
-            print(f"parsing index from page: {url}")
-            res_idx_page = get_url(url)
-            soup = BeautifulSoup(res_idx_page.content, "html.parser")
-            for a in soup.find_all("div", {"class": "txt"})[1].find_all("a"):
-                url_parts = a["href"].split("/")
-                if len(url_parts) < 4:
-                    continue
-                game_prefix = url_parts[3]
-                if "letter" in game_prefix:
-                    continue
-                url = f"{INDEX_BASE_URL}/{game_prefix}"
-                print(f"getting game page: {url}")
-                game_page_html = get_url(url)
+            for game_prefix, url in _listing_links(
+                crawler, manifest, f"{INDEX_BASE_URL}/letter_{lang}+{letter}", max_age
+            ):
+                if not manifest.is_fresh(url, max_age):
+                    yield game_prefix, url
+
+
+def run(
+    data_path: Path,
+    concurrency: int = CONCURRENCY,
+    rate: float = RATE_LIMIT,
+    max_age: t.Optional[float] = None,
+    archive: bool = False,
+) -> None:
+    """
+    Fetch QZ games index (all html pages of all games) and store into "{data_path}/html".
+    Pages fetched successfully less than max_age seconds ago (according to the crawl manifest) are skipped.
+    archive=True: append pages to the html archive ("{data_path}/archive") instead of writing one file per page.
+    """
+    data_path.mkdir(parents=True, exist_ok=True)
+    crawler = Crawler(concurrency=concurrency, rate=rate)
+    manifest = CrawlManifest(data_path / MANIFEST_FILENAME)
+    html_archive = HtmlArchive(data_path / ARCHIVE_DIRNAME) if archive else None
+    try:
+        for game_prefix, url, game_page_html in crawler.fetch_all(_game_pages(crawler, manifest, max_age)):
+            print(f"got game page: {url}")
+            if html_archive:
+                html_archive.put(game_prefix + ".html", game_page_html.content)
+            else:
                 html_files_folder = data_path / "html" / game_prefix[:1]
                 html_files_folder.mkdir(parents=True, exist_ok=True)
                 html_file_path = html_files_folder / (game_prefix + ".html")
                 with open(html_file_path, "wb") as f:
                     f.write(game_page_html.content)
-                sleep(SLEEP_OK)
+            manifest.record(url, KIND_GAME, game_page_html.status_code)
+    finally:
+        manifest.close()
+        if html_archive:
+            html_archive.close()
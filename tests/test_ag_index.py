@@ -0,0 +1,56 @@
+import pytest
+import requests
+
+from scrapers.ag import index
+from scrapers.manifest import (
+    KIND_GAME,
+    CrawlManifest,
+)
+
+SECTION_URL = f"{index.DOMAIN}/games/adventure/all-title-asc"
+
+
+def _listing(*game_ids: int) -> bytes:
+    cards = "".join(f'<div class="card"><a href="/games/view/{i}">{i}</a></div>' for i in game_ids)
+    return f'<html><body><div class="item_holder"></div><div class="item_holder">{cards}</div></body></html>'.encode()
+
+
+class _Crawler:
+    def __init__(self, pages: dict[str, bytes]) -> None:
+        self.pages = pages
+        self.fetched: list[str] = []
+
+    def get(self, url: str) -> requests.Response:
+        self.fetched.append(url)
+        res = requests.Response()
+        res.status_code = 200
+        res._content = self.pages.get(url, _listing())  # pylint: disable=protected-access
+        return res
+
+
+@pytest.mark.unit
+class TestAgIndex:
+    def test_resumed_walk(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(index, "SECTIONS", {"all"})
+        manifest = CrawlManifest(tmp_path / "manifest.sqlite")
+        crawler = _Crawler({f"{SECTION_URL}/page1": _listing(1, 2), f"{SECTION_URL}/page2": _listing(3)})
+        pages = list(index._game_pages(crawler, manifest, None))  # pylint: disable=protected-access
+        assert [key for key, _ in pages] == ["1", "2", "3"]
+        assert crawler.fetched == [f"{SECTION_URL}/page{p}" for p in (1, 2, 3)]
+        # interrupted after the first two games
+        for _, url in pages[:2]:
+            manifest.record(url, KIND_GAME, 200)
+
+        # meanwhile a game was added to the last page, which is now full, and a new page started
+        crawler = _Crawler(
+            {
+                f"{SECTION_URL}/page1": _listing(1, 2),
+                f"{SECTION_URL}/page2": _listing(3, 4),
+                f"{SECTION_URL}/page3": _listing(5),
+            }
+        )
+        pages = list(index._game_pages(crawler, manifest, float("inf")))  # pylint: disable=protected-access
+        assert [key for key, _ in pages] == ["3", "4", "5"]
+        # the full first page comes from the manifest, the short and empty last ones are fetched again
+        assert crawler.fetched == [f"{SECTION_URL}/page{p}" for p in (2, 3, 4)]
+        manifest.close()
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+
+from scrapers import archive
+from scrapers.archive import (
+    HtmlArchive,
+    pack_html_dir,
+    read_page,
+)
+from scrapers.parallel import parse_files
+from scrapers.qz.games import PARSERS as QZ_PARSERS
+from tests.test_parsers import QZ_PAGE
+
+
+@pytest.mark.unit
+class TestArchive:
+    def test_append_overwrite_and_shards(self, tmp_path: Path, monkeypatch):
+        monkeypatch.setattr(archive, "SHARD_MAX_SIZE", 200)
+        html_archive = HtmlArchive(tmp_path)
+        pages = {f"{i}.html": f"<html>{'game ' * i}{i}</html>".encode() for i in range(20)}
+        for key, content in pages.items():
+            html_archive.put(key, content)
+        html_archive.put("3.html", b"<html>new version</html>")
+        pages["3.html"] = b"<html>new version</html>"
+
+        assert len(list(tmp_path.glob("shard-*.gz"))) > 1
+        assert html_archive.get("3.html") == pages["3.html"]
+        assert "missing.html" not in html_archive and html_archive.get("missing.html") is None
+        html_archive.close()
+
+        # reopened, e.g. in a parser worker process
+        entries = HtmlArchive(tmp_path).entries()
+        assert {e.key: read_page(e) for e in entries} == pages
+
+    def test_pack_and_parse(self, tmp_path: Path):
+        html_dir = tmp_path / "html"
+        (html_dir / "5").mkdir(parents=True)
+        (html_dir / "5" / "55.html").write_bytes(QZ_PAGE.encode("cp1251"))
+        html_archive = HtmlArchive(tmp_path / "archive")
+        assert pack_html_dir(html_dir, html_archive) == 1
+        entries = html_archive.entries()
+        html_archive.close()
+
+        for parser in QZ_PARSERS.values():
+            (_, from_file), (_, from_archive) = parse_files(parser, [html_dir / "5" / "55.html", *entries])
+            assert from_archive == from_file
+            assert from_archive[0]["id"] == 55
@@ -0,0 +1,90 @@
+import threading
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+import pytest
+from requests import Response
+
+from scrapers import misc
+from scrapers.cache import HttpCache
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests_seen: list = []
+
+    def do_GET(self):  # noqa: N802
+        self.requests_seen.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = b"<html>game</html>"
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.unit
+class TestCache:
+    @pytest.fixture
+    def url(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield f"http://127.0.0.1:{server.server_address[1]}/game.html"
+        server.shutdown()
+        misc.configure_cache(None)
+
+    def test_revalidation_keeps_cached_body(self, url, tmp_path):
+        misc.configure_cache(tmp_path)
+        first = misc.get_url(url)
+        second = misc.get_url(url)
+        assert _Handler.requests_seen[-2:] == [None, '"v1"']
+        assert second.status_code == 200
+        assert second.headers["X-Cache"] == "REVALIDATED"
+        assert second.content == first.content
+
+    def test_size_eviction(self, url, tmp_path):
+        misc.configure_cache(tmp_path, max_size=10)
+        misc.get_url(url)
+        assert not list(tmp_path.rglob("*.body"))
+
+    def test_fresh_entries_are_not_revalidated(self, url, tmp_path):
+        misc.configure_cache(tmp_path, fresh_for=3600)
+        misc.get_url(url)
+        n = len(_Handler.requests_seen)
+        assert misc.get_url(url).headers["X-Cache"] == "HIT"
+        assert len(_Handler.requests_seen) == n
+
+    def test_secret_params_are_not_stored(self, url, tmp_path):
+        misc.configure_cache(tmp_path)
+        misc.get_url(url, params={"api_key": "s3cr3t", "offset": 100})
+        (meta,) = tmp_path.rglob("*.json")
+        assert "s3cr3t" not in meta.read_text(encoding="utf-8")
+        assert misc.get_url(url, params={"api_key": "s3cr3t", "offset": 100}).url == f"{url}?offset=100"
+
+    def test_concurrent_stores_keep_size_accounting(self, tmp_path):
+        cache = HttpCache(tmp_path, max_size=20_000)
+
+        def store(worker):
+            for i in range(50):
+                res = Response()
+                res.url = f"http://example.com/{i % 30}"
+                res._content = bytes([worker]) * 1000  # pylint: disable=protected-access
+                cache.store(res.url, res)
+
+        threads = [threading.Thread(target=store, args=(w,)) for w in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        on_disk = sum(p.stat().st_size for p in tmp_path.rglob("*.body"))
+        assert cache._size == on_disk <= 20_000  # pylint: disable=protected-access
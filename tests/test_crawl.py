@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pytest
+
+from scrapers import crawl
+from scrapers.crawl import (
+    Crawler,
+    TokenBucket,
+)
+
+
+@pytest.mark.unit
+class TestCrawl:
+    def test_token_bucket_rate(self):
+        bucket = TokenBucket(rate=50)
+        started = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        # first token is available immediately, the other 10 take 1/50s each
+        assert time.monotonic() - started >= 0.19
+
+    def test_fetch_all_bounded_concurrency(self, monkeypatch):
+        in_flight = 0
+        max_in_flight = 0
+        lock = threading.Lock()
+
+        def fake_get_url(url):
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight -= 1
+            return url
+
+        monkeypatch.setattr(crawl, "get_url", fake_get_url)
+        crawler = Crawler(concurrency=3, rate=0)
+        jobs = [(i, f"http://example.com/{i}") for i in range(20)]
+        res = {key: res for key, _, res in crawler.fetch_all(jobs)}
+        assert res == dict(jobs)
+        assert max_in_flight <= 3
@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from scrapers.diff import (
+    MatchStore,
+    match_incremental,
+)
+from scrapers.matching import find_similar_games
+
+WORDS = ["monkey", "island", "secret", "quest", "king", "sword", "broken", "myst", "riven", "space", "the", "of", "2"]
+
+
+def _record(i, rnd):
+    name = " ".join(rnd.choices(WORDS, k=rnd.randint(1, 4)))
+    other_names = str([" ".join(rnd.choices(WORDS, k=2))]) if rnd.random() < 0.5 else ""
+    return {"id": str(i), "name": name, "other_names": other_names}
+
+
+@pytest.mark.unit
+class TestDiff:
+    def test_incremental_matches_full_run(self, tmp_path):
+        rnd = random.Random(3)
+        ag_db = {str(i): _record(i, rnd) for i in range(80)}
+        qz_db = {str(i): _record(i, rnd) for i in range(200)}
+        store = MatchStore(tmp_path / "matches.sqlite")
+        match_incremental(ag_db, qz_db, store)
+
+        # churn: changed, added and removed records on both sides
+        for i in rnd.sample(range(80), 10):
+            ag_db[str(i)] = _record(i, rnd)
+        for i in range(80, 90):
+            ag_db[str(i)] = _record(i, rnd)
+        for i in rnd.sample(range(200), 20):
+            qz_db[str(i)] = _record(i, rnd)
+        for i in rnd.sample(range(200), 10):
+            qz_db.pop(str(i), None)
+        for i in range(200, 230):
+            qz_db[str(i)] = _record(i, rnd)
+
+        res = match_incremental(ag_db, qz_db, store)
+        store.close()
+        for k, ag in ag_db.items():
+            expected = find_similar_games(ag, qz_db)
+            assert res[k] == ((expected[0], expected[1]["id"]) if expected else None)
@@ -0,0 +1,63 @@
+import threading
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+import pytest
+
+from scrapers.misc import (
+    PARTIAL_SUFFIX,
+    download,
+)
+from scrapers.qz import games as qz_games
+
+BODY = bytes(range(256)) * 1000
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    ranges_seen: list = []
+
+    def do_GET(self):  # noqa: N802
+        self.ranges_seen.append(self.headers.get("Range"))
+        start = 0
+        if self.headers.get("Range") and self.path != "/no-ranges.bin":
+            start = int(self.headers["Range"][len("bytes=") : -1])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(BODY) - 1}/{len(BODY)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY) - start))
+        self.end_headers()
+        self.wfile.write(BODY[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.unit
+class TestDownload:
+    @pytest.fixture
+    def base_url(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
+
+    @pytest.mark.parametrize("name", ["file.bin", "no-ranges.bin"])
+    def test_interrupted_download_is_resumed(self, base_url, tmp_path, name):
+        path = tmp_path / name
+        # left by an interrupted run
+        (tmp_path / f"{name}{PARTIAL_SUFFIX}").write_bytes(BODY[:1000])
+        _Handler.ranges_seen.clear()
+        assert download(f"{base_url}/{name}", path)
+        assert _Handler.ranges_seen == ["bytes=1000-"]
+        assert path.read_bytes() == BODY
+        assert not (tmp_path / f"{name}{PARTIAL_SUFFIX}").exists()
+
+    def test_qz_cover_into_missing_directory(self, base_url, tmp_path, monkeypatch):
+        monkeypatch.setattr(qz_games, "sleep", lambda _: None)
+        # qz --covers without --media-store: nothing creates "{data_path}/covers" beforehand
+        qz_games.download_file(f"{base_url}/covers/1.jpg", tmp_path / "covers")
+        assert (tmp_path / "covers" / "1.jpg").read_bytes() == BODY
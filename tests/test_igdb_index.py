@@ -0,0 +1,86 @@
+import random
+import re
+
+import pytest
+
+from scrapers.igdb import index
+from scrapers.igdb.store import IgdbStore
+
+
+def _catalog():
+    rnd = random.Random(2)
+    return [
+        {"id": i, "slug": f"game-{i}", "genres": [{"id": g} for g in rnd.sample([31, 2, 9, 5, 7], k=rnd.randint(1, 3))]}
+        for i in range(1, 300)
+    ]
+
+
+def _iter_data(catalog):
+    def iter_data(url, data, cursor=False):  # pylint: disable=unused-argument
+        m = re.search(r"genres=\[(\d+)\]", data) or re.search(r"genres = \(([\d,]+)\)", data)
+        wanted = {int(g) for g in m.group(1).split(",")}
+        rows = [g for g in catalog if wanted & {x["id"] for x in g["genres"]}]
+        for i in range(0, len(rows), 50):
+            yield rows[i : i + 50]
+
+    return iter_data
+
+
+@pytest.mark.unit
+class TestIgdbIndex:
+    def test_union_query_matches_per_genre_queries(self, monkeypatch):
+        catalog = _catalog()
+        monkeypatch.setattr(index, "iter_data", _iter_data(catalog))
+        per_genre = index.get_games()
+        union = index.get_games(union=True)
+
+        assert len({g["id"] for g in union}) == len(union) < len(per_genre)
+        # same games in the same order as the deduplicated per-genre results, which games.csv is written from
+        seen, expected = set(), []
+        for g in per_genre:
+            if g["id"] not in seen:
+                seen.add(g["id"])
+                expected.append(g)
+        assert list(index._in_genre_order(union)) == expected  # pylint: disable=protected-access
+
+    @pytest.mark.parametrize("union", [False, True])
+    def test_sync_prunes_games_gone_from_igdb(self, monkeypatch, tmp_path, union):
+        catalog = _catalog()
+        monkeypatch.setattr(index, "iter_data", _iter_data(catalog))
+        store = IgdbStore(tmp_path / "store.sqlite")
+
+        def synced_ids():
+            games = list(index._sync(store, "games", False, union))  # pylint: disable=protected-access
+            ids = [g["id"] for g in games]
+            # what --igdb-union writes: the same games
+            assert sorted(g["id"] for g in index._in_genre_order(games)) == ids  # pylint: disable=protected-access
+            return ids
+
+        matching = [g for g in catalog if set(index.GAMES_GENRES) & {x["id"] for x in g["genres"]}]
+        assert synced_ids() == [g["id"] for g in matching]
+        # a game deleted, another one not in GAMES_GENRES anymore
+        catalog.remove(matching[0])
+        matching[1]["genres"] = [{"id": 5}]
+        assert synced_ids() == [g["id"] for g in matching[2:]]
+        store.close()
+
+    def test_games_csv_is_replaced_only_when_complete(self, tmp_path):
+        game = {"id": 1, "slug": "gk", "name": "Gabriel Knight", "genres": [{"id": 31}]}
+        index.write_games_csv(tmp_path, [game])
+        previous = (tmp_path / "games.csv").read_bytes()
+
+        def games():
+            yield {**game, "id": 2, "slug": "loom"}
+            raise ConnectionError("igdb went away")
+
+        with pytest.raises(ConnectionError):
+            index.write_games_csv(tmp_path, games())
+        assert (tmp_path / "games.csv").read_bytes() == previous
+
+    def test_game_by_id_uses_the_games_query(self, monkeypatch):
+        queries = []
+        monkeypatch.setattr(index, "get_data", lambda url, data: queries.append((url, data)) or [])
+        index.get_game_by_id(217940)
+        ((url, data),) = queries
+        assert url == f"{index.HOST_URL}/games"
+        assert data == index._games_query("id=217940")  # pylint: disable=protected-access
@@ -0,0 +1,140 @@
+import random
+import re
+
+import pytest
+
+from scrapers.igdb import misc
+
+URL = "https://api.igdb.com/v4/games"
+QUERY = "fields id;sort id asc;"
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class _Api:
+    """
+    IGDB stand-in: /count, and /multiquery returning the named results in random order
+    """
+
+    def __init__(self, rows: int, count: int) -> None:
+        self.catalog = [{"id": i} for i in range(1, rows + 1)]
+        self.count = count
+        self.multiqueries: list[list[int]] = []
+        self.rnd = random.Random(1)
+
+    def post_url(self, url, data=None):
+        if url == f"{URL}/count":
+            return _Response({"count": self.count})
+        assert url == "https://api.igdb.com/v4/multiquery"
+        queries = re.findall(r'query games "(\d+)" \{ ' + re.escape(QUERY) + r"offset (\d+);limit (\d+); \};", data)
+        self.multiqueries.append([int(name) for name, _, _ in queries])
+        res = [
+            {"name": name, "result": self.catalog[int(offset) : int(offset) + int(limit)]}
+            for name, offset, limit in queries
+        ]
+        self.rnd.shuffle(res)
+        return _Response(res)
+
+
+class _CursorApi:
+    """
+    IGDB stand-in for keyset pagination: filters the catalog by "id > N" and a "genres=[G]" condition
+    """
+
+    def __init__(self, rows: int) -> None:
+        self.catalog = [{"id": i, "genres": [i % 2]} for i in range(1, rows + 1)]
+        self.queries: list[str] = []
+
+    def post_url(self, url, data=None):
+        assert url == URL
+        self.queries.append(data)
+        last_id = int(re.search(r"id > (\d+)", data).group(1))
+        genre = re.search(r"genres=\[(\d+)\]", data)
+        limit = int(re.search(r"limit (\d+);", data).group(1))
+        rows = [r for r in self.catalog if r["id"] > last_id and (not genre or int(genre.group(1)) in r["genres"])]
+        return _Response(rows[:limit])
+
+
+@pytest.mark.unit
+class TestIgdbMisc:
+    @pytest.fixture(autouse=True)
+    def small_pages(self, monkeypatch):
+        monkeypatch.setattr(misc, "PAGE_LIMIT", 3)
+        monkeypatch.setattr(misc, "MULTIQUERY_MAX", 2)
+
+    def test_pages_are_batched_and_reassembled_in_order(self, monkeypatch):
+        api = _Api(rows=10, count=10)
+        monkeypatch.setattr(misc, "_post_url", api.post_url)
+        pages = list(misc.iter_data(URL, QUERY))
+        # 4 pages, 2 per /multiquery request; the last one is short, so there is no tail
+        assert api.multiqueries == [[0, 3], [6, 9]]
+        assert [len(rows) for rows in pages] == [6, 4]
+        assert [row["id"] for rows in pages for row in rows] == list(range(1, 11))
+
+    def test_rows_added_after_counting_are_fetched(self, monkeypatch):
+        # counted 6 (two full pages), 5 more added meanwhile
+        api = _Api(rows=11, count=6)
+        monkeypatch.setattr(misc, "_post_url", api.post_url)
+        assert [row["id"] for row in misc.get_data(URL, QUERY)] == list(range(1, 12))
+        # the tail is fetched one page at a time until a short one
+        assert api.multiqueries == [[0, 3], [6], [9]]
+
+    def test_full_last_page_without_new_rows(self, monkeypatch):
+        api = _Api(rows=6, count=6)
+        monkeypatch.setattr(misc, "_post_url", api.post_url)
+        assert len(misc.get_data(URL, QUERY)) == 6
+        assert api.multiqueries == [[0, 3], [6]]
+
+    def test_errors(self, monkeypatch):
+        monkeypatch.setattr(misc, "_post_url", lambda url, data=None: _Response({"message": "Authorization Failure"}))
+        with pytest.raises(ValueError, match="error counting"):
+            misc.get_count(URL, QUERY)
+
+        error = [{"title": "Syntax Error", "status": 400}]
+        monkeypatch.setattr(misc, "_post_url", lambda url, data=None: _Response(error))
+        with pytest.raises(ValueError, match="error getting"):
+            misc._get_pages(URL, QUERY, [0, 3])  # pylint: disable=protected-access
+
+        # a query missing from the multiquery response
+        monkeypatch.setattr(misc, "_post_url", lambda url, data=None: _Response([{"name": "0", "result": []}]))
+        with pytest.raises(ValueError, match="error getting"):
+            misc._get_pages(URL, QUERY, [0, 3])  # pylint: disable=protected-access
+
+    def test_add_where(self):
+        assert misc.add_where("fields *;sort id asc;", "id > 5") == "fields *;sort id asc;where id > 5;"
+        assert (
+            misc.add_where("fields *;where genres=[2];sort id asc;", "id > 5")
+            == "fields *;where (genres=[2]) & id > 5;sort id asc;"
+        )
+
+    def test_cursor_pages(self, monkeypatch):
+        api = _CursorApi(rows=8)
+        monkeypatch.setattr(misc, "_post_url", api.post_url)
+        pages = list(misc.iter_pages(URL, QUERY))
+        assert [[row["id"] for row in page] for page in pages] == [[1, 2, 3], [4, 5, 6], [7, 8]]
+        # each page starts after the last id of the previous one, paging stops on the short page
+        assert [re.search(r"id > (\d+)", q).group(1) for q in api.queries] == ["0", "3", "6"]
+
+    def test_cursor_keeps_the_where_clause(self, monkeypatch):
+        api = _CursorApi(rows=12)
+        monkeypatch.setattr(misc, "_post_url", api.post_url)
+        rows = misc.get_data(URL, "fields *;where genres=[1];sort id asc;", cursor=True)
+        assert [row["id"] for row in rows] == [1, 3, 5, 7, 9, 11]
+        assert all("where (genres=[1]) & id > " in q for q in api.queries)
+        # a full last page needs one more (empty) page to know it was the last
+        assert len(api.queries) == 3
+
+    def test_cursor_errors(self, monkeypatch):
+        with pytest.raises(ValueError, match="sort id asc"):
+            list(misc.iter_pages(URL, "fields *;sort name asc;"))
+
+        error = [{"title": "Syntax Error", "status": 400}]
+        monkeypatch.setattr(misc, "_post_url", lambda url, data=None: _Response(error))
+        with pytest.raises(ValueError, match="after id 0"):
+            list(misc.iter_pages(URL, QUERY))
@@ -0,0 +1,35 @@
+import pytest
+
+from scrapers.igdb.store import IgdbStore
+
+
+@pytest.mark.unit
+class TestIgdbStore:
+    def test_upsert_merges_by_id_and_tracks_high_water(self, tmp_path):
+        store = IgdbStore(tmp_path / "store.sqlite")
+        assert store.high_water("games") is None
+
+        store.upsert("games", [{"id": 2, "name": "b", "updated_at": 10}, {"id": 1, "name": "a", "updated_at": 20}])
+        store.upsert("genres", [{"id": 1, "name": "adventure", "updated_at": 5}])
+        assert store.high_water("games") == 20
+        assert store.high_water("genres") == 5
+
+        # a delta: one changed record, one new one
+        assert store.upsert("games", [{"id": 2, "name": "b2", "updated_at": 30}, {"id": 3, "name": "c"}]) == 2
+        assert store.high_water("games") == 30
+        assert [(r["id"], r["name"]) for r in list(store.records("games"))] == [(1, "a"), (2, "b2"), (3, "c")]
+
+        # an empty delta keeps the mark
+        store.upsert("games", [])
+        assert store.high_water("games") == 30
+        store.close()
+
+    def test_prune(self, tmp_path):
+        store = IgdbStore(tmp_path / "store.sqlite")
+        store.upsert("games", [{"id": i} for i in range(1, 6)])
+        store.upsert("genres", [{"id": 1}])
+        assert store.prune("games", iter([1, 3, 5, 6])) == 2
+        assert [r["id"] for r in store.records("games")] == [1, 3, 5]
+        # other endpoints are left alone
+        assert [r["id"] for r in store.records("genres")] == [1]
+        store.close()
@@ -0,0 +1,41 @@
+import pytest
+from requests import Response
+
+from scrapers.igdb import misc
+
+
+def _response(status_code):
+    res = Response()
+    res.status_code = status_code
+    res._content = b"[]"  # pylint: disable=protected-access
+    return res
+
+
+@pytest.mark.unit
+class TestIgdbToken:
+    def test_token_is_cached_on_disk_and_refreshed_on_401(self, tmp_path, monkeypatch):
+        issued = []
+
+        def request_access_token():
+            issued.append(f"token{len(issued)}")
+            return {"access_token": issued[-1], "expires_in": 3600}
+
+        def post_url(url, headers=None, data=None):  # pylint: disable=unused-argument
+            # the first token gets revoked
+            return _response(401 if headers["Authorization"] == "Bearer token0" else 200)
+
+        monkeypatch.setattr(misc, "TOKEN_CACHE_PATH", tmp_path / "token.json")
+        monkeypatch.setattr(misc, "_token", None)
+        monkeypatch.setattr(misc, "_request_access_token", request_access_token)
+        monkeypatch.setattr(misc, "post_url", post_url)
+
+        assert misc.get_access_token() == "token0"
+        # a new process reuses the token cached on disk
+        monkeypatch.setattr(misc, "_token", None)
+        assert misc.get_access_token() == "token0"
+        assert issued == ["token0"]
+
+        assert misc._post_url("https://api.igdb.com/v4/games").status_code == 200  # pylint: disable=protected-access
+        assert issued == ["token0", "token1"]
+        monkeypatch.setattr(misc, "_token", None)
+        assert misc.get_access_token() == "token1"
@@ -0,0 +1,49 @@
+import pytest
+
+from scrapers import manifest as manifest_module
+from scrapers.manifest import (
+    KIND_GAME,
+    KIND_LISTING,
+    LISTING_MAX_AGE,
+    CrawlManifest,
+)
+
+LINKS = [("gk", "https://example.com/games/gk"), ("loom", "https://example.com/games/loom")]
+
+
+@pytest.mark.unit
+class TestManifest:
+    @pytest.fixture
+    def manifest(self, tmp_path):
+        res = CrawlManifest(tmp_path / "manifest.sqlite")
+        yield res
+        res.close()
+
+    def test_freshness(self, manifest, monkeypatch):
+        manifest.record("https://example.com/games/gk", KIND_GAME, 200)
+        manifest.record("https://example.com/games/loom", KIND_GAME, 404)
+        assert manifest.is_fresh("https://example.com/games/gk", float("inf"))
+        assert manifest.is_fresh("https://example.com/games/gk", 60)
+        # max_age=None: no resume, everything is fetched again
+        assert not manifest.is_fresh("https://example.com/games/gk", None)
+        # failed or never fetched
+        assert not manifest.is_fresh("https://example.com/games/loom", float("inf"))
+        assert not manifest.is_fresh("https://example.com/games/monkey", float("inf"))
+        now = manifest_module.time.time()
+        monkeypatch.setattr(manifest_module.time, "time", lambda: now + 120)
+        assert not manifest.is_fresh("https://example.com/games/gk", 60)
+        assert manifest.is_fresh("https://example.com/games/gk", float("inf"))
+
+    def test_links(self, manifest, monkeypatch):
+        manifest.record("https://example.com/page1", KIND_LISTING, 200, LINKS)
+        manifest.record("https://example.com/page2", KIND_LISTING, 200)
+        assert manifest.fresh_links("https://example.com/page1", float("inf")) == LINKS
+        assert manifest.fresh_links("https://example.com/page1", None) is None
+        # fetched, but links not kept (last page of a section)
+        assert manifest.fresh_links("https://example.com/page2", float("inf")) is None
+        # listing links expire after LISTING_MAX_AGE even on resume, game pages don't
+        manifest.record("https://example.com/games/gk", KIND_GAME, 200)
+        now = manifest_module.time.time()
+        monkeypatch.setattr(manifest_module.time, "time", lambda: now + LISTING_MAX_AGE + 1)
+        assert manifest.fresh_links("https://example.com/page1", float("inf")) is None
+        assert manifest.is_fresh("https://example.com/games/gk", float("inf"))
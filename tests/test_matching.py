@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from scrapers.matching import (
+    TrigramIndex,
+    find_similar_games,
+    find_similar_games_batch,
+)
+
+WORDS = ["monkey", "island", "secret", "quest", "king", "sword", "broken", "myst", "riven", "space", "the", "of", "2"]
+
+
+def _db(size, rnd):
+    db = {}
+    for i in range(size):
+        other_names = str([" ".join(rnd.choices(WORDS, k=2))]) if rnd.random() < 0.5 else ""
+        db[str(i)] = {
+            "id": str(i),
+            "name": " ".join(rnd.choices(WORDS, k=rnd.randint(1, 4))),
+            "other_names": other_names,
+        }
+    return db
+
+
+@pytest.mark.unit
+class TestMatching:
+    def test_index_matches_brute_force(self):
+        rnd = random.Random(1)
+        qz_db = _db(300, rnd)
+        index = TrigramIndex(qz_db)
+        for ag in _db(100, rnd).values():
+            assert index.find_similar_games(ag) == find_similar_games(ag, qz_db)
+
+    def test_batch_matches_brute_force(self):
+        pytest.importorskip("scipy")
+        rnd = random.Random(2)
+        qz_db = _db(300, rnd)
+        ag_db = _db(100, rnd)
+        res = find_similar_games_batch(ag_db, qz_db, chunk_size=16)
+        for key, ag in ag_db.items():
+            expected = find_similar_games(ag, qz_db)
+            assert res[key] == ([expected] if expected else [])
@@ -0,0 +1,55 @@
+import threading
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+import pytest
+
+from scrapers.crawl import Crawler
+from scrapers.media import (
+    MediaStore,
+    download_media,
+)
+
+IMAGES = {"/ag/cover.jpg": b"same cover", "/qz/1.jpg": b"same cover", "/qz/2.jpg": b"screenshot"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests_seen: list = []
+
+    def do_GET(self):  # noqa: N802
+        self.requests_seen.append(self.path)
+        body = IMAGES.get(self.path)
+        self.send_response(200 if body else 404)
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+        self.wfile.write(body or b"")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.unit
+class TestMedia:
+    @pytest.fixture
+    def base_url(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
+
+    def test_duplicates_are_stored_once_and_not_downloaded_again(self, base_url, tmp_path):
+        urls = [f"{base_url}{p}" for p in (*IMAGES, "/missing.jpg")]
+        store = MediaStore(tmp_path)
+        res = download_media(store, Crawler(concurrency=4, rate=0), urls + urls)
+        assert set(res) == set(urls[:3])
+        assert res[urls[0]] == res[urls[1]]
+        assert res[urls[2]].read_bytes() == b"screenshot"
+        assert len(list(tmp_path.rglob("*.jpg"))) == 2
+
+        _Handler.requests_seen.clear()
+        assert download_media(store, Crawler(concurrency=4, rate=0), urls) == res
+        assert _Handler.requests_seen == ["/missing.jpg"]
+        store.close()
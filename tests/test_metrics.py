@@ -0,0 +1,79 @@
+import json
+import threading
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+import pytest
+
+from scrapers import misc
+from scrapers.metrics import (
+    HttpMetrics,
+    endpoint_labels,
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = {"/flaky/1": 1}
+
+    def do_GET(self):  # noqa: N802
+        if self.failures.get(self.path):
+            self.failures[self.path] -= 1
+            self.send_response(503)
+            body = b""
+        else:
+            self.send_response(200)
+            body = b"x" * 100
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.unit
+class TestMetrics:
+    @pytest.fixture
+    def base_url(self, monkeypatch):
+        monkeypatch.setattr(misc, "metrics", HttpMetrics())
+        misc.configure_http()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
+        misc.configure_http()
+
+    def test_endpoint_labels(self):
+        assert endpoint_labels("https://api.igdb.com/v4/games") == ("api.igdb.com", "/v4/games")
+        assert endpoint_labels("https://adventuregamers.com/games/view/123?x=1") == (
+            "adventuregamers.com",
+            "/games/view/*",
+        )
+        assert endpoint_labels("http://questzone.ru/enzi/game/1234.html") == ("questzone.ru", "/enzi/game/*")
+
+    def test_requests_retries_and_pools_are_recorded(self, base_url, tmp_path):
+        host = base_url[len("http://") :]
+        misc.configure_metrics(tmp_path / "scrapers.prom", interval=3600)
+        assert misc.get_url(f"{base_url}/flaky/1").status_code == 200
+        assert misc.get_url(f"{base_url}/flaky/2").status_code == 200
+        misc.finish_metrics(tmp_path / "summary.json")
+
+        with open(tmp_path / "summary.json", encoding="utf-8") as f:
+            summary = json.load(f)
+        (endpoint,) = summary["endpoints"]
+        assert (endpoint["host"], endpoint["endpoint"]) == (host, "/flaky/*")
+        assert endpoint["requests"] == 2
+        assert endpoint["statuses"] == {"GET 200": 2}
+        assert endpoint["bytes"] == 200
+        assert endpoint["retries"] == 1
+        # 3 requests sent (one retry) over a single kept-alive connection
+        assert summary["pools"]["127.0.0.1"] == {"connections": 1, "requests": 3, "reused": 2}
+
+        text = (tmp_path / "scrapers.prom").read_text(encoding="utf-8")
+        labels = f'host="{host}",endpoint="/flaky/*"'
+        assert f'scrapers_http_requests_total{{{labels},method="GET",status="200"}} 2' in text
+        assert f'scrapers_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+        assert f"scrapers_http_retries_total{{{labels}}} 1" in text
@@ -0,0 +1,113 @@
+import json
+import threading
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+import pytest
+
+from scrapers.crawl import AdaptivePacer
+from scrapers.mg import index
+
+GAMES = [{"game_id": i} for i in range(250)]
+
+
+class _Res:
+    def __init__(self, page):
+        self.page = page
+
+    def json(self):
+        return {"games": self.page}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # responses still to send before a 200: (status, headers)
+    script: list = []
+    hits = 0
+
+    def do_GET(self):  # noqa: N802
+        _Handler.hits += 1
+        status, headers = _Handler.script.pop(0) if _Handler.script else (200, {})
+        body = json.dumps({"genres": [{"genre_id": 2}]} if status == 200 else {"error": "Too Many Requests"}).encode()
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _RecordingPacer(AdaptivePacer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statuses = []
+
+    def update(self, res):
+        self.statuses.append(res.status_code)
+        super().update(res)
+
+
+@pytest.mark.unit
+class TestMgIndex:
+    @pytest.fixture
+    def server(self, monkeypatch):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        monkeypatch.setattr(index, "HOST_URL", f"http://127.0.0.1:{server.server_address[1]}")
+        monkeypatch.setattr(index, "_pacer", _RecordingPacer(min_interval=0.01, default_interval=0.05))
+        _Handler.hits = 0
+        yield _Handler
+        server.shutdown()
+
+    def test_rate_limited_requests_are_paced(self, server):
+        server.script = [
+            (429, {"Retry-After": "0"}),
+            (429, {"Retry-After": "0"}),
+            # 100 requests left for the next 5 seconds
+            (200, {"X-RateLimit-Remaining": "100", "X-RateLimit-Reset": "5"}),
+        ]
+        # 429s reach the pacer (urllib3 doesn't retry them): one request each
+        assert index.get_genres() == [{"genre_id": 2}]
+        assert server.hits == 3
+        assert index._pacer.statuses == [429, 429, 200]  # pylint: disable=protected-access
+        assert index._pacer.interval == 0.05  # pylint: disable=protected-access
+        # no quota headers: the pacer never goes below its quota-safe default
+        for _ in range(3):
+            index.get_genres()
+        assert index._pacer.interval == 0.05  # pylint: disable=protected-access
+
+    def test_quota_headers_speed_up(self, server):
+        server.script = [(200, {"X-RateLimit-Remaining": "100", "X-RateLimit-Reset": "2"})]
+        index.get_genres()
+        assert index._pacer.interval == 0.02  # pylint: disable=protected-access
+
+    def test_gives_up_after_max_attempts(self, server, monkeypatch):
+        monkeypatch.setattr(index, "MAX_ATTEMPTS", 3)
+        server.script = [(429, {"Retry-After": "0"})] * 5
+        with pytest.raises(RuntimeError, match="rate limited"):
+            index.get_genres()
+        assert server.hits == 3
+
+    def test_paging_resumes_from_checkpoints(self, tmp_path, monkeypatch):
+        offsets = []
+
+        def get_url(url, params=None):  # pylint: disable=unused-argument
+            offsets.append(params["offset"])
+            if params["offset"] == 200 and len(offsets) == 3:
+                raise ConnectionError("crash")
+            return _Res(GAMES[params["offset"] : params["offset"] + params["limit"]])
+
+        monkeypatch.setattr(index, "_get_url", get_url)
+        with pytest.raises(ConnectionError):
+            list(index.iter_games(tmp_path))
+        assert offsets == [0, 100, 200]
+
+        offsets.clear()
+        assert list(index.iter_games(tmp_path)) == GAMES
+        # checkpointed pages are not fetched again
+        assert offsets == [200, 300]
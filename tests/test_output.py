@@ -0,0 +1,85 @@
+import csv
+import datetime
+import json
+
+import pytest
+
+from scrapers.igdb.index import write_games_csv
+from scrapers.output import (
+    DUMP_GZIP,
+    DUMP_JSON,
+    PARQUET_INT,
+    PARQUET_LIST,
+    PARQUET_TIMESTAMP,
+    dump_records,
+    flat_parquet_writer,
+    ndjson_writer,
+    read_ndjson,
+)
+
+GAME = {
+    "id": 7,
+    "name": "Syberia",
+    "slug": "syberia",
+    "summary": "Kate Walker travels to Russia.",
+    "genres": [{"id": 31}, {"id": 2}],
+    "platforms": [6, 14],
+    "alternative_names": [{"name": 'Syberia "I"'}],
+    "involved_companies": [
+        {"company": 70, "developer": True, "publisher": False, "porting": False, "supporting": False}
+    ],
+    "age_ratings": [{"category": 2, "rating": 3}, {"category": 1, "rating": 10}],
+    "screenshots": [{"image_id": "sc1", "height": 720, "width": 1280}],
+    "cover": {"image_id": "co1"},
+    "similar_games": [8, 9],
+}
+
+
+@pytest.mark.unit
+class TestOutput:
+    def test_ndjson_round_trip(self, tmp_path):
+        pages = [[{"id": i, "name": f"Game {i}", "genres": [{"id": 31}]} for i in range(p, p + 3)] for p in (0, 3)]
+        path = tmp_path / "games.ndjson.gz"
+        with ndjson_writer(path) as write:
+            for page in pages:
+                write(page)
+        assert list(read_ndjson(path)) == [r for page in pages for r in page]
+
+    def test_dump_formats_return_same_records(self, tmp_path):
+        records = [{"id": i, "name": f"Ñame {i}"} for i in range(5)]
+        assert list(dump_records(tmp_path, "games", iter(records), DUMP_GZIP)) == records
+        assert dump_records(tmp_path, "games", iter(records), DUMP_JSON) == records
+        with open(tmp_path / "games.json", encoding="utf-8") as f:
+            assert json.load(f) == records
+
+    def test_flat_parquet_row_groups_and_types(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        path = tmp_path / "descr.parquet"
+        kinds = {"id": PARQUET_INT, "genre": PARQUET_LIST, "date_published": PARQUET_TIMESTAMP}
+        with flat_parquet_writer(path, ["id", "name", "genre", "date_published"], kinds, batch_size=2) as write:
+            write({"id": 1, "name": "A", "genre": ["quest", "puzzle"], "date_published": datetime.datetime(2001, 1, 1)})
+            write({"id": "2", "name": "B", "genre": "quest", "date_published": "2002-05-01 00:00:00"})
+            write({"id": 3, "name": None, "genre": None, "date_published": None})
+        assert pq.ParquetFile(path).metadata.num_row_groups == 2
+        assert pq.read_table(path, columns=["id", "genre"]).to_pylist() == [
+            {"id": 1, "genre": ["quest", "puzzle"]},
+            {"id": 2, "genre": ["quest"]},
+            {"id": 3, "genre": None},
+        ]
+        assert pq.read_table(path).column("date_published")[1].as_py() == datetime.datetime(2002, 5, 1)
+
+    def test_games_parquet_matches_csv(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        write_games_csv(tmp_path, [GAME, GAME], parquet=True)
+        with open(tmp_path / "games.csv", encoding="utf-8") as f:
+            (row,) = list(csv.DictReader(f))
+        assert row["alternative_names"] == '{"Syberia I"}'
+        assert row["genres"] == "{31,2}"
+        (record,) = pq.read_table(tmp_path / "games.parquet").to_pylist()
+        assert record["alternative_names"] == ['Syberia "I"']
+        assert record["genres"] == [31, 2]
+        assert record["platforms"] == [6, 14]
+        assert record["esrb_rating"] == 10
+        assert record["companies"] == json.loads(row["companies"])
+        assert record["media_assets"] == json.loads(row["media_assets"])
+        assert record["igdb"] == json.loads(row["igdb"])
@@ -0,0 +1,17 @@
+from pathlib import Path
+
+import pytest
+
+from scrapers.parallel import parse_files
+
+
+@pytest.mark.unit
+class TestParallel:
+    FILES = [Path(f"html/{i}.html") for i in range(100)]
+
+    def test_ordered_matches_serial(self):
+        assert list(parse_files(str, self.FILES, workers=2, chunksize=7)) == [(f, str(f)) for f in self.FILES]
+
+    def test_unordered_yields_all(self):
+        res = list(parse_files(str, self.FILES, workers=2, chunksize=7, ordered=False))
+        assert sorted(res) == [(f, str(f)) for f in sorted(self.FILES)]
@@ -0,0 +1,33 @@
+import pytest
+
+from scrapers.parse_cache import parse_files_cached
+
+
+@pytest.mark.unit
+class TestParseCache:
+    def test_only_changed_files_are_parsed(self, tmp_path):
+        files = []
+        for i in range(3):
+            files.append(tmp_path / f"{i}.html")
+            files[-1].write_text(f"page {i}")
+        parsed = []
+
+        def parse(path):
+            parsed.append(path)
+            return path.read_text()
+
+        def run(version="1"):
+            parsed.clear()
+            return list(parse_files_cached(parse, files, tmp_path / "cache.sqlite", version))
+
+        first = run()
+        assert parsed == files
+        assert run() == first
+        assert not parsed
+
+        files[1].write_text("page 1 updated")
+        assert run()[1] == (files[1], "page 1 updated")
+        assert parsed == [files[1]]
+
+        run(version="2")
+        assert parsed == files
@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import pytest
+
+from scrapers.ag.games import PARSERS as AG_PARSERS
+from scrapers.qz import games as qz_games
+from scrapers.qz.games import PARSERS as QZ_PARSERS
+
+AG_PAGE = """<html><head><meta charset="utf-8">
+<script type="application/ld+json">{"@type": "VideoGame", "name": "Gabriel Knight", "url": "x",
+"author": {"name": ["Sierra [On-Line]"]}, "datePublished": "1993", "genre": "Adventure"}</script></head>
+<body><h1 class="page_title main">Gabriel Knight</h1><div id="game_desc"><p>New <b>Orleans</b></p></div>
+<img id="gamebox_new" data-src="https://adventuregamers.com/images/games/123/box.jpg">
+<div id="comment-container"><div class="padding">a</div>
+<table class="game_info_table"><tr><td>Perspective</td><td>Third-person</td></tr>
+<tr><td>Theme</td><td>Horror, Mystery</td></tr><tr><td>Red Flags</td><td>-</td></tr></table></div></body></html>
+"""
+
+QZ_PAGE = """<html><body><table class="txt"><tr><td><div class="hdr0">Sibiria</div><font>Сибирь</font>
+<div id="names"><i>"Syberia"\nSyberia I</i></div><img alt="Обложка" src="/covers/1.jpg"></td></tr>
+<tr><td>Разработка:</td><td>Microids / -</td></tr><tr><td>Вышла:</td><td>в ноябре 2002</td></tr>
+<tr><td>Платформы:</td><td><b>PC</b> / Mac</td></tr><tr><td>Купить:</td><td><a href="https://x">s</a></td></tr>
+<tr><td><div align="justify">Кейт Уокер</div></td></tr>
+<tr><td><a href="http://questzone.ru/screenshots/55/">s</a></td></tr></table></body></html>
+"""
+
+
+@pytest.mark.unit
+class TestParsers:
+    def test_ag_lxml_parity(self, tmp_path: Path):
+        page = tmp_path / "123.html"
+        page.write_text(AG_PAGE, encoding="utf-8")
+        descr, media = AG_PARSERS["bs4"](page)
+        assert descr["author"] == ["Sierra <On-Line>"]
+        assert descr["theme"] == ["Horror", "Mystery"]
+        assert media["cover"].endswith("/box.jpg")
+        assert AG_PARSERS["lxml"](page) == (descr, media)
+
+    def test_qz_lxml_parity(self, tmp_path: Path):
+        page = tmp_path / "55.html"
+        page.write_bytes(QZ_PAGE.encode("cp1251"))
+        descr, media = QZ_PARSERS["bs4"](page)
+        assert descr["other_names"] == ["Syberia", "Syberia I"]
+        assert descr["platform"] == "PC"
+        assert descr["date_published"].year == 2002
+        assert media["screenshots"] == ["http://questzone.ru/screenshots/55"]
+        assert QZ_PARSERS["lxml"](page) == (descr, media)
+
+    def test_parse_errors_propagate(self, tmp_path: Path):
+        (tmp_path / "html").mkdir()
+        (tmp_path / "html" / "55.html").write_bytes(QZ_PAGE.encode("cp1251"))
+        # unreadable page: an OSError, which used to be swallowed with the run carrying on
+        (tmp_path / "html" / "56.html").mkdir()
+        (tmp_path / "descr.csv").write_text("previous run", encoding="utf-8")
+        with pytest.raises(OSError):
+            qz_games.run(tmp_path)
+        # not replaced by a partial file
+        assert (tmp_path / "descr.csv").read_text(encoding="utf-8") == "previous run"
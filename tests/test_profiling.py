@@ -0,0 +1,60 @@
+import pstats
+
+import pytest
+
+from scrapers import profiling
+from scrapers.profiling import (
+    CSV_WRITE,
+    HTML_PARSE,
+    PROFILE_CPROFILE,
+    PROFILE_SAMPLE,
+    configure_profiling,
+    finish_profiling,
+    profiled,
+    stage,
+)
+
+
+def _parse(n):
+    return sum(i * i for i in range(n * 20000))
+
+
+def _write(items):
+    return [str(i) * 1000 for i in range(20000) for _ in items[:1]]
+
+
+def _pipeline():
+    with stage(CSV_WRITE):
+        for parsed in profiled(HTML_PARSE, (_parse(n) for n in range(20))):
+            _write([parsed])
+
+
+@pytest.mark.unit
+class TestProfiling:
+    def test_disabled(self, tmp_path):
+        configure_profiling(None, tmp_path)
+        items = [1, 2]
+        assert profiled(HTML_PARSE, items) is items
+        _pipeline()
+        finish_profiling()
+        assert not list(tmp_path.iterdir())
+
+    def test_cprofile_stages(self, tmp_path):
+        configure_profiling(PROFILE_CPROFILE, tmp_path, top_n=5)
+        _pipeline()
+        finish_profiling()
+        assert profiling._profiler is None
+        # nested stages are accounted to the innermost one only
+        parse_functions = {f[2] for f in pstats.Stats(str(tmp_path / f"{HTML_PARSE}.pstats")).stats}
+        write_functions = {f[2] for f in pstats.Stats(str(tmp_path / f"{CSV_WRITE}.pstats")).stats}
+        assert "_parse" in parse_functions and "_parse" not in write_functions
+        assert "_write" in write_functions and "_write" not in parse_functions
+        assert (tmp_path / f"{HTML_PARSE}.txt").read_text(encoding="utf-8").startswith(f"stage {HTML_PARSE}: ")
+
+    def test_sampling(self, tmp_path):
+        configure_profiling(PROFILE_SAMPLE, tmp_path, interval=0.001)
+        _pipeline()
+        finish_profiling()
+        collapsed = (tmp_path / f"{HTML_PARSE}.collapsed").read_text(encoding="utf-8")
+        assert "(_parse)" in collapsed
+        assert "samples every 0.001s" in (tmp_path / f"{HTML_PARSE}.txt").read_text(encoding="utf-8")